@@ -0,0 +1,19 @@
+"""
+About Time을 st.App으로 띄우는 실행 모듈.
+
+`streamlit run about_time.py`와 같은 화면에, 내용 해시가 붙은 배경/CSS 번들을
+불변 캐시 헤더(Cache-Control: immutable)와 미리 압축한 .gz로 내보내는 /assets/ 경로를 더한다 (assets.py).
+
+    streamlit run about_time_app.py
+    python about_time_app.py
+"""
+import os
+
+import streamlit as st
+
+import assets
+
+app = st.App(os.path.join(os.path.dirname(os.path.abspath(__file__)), "about_time.py"), routes=assets.routes())
+
+if __name__ == "__main__":
+    app.run()
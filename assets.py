@@ -0,0 +1,185 @@
+import streamlit as st
+import os, io, re, gzip, base64, hashlib
+import mimetypes
+
+# ====== 정적 에셋 파이프라인 ======
+# 배경 이미지/CSS를 프로세스당 한 번만 가공하고, 내용 해시가 붙은 파일명으로 static/ 에 쓴다.
+# - about_time_app.py(st.App)로 띄우면 routes()의 /assets/ 경로가 이 파일들을
+#   Cache-Control: immutable(1년)로, CSS는 미리 gzip한 .gz로 내보낸다. 파일명이 내용에 따라 바뀌므로
+#   브라우저는 한 번 받은 파일을 재검증 없이 계속 쓴다.
+# - `streamlit run about_time.py`로 띄우면 Streamlit 정적 서빙(app/static/)을 쓴다. 이 핸들러는
+#   Cache-Control을 붙이지 않으므로 브라우저가 휴리스틱/재검증으로 캐시하고, 압축도 하지 않는다.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")     # Streamlit이 app/static/ 으로 서빙
+STATIC_URL = "app/static/"
+ASSET_ROUTE = "/assets"                           # routes()가 붙이는 불변 캐시 경로
+ASSET_URL = "assets/"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_ASSET_NAME = re.compile(r"^[A-Za-z0-9_]+-[0-9a-f]{12}\.[a-z0-9]+$")
+_PRECOMPRESS_EXTS = {"css", "js", "svg"}          # 이미지(webp/jpg)는 이미 압축되어 있음
+_route_mounted = False
+
+BG_FILE = os.path.join(BASE_DIR, "background_about_time.jpg")
+CSS_FILE = os.path.join(BASE_DIR, "about_time.css")
+FONT_URL = "https://fonts.googleapis.com/css2?family=Shadows+Into+Light&display=swap"
+
+# 뷰포트 폭별 배경 변형 (원본보다 큰 폭은 만들지 않음)
+BG_WIDTHS = [int(w) for w in os.getenv("BG_WIDTHS", "480,768,1280").split(",") if w.strip()]
+BG_QUALITY = int(os.getenv("BG_QUALITY", "70"))
+
+# 배경 위에 덮는 반투명 흰 막
+BG_OVERLAY = "linear-gradient(rgba(255,255,255,0.70), rgba(255,255,255,0.70))"
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write_hashed(stem: str, ext: str, data: bytes) -> str:
+    """내용 해시가 붙은 이름으로 static/ 에 기록하고 파일명을 반환 (이미 있으면 건너뜀)"""
+    name = f"{stem}-{_content_hash(data)}.{ext}"
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        _write_atomic(path, data)
+    if ext in _PRECOMPRESS_EXTS and not os.path.exists(path + ".gz"):
+        _write_atomic(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    return name
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)       # 여러 프로세스가 동시에 써도 반쯤 쓴 파일이 보이지 않게
+
+
+def _image_variants(raw: bytes):
+    """
+    (폭, 바이트, 확장자, MIME) 목록을 폭 오름차순으로 반환.
+    Pillow가 없으면 원본 JPEG 하나만 사용한다.
+    """
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return [(None, raw, "jpg", "image/jpeg")]
+
+    img = Image.open(io.BytesIO(raw))
+    img.load()
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    use_webp = features.check("webp")
+
+    widths = sorted({w for w in BG_WIDTHS if w < img.width} | {img.width})
+    variants = []
+    for w in widths:
+        im = img if w == img.width else img.resize(
+            (w, round(img.height * w / img.width)), Image.LANCZOS
+        )
+        buf = io.BytesIO()
+        if use_webp:
+            im.save(buf, "WEBP", quality=BG_QUALITY, method=6)
+            variants.append((w, buf.getvalue(), "webp", "image/webp"))
+        else:
+            im.save(buf, "JPEG", quality=BG_QUALITY, optimize=True, progressive=True)
+            variants.append((w, buf.getvalue(), "jpg", "image/jpeg"))
+    return variants
+
+
+def _background_rules(urls):
+    """[(폭, url)] → 뷰포트 폭에 맞는 변형을 고르는 미디어 쿼리"""
+    rules = []
+    prev = None
+    for w, url in urls:
+        decl = f".stApp::before {{ background-image: {BG_OVERLAY}, url('{url}'); }}"
+        if prev is None:
+            rules.append(decl)               # 기본값: 가장 작은 변형
+        else:
+            rules.append(f"@media (min-width: {prev + 1}px) {{ {decl} }}")
+        prev = w if w is not None else prev
+    return "\n".join(rules)
+
+
+# ====== /assets/ 경로 (st.App) ======
+def routes():
+    """st.App(routes=…)에 넘길 경로 목록. 호출되면 이 프로세스의 번들은 /assets/ URL을 쓴다."""
+    global _route_mounted
+    from starlette.routing import Route
+    _route_mounted = True
+    return [Route(ASSET_ROUTE + "/{name}", _asset_endpoint, methods=["GET", "HEAD"])]
+
+
+async def _asset_endpoint(request):
+    from starlette.responses import FileResponse, Response
+    name = request.path_params["name"]
+    path = os.path.join(STATIC_DIR, name)
+    if not _ASSET_NAME.match(name) or not os.path.isfile(path):
+        return Response(status_code=404)
+    etag = '"' + name.rsplit("-", 1)[1].split(".")[0] + '"'
+    headers = {"Cache-Control": ASSET_CACHE_CONTROL, "ETag": etag, "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if "gzip" in request.headers.get("accept-encoding", "") and os.path.isfile(path + ".gz"):
+        headers["Content-Encoding"] = "gzip"
+        path += ".gz"
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def static_serving_enabled() -> bool:
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def build_bundle():
+    """
+    프로세스당 한 번만 실행되는 에셋 빌드.
+    반환값 head_html은 매 rerun마다 주입해도 수백 바이트 수준이다.
+    """
+    with open(BG_FILE, "rb") as f:
+        raw = f.read()
+    with open(CSS_FILE, "r", encoding="utf-8") as f:
+        base_css = f.read()
+
+    variants = _image_variants(raw)
+    served = "assets" if _route_mounted else "static" if static_serving_enabled() else ""
+
+    if served:
+        # CSS 안의 url()은 CSS 파일 기준 상대 경로라 같은 디렉터리 이름만 쓴다
+        urls = [(w, _write_hashed("bg", ext, data)) for w, data, ext, _ in variants]
+        css = base_css + "\n" + _background_rules(urls) + "\n"
+        css_name = _write_hashed("about_time", "css", css.encode("utf-8"))
+        base = ASSET_URL if served == "assets" else STATIC_URL
+        head = (
+            "<link rel='preconnect' href='https://fonts.gstatic.com' crossorigin>"
+            f"<link href='{FONT_URL}' rel='stylesheet'>"
+            f"<link rel='stylesheet' href='{base}{css_name}'>"
+        )
+        css_hash = css_name.rsplit("-", 1)[1].split(".")[0]
+    else:
+        # 정적 서빙이 꺼진 환경: 가장 작은 변형 하나만 data URI로 인라인
+        w, data, ext, mime = variants[0]
+        uri = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+        css = base_css + "\n" + _background_rules([(None, uri)]) + "\n"
+        css_hash = _content_hash(css.encode("utf-8"))
+        head = (
+            f"<link href='{FONT_URL}' rel='stylesheet'>"
+            f"<style id='about-time-{css_hash}'>{css}</style>"
+        )
+
+    return {
+        "head_html": head,
+        "css_hash": css_hash,
+        "served": served,
+        "variants": [(w, len(data), ext) for w, data, ext, _ in variants],
+        "original_bytes": len(raw),
+    }
+
+
+def inject():
+    """번들 스타일시트를 페이지에 한 번에 주입"""
+    st.markdown(build_bundle()["head_html"], unsafe_allow_html=True)
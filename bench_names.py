@@ -0,0 +1,208 @@
+"""
+로컬 인물 추출기(name_extractor.py) 정확도/속도 벤치마크.
+
+    python bench_names.py                      # bench_names_corpus.jsonl + cassettes/ 의 녹화본
+    python bench_names.py --synth 200          # 로컬 대역 서버 합성 스토리(정답 포함) 추가
+    python bench_names.py --cassettes path/ --out bench_names.json
+
+기준(reference)
+- labeled: bench_names_corpus.jsonl. 게임 출력 형식의 스토리에 사람이 인물/피해자를 표시한 말뭉치로,
+  피해자가 마지막 문장 맨 끝에 오지 않는 결말(생존자가 마지막에 나오는 문장, "X를 잃은 Y" 등)을 일부러 섞었다.
+- 녹화본: 같은 스토리에 대해 녹화된 LLM 추출 응답(extract_cast)이 있으면 그 답을 기준으로 일치율을 잰다.
+- 합성: 합성기가 넣은 실제 이름/피해자를 정답으로 쓴다. 합성 결말은 늘 "결국 {피해자}는 숨을 거둔다"로
+  끝나 추출기의 단서와 같은 모양이므로 자체 점검용일 뿐이고, 요약의 "all"(정확도)에는 넣지 않는다.
+비교 대상으로 이전 정규식 빈도 추출(regex_baseline)도 함께 잰다.
+"""
+import os, re, sys, json, time, glob, random
+import argparse
+
+import name_extractor
+import mock_llm_server
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BASE_DIR, "bench_names_corpus.jsonl")
+
+
+# ====== 이전 정규식 추출 (비교용) ======
+def _clean_korean_name(name: str) -> str:
+    n = name.strip()
+    tmp = re.sub(r'(은|는|이|가|을|를|과|와|랑|도|만)$', '', n)
+    if len(tmp) >= 2:
+        n = tmp
+    m = re.match(r'^[가-힣]{2,3}$', n)
+    return m.group(0) if m else n
+
+
+def regex_baseline(story_text: str):
+    text = re.sub(r'\[(?:체크포인트\s*[1-5]|CP[1-5]|엔딩|결말)(?::[^\]]*)?\]', ' ', story_text)
+    freq = {}
+    for c in re.findall(r'([가-힣]{2,3})', text):
+        c = _clean_korean_name(c)
+        if c:
+            freq[c] = freq.get(c, 0) + 1
+    top2 = sorted(freq, key=freq.get, reverse=True)[:2]
+    if len(top2) < 2:
+        return top2, ""
+    last_para = name_extractor.split_blocks(story_text)[-1]
+    victim = top2[0] if last_para.count(top2[0]) >= last_para.count(top2[1]) else top2[1]
+    return top2, victim
+
+
+# ====== 말뭉치 ======
+def load_labeled(path: str):
+    """사람이 표시한 말뭉치 → [{"story", "reference", "source"}]"""
+    if not path or not os.path.exists(path):
+        return []
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            corpus.append({
+                "story": rec["story"],
+                "reference": {"characters": rec["characters"], "victim": rec["victim"]},
+                "source": "labeled",
+            })
+    return corpus
+
+
+def load_cassettes(directory: str):
+    """녹화본 → [{"story", "reference"|None, "source"}]"""
+    stories, answers = [], {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                kind = rec.get("kind")
+                if kind == "story":
+                    stories.append(rec.get("response") or "")
+                elif kind == "extract":
+                    messages = rec.get("messages") or []
+                    text = (messages[-1].get("content") or "") if messages else ""
+                    try:
+                        data = json.loads(rec["response"].strip().strip("`").removeprefix("json"))
+                    except (ValueError, KeyError, AttributeError):
+                        continue
+                    if isinstance(data, dict) and data.get("victim"):
+                        answers[text.strip()] = data
+    corpus = []
+    for story in dict.fromkeys(s.strip() for s in stories if s.strip()):
+        ref = answers.get(story)
+        corpus.append({
+            "story": story,
+            "reference": {"characters": ref["characters"], "victim": ref["victim"]} if ref else None,
+            "source": "cassette",
+        })
+    return corpus
+
+
+def synth_corpus(n: int, seed: int):
+    corpus = []
+    for i in range(n):
+        story = mock_llm_server._synth_story(random.Random(seed * 100003 + i))
+        truth = json.loads(mock_llm_server._synth_extract([{"content": story + "\nvictim"}]))
+        corpus.append({"story": story, "reference": truth, "source": "synth"})
+    return corpus
+
+
+# ====== 측정 ======
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else None
+
+
+def _match(chars, victim, ref):
+    cast_ok = set(chars) == set(ref["characters"])
+    return cast_ok, cast_ok and victim == ref["victim"]
+
+
+def evaluate(corpus, repeat: int):
+    rows = []
+    for item in corpus:
+        story = item["story"]
+        chars, victim, conf = name_extractor.extract(story)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            name_extractor.extract(story)
+        local_us = (time.perf_counter() - t0) / repeat * 1e6
+        b_chars, b_victim = regex_baseline(story)
+        row = {
+            "source": item["source"],
+            "local": {"characters": chars, "victim": victim, "confidence": round(conf, 3)},
+            "confident": name_extractor.confident(conf),
+            "local_us": local_us,
+            "baseline": {"characters": b_chars, "victim": b_victim},
+            "reference": item["reference"],
+        }
+        if item["reference"]:
+            row["local_cast_ok"], row["local_ok"] = _match(chars, victim, item["reference"])
+            row["baseline_cast_ok"], row["baseline_ok"] = _match(b_chars, b_victim, item["reference"])
+        rows.append(row)
+    return rows
+
+
+def summarize(rows):
+    def rate(xs):
+        return round(sum(xs) / len(xs), 4) if xs else None
+    out = {}
+    for source in sorted({r["source"] for r in rows}) + ["all"]:
+        # 합성 스토리는 추출기 단서와 같은 틀로 만든 것이라 전체 정확도에서 뺀다
+        rs = [r for r in rows if r["source"] == source or (source == "all" and r["source"] != "synth")]
+        if not rs:
+            continue
+        ref = [r for r in rs if r["reference"]]
+        conf = [r for r in ref if r["confident"]]
+        out[source] = {
+            "stories": len(rs),
+            "with_reference": len(ref),
+            "confident_rate": rate([r["confident"] for r in rs]),
+            "llm_calls_avoided": sum(r["confident"] for r in rs),
+            "local_cast_accuracy": rate([r["local_cast_ok"] for r in ref]),
+            "local_accuracy": rate([r["local_ok"] for r in ref]),
+            "local_accuracy_when_confident": rate([r["local_ok"] for r in conf]),
+            "baseline_cast_accuracy": rate([r["baseline_cast_ok"] for r in ref]),
+            "baseline_accuracy": rate([r["baseline_ok"] for r in ref]),
+            "local_us": {"p50": _pct([r["local_us"] for r in rs], 50), "p99": _pct([r["local_us"] for r in rs], 99)},
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="로컬 인물 추출기 정확도/속도 벤치마크")
+    ap.add_argument("--corpus", default=DEFAULT_CORPUS, help="사람이 표시한 말뭉치 (JSONL, 빈 값이면 안 씀)")
+    ap.add_argument("--cassettes", default=mock_llm_server.DEFAULT_CASSETTE_DIR)
+    ap.add_argument("--synth", type=int, default=0, help="합성 스토리 수 (정답 포함)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=50, help="지연 측정 반복 횟수")
+    ap.add_argument("--out", default=os.path.join(BASE_DIR, "bench_names.json"))
+    ap.add_argument("--show-misses", action="store_true")
+    args = ap.parse_args()
+
+    corpus = load_labeled(args.corpus) + load_cassettes(args.cassettes) + synth_corpus(args.synth, args.seed)
+    if not corpus:
+        sys.exit(f"말뭉치가 비어 있습니다: {args.corpus} 나 {args.cassettes} 가 없으면 --synth N 을 주세요.")
+    rows = evaluate(corpus, args.repeat)
+    summary = summarize(rows)
+    for source, s in summary.items():
+        print(f"[{source}] n={s['stories']} ref={s['with_reference']} confident={s['confident_rate']} "
+              f"local={s['local_accuracy']} (confident만 {s['local_accuracy_when_confident']}) "
+              f"baseline={s['baseline_accuracy']} p50={s['local_us']['p50']:.0f}µs p99={s['local_us']['p99']:.0f}µs")
+    if args.show_misses:
+        for r in rows:
+            if r["reference"] and not r["local_ok"]:
+                print("MISS", r["local"], "기준:", r["reference"])
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({
+            "threshold": name_extractor.NAME_EXTRACT_MIN_CONFIDENCE,
+            "summary": summary,
+            "rows": rows,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
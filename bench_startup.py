@@ -0,0 +1,203 @@
+"""
+콜드 스타트 프로파일링 (import 시간 / 첫 요청 지연).
+
+매 측정을 새 파이썬 프로세스에서 돌려 다음을 잰다.
+- landing: 랜딩 페이지(about_time.py)가 import하는 모듈 시간. streamlit 자체와 앱 모듈을 나눠 기록하고,
+  그 시점에 openai가 이미 올라와 있는지도 확인한다 (lazy 모드라면 False여야 한다).
+- importtime: `python -X importtime` 기준 누적 시간이 큰 모듈 상위 N개.
+- first_request: 새 프로세스의 첫 LLM 스트리밍 요청 지연(첫 청크/전체). 예열 없이(cold), 랜딩 페이지처럼
+  startup.begin()으로 예열한 뒤(prewarmed) 각각 재고, 같은 프로세스의 두 번째 요청(warm)과 비교한다.
+
+    python bench_startup.py                                   # 로컬 대역 서버
+    python bench_startup.py --think 8 --repeat 5 --out bench_startup.json
+    python bench_startup.py --backend openai                  # 실제 API (max_tokens=1 요청 몇 번)
+    python bench_startup.py --max-landing-app-s 0.25 --max-first-request-s 1.0   # 넘으면 종료 코드 1 (CI용)
+"""
+import os, sys, json, time, statistics
+import argparse
+import platform
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LANDING_MODULES = ("assets", "startup", "game_play")     # about_time.py가 streamlit 다음에 import하는 모듈
+
+
+# ====== 자식 프로세스 측정 ======
+def _child_landing():
+    started = time.perf_counter()
+    __import__("streamlit")                 # streamlit 자체의 import 시간 (이름은 쓰지 않는다)
+    mid = time.perf_counter()
+    for name in LANDING_MODULES:
+        __import__(name)
+    done = time.perf_counter()
+    return {"streamlit_s": mid - started, "app_s": done - mid, "openai_loaded": "openai" in sys.modules}
+
+
+def _timed_request(llm, model: str) -> dict:
+    started = time.perf_counter()
+    first = None
+    stream = llm.chat.completions.create(
+        model=model, stream=True, max_tokens=1,
+        messages=[{"role": "user", "content": "ping"}],
+    )
+    for _ in stream:
+        if first is None:
+            first = time.perf_counter() - started
+    return {"first_chunk_s": first, "total_s": time.perf_counter() - started}
+
+
+def _child_first_request(prewarm: bool, think: float):
+    import startup
+    import game_engine
+    import model_routes
+    out = {}
+    began = time.perf_counter()
+    if prewarm:
+        startup.begin()
+        startup.wait()
+        out["prewarm_s"] = time.perf_counter() - began
+        out["phases"] = startup.timings()["phases"]
+    time.sleep(think)                       # 플레이어가 랜딩 페이지를 보는 시간
+    clicked = time.perf_counter()
+    llm = game_engine.get_client()
+    out["client_s"] = time.perf_counter() - clicked
+    first = _timed_request(llm, model_routes.DEFAULT_MODEL)
+    out["first_chunk_s"] = out["client_s"] + first["first_chunk_s"]
+    out["total_s"] = out["client_s"] + first["total_s"]
+    out["warm"] = _timed_request(llm, model_routes.DEFAULT_MODEL)
+    return out
+
+
+def _child(kind: str, think: float):
+    if kind == "landing":
+        result = _child_landing()
+    elif kind == "cold":
+        result = _child_first_request(False, think)
+    else:
+        result = _child_first_request(True, think)
+    print(json.dumps(result))
+
+
+# ====== 부모 ======
+def _spawn(args_list, env) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.join(BASE_DIR, "bench_startup.py")] + args_list,
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=300,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _median(rows, path):
+    values = []
+    for r in rows:
+        v = r
+        for k in path:
+            v = v.get(k) if isinstance(v, dict) else None
+        if v is not None:
+            values.append(v)
+    return round(statistics.median(values), 4) if values else None
+
+
+def importtime_top(env, n: int):
+    code = "import streamlit; " + "; ".join(f"import {m}" for m in LANDING_MODULES)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BASE_DIR, env=env,
+                         capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue                        # 머리글 줄
+        rows.append({"module": parts[2].strip(), "self_ms": round(self_us / 1000, 2),
+                     "cumulative_ms": round(cumulative_us / 1000, 2)})
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="콜드 스타트 프로파일링")
+    ap.add_argument("child", nargs="?", help=argparse.SUPPRESS)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--think", type=float, default=0.0, help="예열 후 첫 요청까지 기다릴 시간(초)")
+    ap.add_argument("--top", type=int, default=15, help="importtime 상위 모듈 수")
+    ap.add_argument("--backend", choices=("mock", "openai"), default="mock")
+    ap.add_argument("--ttft", type=float, default=0.0, help="mock: 첫 토큰까지 지연(초)")
+    ap.add_argument("--max-landing-app-s", type=float, default=None, help="랜딩 페이지 앱 모듈 import 시간 상한")
+    ap.add_argument("--max-first-request-s", type=float, default=None, help="예열 후 첫 요청(첫 청크) 지연 상한")
+    ap.add_argument("--out", default="", help="결과 JSON 경로")
+    args = ap.parse_args()
+
+    if args.child:
+        _child(args.child, args.think)
+        return
+
+    env = dict(os.environ, METRICS_PORT="0", STORY_POOL_SIZE="0", PREWARM_HOLD_S=str(args.think + 1))
+    server = None
+    if args.backend == "mock":
+        import mock_llm_server
+        server, base_url = mock_llm_server.start_in_thread(mock_llm_server.Config("synth", ttft=args.ttft, tps=0))
+        env.update(OPENAI_BASE_URL=base_url, OPENAI_API_KEY=env.get("OPENAI_API_KEY", "local"))
+
+    child = ["--think", str(args.think)]
+    landing = [_spawn(["landing"], env) for _ in range(args.repeat)]
+    cold = [_spawn(["cold"] + child, env) for _ in range(args.repeat)]
+    warmed = [_spawn(["prewarmed"] + child, env) for _ in range(args.repeat)]
+    if server is not None:
+        server.shutdown()
+
+    report = {
+        "env": {"python": platform.python_version(), "platform": platform.platform(),
+                "backend": args.backend, "repeat": args.repeat, "think_s": args.think},
+        "landing": {
+            "streamlit_s": _median(landing, ("streamlit_s",)),
+            "app_s": _median(landing, ("app_s",)),
+            "openai_loaded": any(r["openai_loaded"] for r in landing),
+        },
+        "importtime_top": importtime_top(env, args.top),
+        "first_request": {
+            mode: {
+                "client_s": _median(rows, ("client_s",)),
+                "first_chunk_s": _median(rows, ("first_chunk_s",)),
+                "total_s": _median(rows, ("total_s",)),
+                "warm_first_chunk_s": _median(rows, ("warm", "first_chunk_s")),
+            }
+            for mode, rows in (("cold", cold), ("prewarmed", warmed))
+        },
+        "prewarm": {
+            "prewarm_s": _median(warmed, ("prewarm_s",)),
+            "phases": {k: _median(warmed, ("phases", k)) for k in ("import_openai", "client", "resources", "connect")},
+        },
+    }
+
+    failures = []
+    if args.max_landing_app_s is not None and report["landing"]["app_s"] > args.max_landing_app_s:
+        failures.append(f"landing app import {report['landing']['app_s']}s > {args.max_landing_app_s}s")
+    first = report["first_request"]["prewarmed"]["first_chunk_s"]
+    if args.max_first_request_s is not None and first is not None and first > args.max_first_request_s:
+        failures.append(f"prewarmed first request {first}s > {args.max_first_request_s}s")
+    if report["landing"]["openai_loaded"]:
+        failures.append("openai is imported on the landing page")
+    report["failures"] = failures
+
+    lf, fr = report["landing"], report["first_request"]
+    print(f"랜딩 import: streamlit {lf['streamlit_s']}s + 앱 {lf['app_s']}s (openai 로드: {lf['openai_loaded']})")
+    for mode in ("cold", "prewarmed"):
+        r = fr[mode]
+        print(f"첫 요청 [{mode}]: 클라이언트 {r['client_s']}s, 첫 청크 {r['first_chunk_s']}s, "
+              f"전체 {r['total_s']}s (두 번째 요청 첫 청크 {r['warm_first_chunk_s']}s)")
+    print(f"예열: {report['prewarm']['prewarm_s']}s {report['prewarm']['phases']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved: {args.out}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
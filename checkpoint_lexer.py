@@ -0,0 +1,127 @@
+import re
+
+# ====== 체크포인트 머리표 증분 파서 ======
+# 스트리밍 델타를 한 번씩만 훑으며 [체크포인트 N: …] / [엔딩: …] 머리표를 인식한다.
+# - 확정된 부분의 하이라이트 HTML은 다시 계산하지 않는다.
+# - 다음 머리표가 등장하는 순간 직전 문단을 완성된 블록으로 내보낸다. 그 문단의 HTML도 그때 한 번 이어 붙여
+#   html_blocks에 얼리고, 델타마다 다시 만드는 것은 아직 열린 마지막 문단(tail_html)뿐이다.
+# 결과는 game_engine.highlight_checkpoints / extract_checkpoints 와 동일하다.
+
+TAG_RE = re.compile(r'\[(?:체크포인트\s*[1-5]|CP[1-5]|엔딩|결말)(?::[^\]]*)?\]')
+
+# 머리표 이름 → '[이름' 뒤에 올 수 있는 나머지(아직 덜 들어온 경우 포함)
+_TAG_TAILS = [
+    ("체크포인트", re.compile(r'\s*(?:[1-5](?::[^\]]*)?)?')),
+    ("CP",        re.compile(r'(?:[1-5](?::[^\]]*)?)?')),
+    ("엔딩",      re.compile(r'(?::[^\]]*)?')),
+    ("결말",      re.compile(r'(?::[^\]]*)?')),
+]
+
+
+def _could_be_tag_prefix(s: str) -> bool:
+    """'[' 로 시작하는 미완성 문자열 s가 아직 머리표가 될 가능성이 있는지"""
+    body = s[1:]
+    for head, tail in _TAG_TAILS:
+        if len(body) <= len(head):
+            if head.startswith(body):
+                return True
+        elif body.startswith(head) and tail.fullmatch(body[len(head):]):
+            return True
+    return False
+
+
+def highlight_tag(tag: str) -> str:
+    return f"<span class='checkpoint-label'>{tag}</span>"
+
+
+class CheckpointLexer:
+    def __init__(self):
+        self._text = []          # 원문 조각
+        self._html = []          # 열린 문단의 확정된 하이라이트 HTML 조각
+        self._done_html = ""     # 완성된 문단들의 HTML (문단이 닫힐 때만 늘어남)
+        self._pending = ""       # 머리표일 수도 있어 아직 확정하지 않은 꼬리
+        self._block = []         # 현재 문단의 원문 조각
+        self.blocks = []         # 완성된 문단(strip 된 상태)
+        self.html_blocks = []    # 완성된 문단별 HTML (공백뿐인 문단 포함, 이어 붙이면 _done_html)
+
+    # ---- 입력 ----
+    def feed(self, delta: str):
+        """델타를 소비하고, 이번에 완성된 블록들을 [(인덱스, 텍스트)]로 반환"""
+        if not delta:
+            return []
+        self._text.append(delta)
+        s = self._pending + delta
+        events = []
+        pos = 0
+        while True:
+            i = s.find("[", pos)
+            if i < 0:
+                self._commit_plain(s[pos:])
+                self._pending = ""
+                break
+            self._commit_plain(s[pos:i])
+            j = s.find("]", i)
+            if j < 0:
+                if _could_be_tag_prefix(s[i:]):
+                    self._pending = s[i:]      # 머리표가 닫힐 때까지 보류
+                    break
+                self._commit_plain("[")
+                pos = i + 1
+                continue
+            cand = s[i:j + 1]
+            if TAG_RE.fullmatch(cand):
+                events.extend(self._close_block())
+                self._block.append(cand)
+                self._html.append(highlight_tag(cand))
+                pos = j + 1
+            else:
+                self._commit_plain("[")
+                pos = i + 1
+        return events
+
+    def close(self):
+        """스트림 종료: 보류분을 확정하고 마지막 블록을 내보낸다"""
+        if self._pending:
+            self._commit_plain(self._pending)
+            self._pending = ""
+        return self._close_block()
+
+    def _commit_plain(self, chunk: str):
+        if chunk:
+            self._html.append(chunk)
+            self._block.append(chunk)
+
+    def _close_block(self):
+        if self._html:
+            seg = "".join(self._html)
+            self._html = []
+            self.html_blocks.append(seg)
+            self._done_html += seg
+        text = "".join(self._block).strip()
+        self._block = []
+        if not text:
+            return []
+        self.blocks.append(text)
+        return [(len(self.blocks) - 1, text)]
+
+    # ---- 출력 ----
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    @property
+    def tail_html(self) -> str:
+        """열린 마지막 문단의 하이라이트 HTML (보류 중인 꼬리는 평문으로 덧붙임). 문단 길이에만 비례한다."""
+        return "".join(self._html) + self._pending
+
+    @property
+    def html(self) -> str:
+        """지금까지의 하이라이트 HTML 전체 (= html_blocks + tail_html)"""
+        return self._done_html + self.tail_html
+
+    def checkpoints(self):
+        """close() 이후 호출. _extract_checkpoints 와 같은 규칙(부족하면 문단 분리 대체)."""
+        if len(self.blocks) >= 5:
+            return self.blocks[:5]
+        paras = [p.strip() for p in self.text.strip().split("\n\n") if p.strip()]
+        return paras[:5]
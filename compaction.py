@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+
+from prompts import estimate_tokens
+
+# ====== 체크포인트별 대화 압축 ======
+# 한 체크포인트의 대화 로그가 토큰 임계치를 넘으면, 최근 K개 교환만 원문으로 두고
+# 그 이전 교환은 누적 요약 한 덩어리로 접는다.
+# 요약은 턴 처리 뒤 백그라운드에서 만들고, 다음 턴부터 준비된 것만 사용한다(대기하지 않음).
+# 요약은 접힌 교환들의 지문(fingerprint)과 함께 저장되므로, 해당 구간이 바뀌면 자동으로 무효가 된다.
+
+COMPACT_THRESHOLD_TOKENS = int(os.getenv("COMPACT_THRESHOLD_TOKENS", "800"))
+COMPACT_KEEP_RECENT = int(os.getenv("COMPACT_KEEP_RECENT", "3"))
+
+SUMMARIES = "cp_summaries"     # {cp_idx: {"key", "n", "summary"}}
+JOBS = "cp_summary_jobs"       # {cp_idx: {"key", "n", "future"}}
+
+
+def fingerprint(exchanges) -> str:
+    payload = json.dumps([[ex["user"], ex["assistant"]] for ex in exchanges], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _log_tokens(exchanges) -> int:
+    return sum(estimate_tokens(ex["user"]) + estimate_tokens(ex["assistant"]) for ex in exchanges)
+
+
+def needs_compaction(exchanges) -> bool:
+    return len(exchanges) > COMPACT_KEEP_RECENT and _log_tokens(exchanges) > COMPACT_THRESHOLD_TOKENS
+
+
+def view(summaries: dict, cp_idx, exchanges):
+    """
+    프롬프트에 넣을 (요약 또는 None, 원문으로 둘 교환 목록).
+    저장된 요약이 현재 로그의 앞부분과 일치할 때만 사용한다.
+    """
+    entry = (summaries or {}).get(cp_idx)
+    if entry and 0 < entry["n"] <= len(exchanges) and entry["key"] == fingerprint(exchanges[:entry["n"]]):
+        return entry["summary"], exchanges[entry["n"]:]
+    return None, exchanges
+
+
+def harvest(holder):
+    """끝난 백그라운드 요약을 세션 상태로 옮긴다 (메인 스레드에서 호출)."""
+    jobs = holder.get(JOBS) or {}
+    summaries = holder.setdefault(SUMMARIES, {})
+    for cp_idx, job in list(jobs.items()):
+        fut = job["future"]
+        if not fut.done():
+            continue
+        del jobs[cp_idx]
+        try:
+            text = fut.result()
+        except Exception:
+            continue
+        prev = summaries.get(cp_idx)
+        if text and (prev is None or prev["n"] < job["n"]):
+            summaries[cp_idx] = {"key": job["key"], "n": job["n"], "summary": text}
+
+
+def schedule(holder, cp_idx, exchanges, executor, summarize):
+    """
+    임계치를 넘었으면 최근 K개를 제외한 앞부분을 요약하는 작업을 건다.
+    summarize(prev_summary, new_exchanges) -> str 는 이전 요약에 새로 접히는 교환만 이어 붙여 요약한다.
+    """
+    harvest(holder)
+    if not needs_compaction(exchanges):
+        return
+    n = len(exchanges) - COMPACT_KEEP_RECENT
+    key = fingerprint(exchanges[:n])
+    jobs = holder.setdefault(JOBS, {})
+    job = jobs.get(cp_idx)
+    if job and job["key"] == key:
+        return
+    summaries = holder.setdefault(SUMMARIES, {})
+    prev_summary, rest = view(summaries, cp_idx, exchanges[:n])
+    if prev_summary is not None and not rest:
+        return                                   # 이미 최신 요약이 있음
+    if job:
+        job["future"].cancel()
+    jobs[cp_idx] = {
+        "key": key,
+        "n": n,
+        "future": executor.submit(summarize, prev_summary, list(rest)),
+    }
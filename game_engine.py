@@ -0,0 +1,976 @@
+import os, re, sys, json, time
+import random
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import speculation
+from story_pool import StoryPool
+from checkpoint_lexer import CheckpointLexer
+import prompts
+import compaction
+import metrics
+import llm_calls
+import llm_scheduler
+import name_extractor
+import session_model
+import story_json
+import tag_filter
+
+# ====== 게임 엔진 (Streamlit과 무관한 규칙/상태) ======
+# 게임 상태는 평범한 dict(또는 st.session_state 같은 매핑) 하나에 담긴다. 키 목록은 DEFAULTS.
+# GameEngine은 그 상태 위에서 규칙(턴/티켓/위험도/성공 판정/모드 전환)을 적용하고,
+# 스트리밍이 필요한 행동(start/intervene/reveal_ending)은 (종류, 데이터) 이벤트를 내는 제너레이터를 돌려준다.
+#   story.delta(str) / story.reset / story.ready(view)
+#   turn.delta(str)  / turn.done({"text", "turn"})
+#   ending.delta(str) / ending.done({"text", "success", "source"})
+# Streamlit 화면(game_play.py)과 HTTP/SSE 서버(game_server.py)가 같은 엔진과 이벤트를 쓴다.
+
+# ====== 환경 세팅 ======
+# openai 패키지 import(1초 가까이 걸림), .env 읽기, 클라이언트 생성은 첫 LLM 호출 직전까지 미룬다.
+# 랜딩 페이지는 이것 없이 그려지고, startup.py가 그동안 백그라운드에서 미리 불러 둔다.
+_client = None
+_worker_client = None
+_client_lock = threading.Lock()
+
+def _new_client():
+    from openai import OpenAI
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    # 로컬 대역 서버(mock_llm_server.py) 등 호환 서버를 쓸 때는 키가 없어도 된다
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    if not api_key and not base_url:
+        raise ValueError("OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+    # 재시도/백오프는 llm_scheduler가 맡으므로 SDK 자체 재시도는 끈다
+    return OpenAI(api_key=api_key or "local", base_url=base_url, max_retries=0)
+
+def get_client():
+    """스토리/턴/결말 스트리밍용 클라이언트 (처음 부를 때 만든다). 키가 없으면 ValueError."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _new_client()
+        return _client
+
+# 호출 지점별 모델/최대 토큰/마감/대체 모델은 model_routes.py (OPENAI_MODEL은 스토리·턴·결말의 기본 모델)
+
+# json: 인물·체크포인트를 한 번의 호출로 구조화해서 받음 (실패 시 자유 텍스트로 대체), text: 자유 텍스트만
+STORY_FORMAT = os.getenv("STORY_FORMAT", "json").strip().lower()
+_structured_story_unsupported = False     # 서버가 response_format을 거부하면 프로세스 동안 자유 텍스트만 사용
+
+# 현재 화면에서 미리 만들어 둔 결말을 기다리는 최대 시간(초). 넘으면 버리고 스트리밍으로 새로 생성
+OUTCOME_SPEC_WAIT_S = float(os.getenv("OUTCOME_SPEC_WAIT_S", "1.0"))
+
+MAX_TURNS = 20
+MAX_TICKETS = 3
+
+# ====== 백그라운드 작업용 클라이언트/스레드 ======
+# 스트리밍 중인 메인 클라이언트와 커넥션 풀을 공유하지 않도록 별도 클라이언트를 둔다.
+_bg_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BG_WORKERS", "8")), thread_name_prefix="about-time-bg")
+
+def _get_worker_client():
+    global _worker_client
+    with _client_lock:
+        if _worker_client is None:
+            _worker_client = _new_client()
+        return _worker_client
+
+def drain_background():
+    """지금까지 맡긴 백그라운드 작업(인물 추출·결말 추측·요약)이 끝날 때까지 기다린다. 시뮬레이터가 게임 묶음의 비용을 셀 때 사용."""
+    global _bg_executor
+    old = _bg_executor
+    _bg_executor = ThreadPoolExecutor(max_workers=old._max_workers, thread_name_prefix="about-time-bg")
+    old.shutdown(wait=True)
+
+# ====== 스토리 풀 ======
+# STORY_POOL_SIZE > 0 이면 미리 만들어 둔 스토리를 즉시 꺼내 쓴다 (0이면 사용 안 함)
+STORY_POOL_SIZE = int(os.getenv("STORY_POOL_SIZE", "0"))
+STORY_POOL_LOW_WATER = int(os.getenv("STORY_POOL_LOW_WATER", "2"))
+STORY_POOL_CONCURRENCY = int(os.getenv("STORY_POOL_CONCURRENCY", "2"))
+STORY_POOL_DIR = os.getenv("STORY_POOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".story_pool"))
+
+_story_pool = None
+_story_pool_lock = threading.Lock()
+
+def get_story_pool():
+    global _story_pool
+    if STORY_POOL_SIZE <= 0:
+        return None
+    with _story_pool_lock:
+        if _story_pool is None:
+            _story_pool = StoryPool(
+                _produce_pooled_story, STORY_POOL_DIR,
+                target=STORY_POOL_SIZE,
+                low_water=STORY_POOL_LOW_WATER,
+                concurrency=STORY_POOL_CONCURRENCY,
+            )
+            _story_pool.maybe_refill()
+        return _story_pool
+
+# ====== 지표 (metrics.py, /metrics 엔드포인트) ======
+metrics.Gauge("about_time_speculation", "결말 추측 누적 카운터", ("kind",),
+              collect=lambda: {(k,): v for k, v in speculation.stats().items()})
+metrics.Gauge("about_time_story_pool", "스토리 풀 상태", ("kind",),
+              collect=lambda: {(k,): v for k, v in (_story_pool.snapshot() if _story_pool else {}).items()})
+
+# ====== 상태 ======
+# 영속화(persistence.py) 대상 키. 나머지(추측/요약 작업, 프롬프트 캐시)는 프로세스 안에서만 의미가 있다.
+# 대화는 history(session_model.Exchange 목록) 한 곳에만 쌓고 체크포인트별 로그는 GameEngine.log()로 본다.
+# 하이라이트 HTML은 저장하지 않고 story_html()로 만든다.
+PERSIST_KEYS = (
+    "started", "turn", "tickets", "mode", "init_story", "checkpoints", "selected_cp",
+    "history", "present_outcome", "notes", "story_ready", "char1", "char2", "victim", "role",
+    "risk", "touched_cps", "improved_cps", compaction.SUMMARIES, "game_recorded",
+)
+
+DEFAULTS = {
+    "started": False,
+    "turn": 0,
+    "tickets": MAX_TICKETS,
+    "mode": "select_cp",        # select_cp, past, present, gameover
+    "init_story": "",
+    "checkpoints": [],
+    "selected_cp": None,
+    "history": [],
+    "present_outcome": "",
+    "notes": "",
+    "story_ready": False,
+    # 등장인물/역할
+    "char1": "",
+    "char2": "",
+    "victim": "",
+    "role": "",
+    # 위험도 관리
+    "risk": 0,
+    "touched_cps": set(),
+    "improved_cps": set(),
+    "game_recorded": False,
+    # 결말 추측 생성 (speculation.py)
+    "outcome_spec": None,
+    # 렌더링된 정적 프롬프트 세그먼트 (prompts.py)
+    "prompt_cache": {},
+    # 체크포인트별 대화 요약 (compaction.py)
+    compaction.SUMMARIES: {},
+    compaction.JOBS: {},
+}
+
+
+def init_state(state):
+    """빠진 키를 기본값으로 채운다 (가변 기본값은 새로 만든다). 이전 버전 상태는 압축 표현으로 바꾼다."""
+    for key, value in DEFAULTS.items():
+        if key not in state:
+            state[key] = type(value)() if isinstance(value, (list, dict, set)) else value
+    return session_model.compact(state)
+
+
+def release(state):
+    """메모리에서 내릴 세션: 진행 중인 결말 추측을 버리고 게임 키를 지운다 (다시 채우면 init_state가 기본값을 채움)."""
+    speculation.discard(state, "outcome_spec")
+    for key in DEFAULTS:
+        if key in state:
+            del state[key]
+
+
+_session_registry = None
+_session_registry_lock = threading.Lock()
+
+def get_session_registry() -> session_model.SessionRegistry:
+    """세션별 메모리 계산과 유휴/상한 정책 (Streamlit 화면과 게임 서버가 함께 쓴다)"""
+    global _session_registry
+    with _session_registry_lock:
+        if _session_registry is None:
+            _session_registry = session_model.SessionRegistry(PERSIST_KEYS, tuple(DEFAULTS), release)
+        return _session_registry
+
+metrics.Gauge("about_time_sessions_memory", "메모리에 올라 있는 세션 상태 (세션 수/바이트/누적 내림)", ("kind",),
+              collect=lambda: {(k,): v for k, v in (_session_registry.stats() if _session_registry else {}).items()})
+
+
+class GameError(Exception):
+    """규칙상 지금 할 수 없는 행동. 메시지는 플레이어에게 그대로 보여 준다."""
+
+
+# ====== 엔진 ======
+class GameEngine:
+    def __init__(self, state=None):
+        self.state = init_state({} if state is None else state)
+
+    # ---- 조회 ----
+    @property
+    def mode(self) -> str:
+        return self.state["mode"]
+
+    def selectable_checkpoints(self):
+        """타임슬립할 수 있는 체크포인트 번호(1부터). [엔딩] 문단은 제외."""
+        cp_list = self.state["checkpoints"]
+        if cp_list and _END_TAG.match(cp_list[-1]):
+            return list(range(1, len(cp_list)))
+        return list(range(1, len(cp_list) + 1))
+
+    def outcome_success(self) -> bool:
+        return is_success(self.state["present_outcome"])
+
+    def can_use_ticket(self) -> bool:
+        s = self.state
+        return (s["mode"] == "present" and bool(s["present_outcome"]) and not self.outcome_success()
+                and s["tickets"] > 0 and s["turn"] < MAX_TURNS)
+
+    def can_finish(self) -> bool:
+        s = self.state
+        return s["mode"] == "present" and bool(s["present_outcome"]) and (
+            self.outcome_success() or not self.can_use_ticket())
+
+    def log(self, cp_idx: int) -> session_model.CpView:
+        """한 체크포인트의 교환 목록 (history의 색인, 복사하지 않음)"""
+        return session_model.CpView(self.state["history"], cp_idx)
+
+    def view(self) -> dict:
+        """클라이언트에 보여 줄 상태 (JSON 직렬화 가능). 위험도 같은 숨은 수치는 빼고 보낸다."""
+        s = self.state
+        cp = s["selected_cp"]
+        return {
+            "mode": s["mode"],
+            "started": bool(s["started"]),
+            "turn": s["turn"],
+            "max_turns": MAX_TURNS,
+            "tickets": s["tickets"],
+            "max_tickets": MAX_TICKETS,
+            "story_ready": bool(s["story_ready"]),
+            "story": s["init_story"],
+            "checkpoints": [
+                {"number": i + 1, "text": strip_cp_tag(block), "selectable": (i + 1) in self.selectable_checkpoints()}
+                for i, block in enumerate(s["checkpoints"])
+            ],
+            "characters": [s["char1"], s["char2"]] if s["char1"] else [],
+            "role": s["role"],
+            "victim": s["victim"],
+            "selected_checkpoint": None if cp is None else cp + 1,
+            "log": [dict(ex) for ex in self.log(cp)] if cp is not None else [],
+            "outcome": ({"text": strip_ending_tag(s["present_outcome"]), "success": self.outcome_success()}
+                        if s["present_outcome"] else None),
+            "can_use_ticket": self.can_use_ticket(),
+            "can_finish": self.can_finish(),
+        }
+
+    # ---- 스토리 ----
+    def start(self):
+        """게임 시작: 스토리가 없으면 풀에서 꺼내거나 스트리밍 생성. 이벤트 제너레이터를 반환한다."""
+        self.state["started"] = True
+        return self._start_events()
+
+    def _start_events(self):
+        s = self.state
+        if not s["checkpoints"]:
+            pool = get_story_pool()
+            pooled = pool.pop() if pool else None
+            if pooled:
+                self._apply_story(pooled)
+        if not s["checkpoints"]:
+            # 첫 체크포인트 문단이 완성되는 즉시, 로컬 추출로 부족하면 LLM 인물 추출을 백그라운드로 시작
+            cast_future = {}
+
+            def _start_cast(first_block):
+                if not name_extractor.first_block_is_clear(first_block):
+                    cast_future["f"] = _bg_executor.submit(_extract_characters, first_block, _get_worker_client())
+
+            story, checkpoints, cast, _ = yield from _story_events(on_first_block=_start_cast)
+            c1, c2, victim = cast or _collect_cast(story, cast_future.get("f"), checkpoints)
+            self._apply_story({
+                "init_story": story, "checkpoints": checkpoints,
+                "char1": c1, "char2": c2, "victim": victim,
+            })
+        yield "story.ready", self.view()
+
+    def _apply_story(self, entry: dict):
+        s = self.state
+        s["init_story"] = entry["init_story"]
+        s["checkpoints"] = list(entry["checkpoints"])
+        s["char1"], s["char2"] = sys.intern(entry["char1"]), sys.intern(entry["char2"])
+        s["victim"] = sys.intern(entry["victim"])
+        s["role"] = _other_of(s["char1"], s["char2"], s["victim"])
+        s["story_ready"] = True
+
+    # ---- 타임슬립 / 개입 ----
+    def time_slip(self, cp_num: int):
+        s = self.state
+        if s["mode"] != "select_cp":
+            raise GameError("지금은 타임슬립할 수 없습니다.")
+        if not s["role"].strip():
+            raise GameError("스토리가 아직 준비되지 않았습니다.")
+        if cp_num not in self.selectable_checkpoints():
+            raise GameError("돌아갈 수 없는 체크포인트입니다.")
+        s["selected_cp"] = cp_num - 1
+        s["mode"] = "past"
+
+    def intervene(self, text: str):
+        """플레이어 개입 한 턴. 규칙 위반은 바로 GameError, 통과하면 이벤트 제너레이터를 반환한다."""
+        s = self.state
+        if s["mode"] != "past" or s["selected_cp"] is None:
+            raise GameError("체크포인트를 먼저 선택하세요.")
+        if s["turn"] >= MAX_TURNS:
+            raise GameError("턴이 모두 소진되었습니다. 현재로 돌아가 결말을 확인하세요.")
+        if not (text or "").strip():
+            raise GameError("먼저 답변을 입력해주세요!")
+        return self._intervene_events(text)
+
+    def _intervene_events(self, text: str):
+        s = self.state
+        compaction.harvest(s)
+        cp_idx = s["selected_cp"]
+        cp_body = strip_cp_tag(s["checkpoints"][cp_idx])
+        saved = (s["turn"], s["risk"], set(s["improved_cps"]))
+        s["turn"] += 1
+        try:
+            messages = self._cp_messages(cp_idx, cp_body, text)
+            visible_text = yield from self._turn_events(messages, cp_idx)
+        except BaseException:
+            # 실패/중단: 턴과 위험도를 되돌려 같은 입력으로 다시 제출할 수 있게 둔다
+            s["turn"], s["risk"], s["improved_cps"] = saved
+            raise
+        metrics.TURNS.inc()
+        # 개입 집계
+        s["touched_cps"].add(cp_idx)
+        s["history"].append(session_model.Exchange(cp_idx, text, visible_text))
+
+        # 새 개입 반영 후 결말 캐시 무효화 (다음에 현재로 돌아가면 새 엔딩 생성)
+        s["present_outcome"] = ""
+        # 바뀐 상태 기준으로 결말을 미리 생성해 둔다 (이전 추측은 취소)
+        self._speculate_outcome()
+        # 로그가 길어졌으면 오래된 교환을 요약으로 접어 둔다 (다음 턴부터 사용)
+        compaction.schedule(
+            s, cp_idx, self.log(cp_idx),
+            _bg_executor, functools.partial(_summarize_exchanges, s["role"] or "플레이어"),
+        )
+        yield "turn.done", {"text": visible_text, "turn": s["turn"]}
+
+    def _turn_events(self, messages, cp_idx: int):
+        """이벤트 스트림 (STATUS 태그는 스트림 안에서 제거) → 태그가 닫히는 즉시 risk 갱신 + 개선 집계"""
+        s = self.state
+        status_seen = []
+
+        def _on_tag(name, value):
+            if name != "STATUS" or status_seen:
+                return
+            status_seen.append(value)
+            delta = tag_filter.status_delta(value)
+            # 누적 위험도 갱신
+            s["risk"] += delta
+            if delta < 0:
+                s["improved_cps"].add(cp_idx)
+
+        tags = tag_filter.TagFilter(_on_tag)
+        for ch in llm_calls.chat("turn", get_client(), stream=True, messages=messages):
+            shown = tags.feed(ch.choices[0].delta.content or "")
+            if shown:
+                yield "turn.delta", shown
+        tail = tags.close()
+        if tail:
+            yield "turn.delta", tail
+        return tags.text
+
+    def _cp_messages(self, cp_idx: int, cp_body: str, user_input: str):
+        s = self.state
+        role   = s["role"].strip() or "플레이어"
+        victim = s["victim"].strip() or "피해자"
+        c1     = s["char1"] or role
+        c2     = s["char2"] or victim
+        partner = c2 if role == c1 else c1
+
+        cp_turn    = len(self.log(cp_idx))
+        total_turn = int(s["turn"])
+        risk_now   = int(s["risk"])
+
+        rnd = random.Random(f"{total_turn}-{cp_idx}-{risk_now}")
+        r = rnd.random()
+
+        # 톤 프로파일 선택
+        if cp_turn == 0:
+            tone_profile = "negative_anchor" if r < 0.6 else ("subtle_mixed" if r < 0.8 else "positive_feint")
+        else:
+            if r < 0.4:
+                tone_profile = "positive_feint"
+            elif r < 0.7:
+                tone_profile = "subtle_mixed"
+            else:
+                tone_profile = "negative_anchor"
+
+        # 사람이 읽을 톤 이름
+        tone_kind = {
+            "negative_anchor": "부정적",
+            "positive_feint":  "긍정적",
+            "subtle_mixed":    "미묘"
+        }.get(tone_profile, "미묘")
+
+        # 안정적인 것부터: 전역 규칙 → 인물 → 체크포인트 → 이전 대화 → 톤 규칙 → 플레이어 입력
+        cache = s["prompt_cache"]
+        names = dict(c1=c1, c2=c2, role=role, partner=partner, victim=victim)
+        P = prompts
+        segs = [
+            P.segment("system", P.render("turn_global", cache), P.GLOBAL, "global"),
+            P.segment("system", P.render("turn_context", cache, **names), P.SESSION, "context"),
+            P.segment("user", P.render("turn_checkpoint", cache, cp_body=cp_body), P.CHECKPOINT, "checkpoint"),
+        ]
+        summary, recent = compaction.view(s.get(compaction.SUMMARIES), cp_idx, self.log(cp_idx))
+        if summary:
+            segs.append(P.segment("user", P.render("turn_summary", role=role, summary=summary), P.HISTORY, "summary"))
+        for ex in recent:
+            segs.append(P.segment("user", P.render("turn_prior_user", role=role, user=ex["user"]), P.HISTORY, "history"))
+            segs.append(P.segment("assistant", ex["assistant"], P.HISTORY, "history"))
+        tone_rules = P.render(f"tone_{tone_profile}", cache, partner=partner)
+        segs.append(P.segment("system", P.render("turn_tone", tone_kind=tone_kind, partner=partner, role=role, tone_rules=tone_rules), P.TURN, "tone"))
+        segs.append(P.segment("user", P.render("turn_input", user_input=user_input), P.TURN, "input"))
+
+        msgs, report = P.assemble(segs)
+        P.record("turn", report)
+        return msgs
+
+    def return_to_present(self):
+        if self.state["mode"] != "past":
+            raise GameError("과거에 있을 때만 현재로 돌아갈 수 있습니다.")
+        self.state["mode"] = "present"
+
+    # ---- 결말 ----
+    def outcome_snapshot(self) -> dict:
+        """결말 생성에 필요한 상태만 복사 (백그라운드 스레드에서 게임 상태를 읽지 않도록)"""
+        s = self.state
+        return {
+            "init_story": s["init_story"],
+            "checkpoints": list(s["checkpoints"]),
+            "cp_logs": session_model.cp_logs(s["history"], len(s["checkpoints"])),
+            "risk": int(s["risk"]),
+            "touched_cps": set(s.get("touched_cps", set())),
+            "improved_cps": set(s.get("improved_cps", set())),
+            "role": s["role"],
+            "victim": s["victim"],
+            "char1": s["char1"],
+            "char2": s["char2"],
+            "prompt_cache": s["prompt_cache"],
+            "cp_summaries": dict(s.get(compaction.SUMMARIES, {})),
+        }
+
+    def _speculate_outcome(self):
+        snap = self.outcome_snapshot()
+        speculation.submit(
+            self.state, "outcome_spec", outcome_key(snap),
+            _bg_executor, _generate_outcome_nonstream, snap, _get_worker_client(),
+        )
+
+    def reveal_ending(self):
+        """현재의 결말. 이미 만든 결말이 있으면 그대로, 없으면 추측 결과나 스트리밍 생성. 이벤트 제너레이터를 반환한다."""
+        if self.state["mode"] != "present":
+            raise GameError("현재로 돌아온 뒤에 결말을 확인할 수 있습니다.")
+        return self._ending_events()
+
+    def _ending_events(self):
+        s = self.state
+        source = "cached"
+        # 티켓 직후에는 결말을 다시 생성하지 않음
+        if not s["present_outcome"]:
+            entered = time.monotonic()
+            snap = self.outcome_snapshot()
+            # 미리 만들어 둔 결말이 곧 끝나면 쓰고, 아니면 버리고 스트리밍으로 바로 보낸다
+            outcome = speculation.take(s, "outcome_spec", outcome_key(snap), timeout=OUTCOME_SPEC_WAIT_S)
+            if outcome is None:
+                source = "stream"
+                tags = tag_filter.TagFilter()
+                for ch in llm_calls.chat("outcome", get_client(), stream=True, messages=_outcome_messages(snap)):
+                    shown = tags.feed(ch.choices[0].delta.content or "")
+                    if shown:
+                        if entered is not None:
+                            metrics.PRESENT_FIRST_TEXT.observe(time.monotonic() - entered, source="stream")
+                            entered = None
+                        yield "ending.delta", shown
+                tail = tags.close()
+                if tail:
+                    yield "ending.delta", tail
+                outcome = tags.raw.strip()
+            else:
+                source = "speculation"
+                metrics.PRESENT_FIRST_TEXT.observe(time.monotonic() - entered, source="speculation")
+            s["present_outcome"] = outcome
+            metrics.OUTCOMES.inc(result="success" if is_success(outcome) else "failure")
+        yield "ending.done", {
+            "text": strip_ending_tag(s["present_outcome"]), "success": self.outcome_success(), "source": source,
+        }
+
+    def use_ticket(self):
+        """실패한 결말을 확인한 뒤 티켓 한 장으로 체크포인트 선택 화면으로 돌아간다."""
+        if not self.can_use_ticket():
+            raise GameError("지금은 티켓을 사용할 수 없습니다.")
+        s = self.state
+        s["tickets"] -= 1
+        metrics.TICKETS_USED.inc()
+        s["present_outcome"] = ""  # 결말 캐시 초기화
+        s["mode"] = "select_cp"
+
+    def finish(self):
+        """게임 종료 화면으로. 게임당 한 번만 집계한다."""
+        if not self.can_finish():
+            raise GameError("아직 게임을 끝낼 수 없습니다.")
+        s = self.state
+        s["mode"] = "gameover"
+        if not s.get("game_recorded"):
+            s["game_recorded"] = True
+            metrics.GAMES.inc(result="success" if self.outcome_success() else "failure")
+            metrics.GAME_TURNS.observe(s["turn"])
+            metrics.GAME_TICKETS.observe(MAX_TICKETS - s["tickets"])
+
+    def close(self):
+        """진행 중인 백그라운드 추측을 버린다 (새 게임/세션 정리)."""
+        speculation.discard(self.state, "outcome_spec")
+
+
+# ====== 텍스트 유틸 ======
+_END_TAG = re.compile(r'^\s*\[(?:엔딩|결말|체크포인트\s*5|CP5)(?::[^\]]*)?\]')
+
+def strip_cp_tag(text: str) -> str:
+    return re.sub(
+        r'^\s*\[(?:체크포인트\s*[1-5]|CP[1-5]|엔딩|결말)(?::[^\]]*)?\]\s*',
+        '',
+        text.strip()
+    )
+
+def extract_checkpoints(text: str):
+    pattern = r'\s*(?=\[(?:체크포인트\s*[1-5]|CP[1-5]|엔딩|결말)(?::[^\]]*)?\])'
+    blocks = re.split(pattern, text)
+    chunks = [b.strip() for b in blocks if b.strip()]
+    if len(chunks) >= 5:
+        return chunks[:5]
+    paras = [p.strip() for p in text.strip().split("\n\n") if p.strip()]
+    return paras[:5]
+
+
+FIRST_CP_TAG = re.compile(r'^\[(?:체크포인트\s*1|CP1)(?::[^\]]*)?\]')
+
+@functools.lru_cache(maxsize=256)
+def story_html(text: str) -> str:
+    """화면용 하이라이트 HTML. 세션에 저장하지 않고 본문에서 만든다 (진행 중인 게임들의 본문만 캐시에 남음)."""
+    return highlight_checkpoints(text)
+
+def highlight_checkpoints(text: str) -> str:
+    pattern = r'\[(?:체크포인트\s*[1-5]|CP[1-5]|엔딩|결말)(?::[^\]]*)?\]'
+    return re.sub(
+        pattern,
+        lambda m: f"<span class='checkpoint-label'>{m.group(0)}</span>",
+        text
+    )
+
+def is_success(outcome: str) -> bool:
+    m = re.search(r"<ENDING:\s*(success|failure)\s*>", outcome, re.I)
+    return bool(m and m.group(1).lower() == "success")
+
+def strip_ending_tag(text: str) -> str:
+    return re.sub(
+        r"""["“”']?\s*<ENDING:\s*(?:success|failure)\s*>\s*["“”']?\s*$""",
+        "",
+        text.strip(),
+        flags=re.IGNORECASE
+    )
+
+# ====== 스토리 생성 ======
+_STORY_SYSTEM_QUERY = """
+    너는 최고의 시나리오 작가다.
+    아래 규칙을 모두 지켜 ‘대한민국’을 배경으로 한 자연스럽고 개연성 있는 **연인의 죽음** 서사를 정확히 5문단으로 작성하라.
+    다시 한 번 기억하라. 너는 최고의 시나리오 작가다. 다양한 소재로 스토리를 만들어라.
+
+    [형식]
+    - 각 문단은 반드시 다음 머리표로 시작한다: [체크포인트 1: 소제목 1] … [체크포인트 4: 소제목 4], [엔딩: 소제목 5]
+    - 소제목은 문단의 핵심 사건을 요약한 짧고 자연스러운 한국어 표현으로 작성한다.
+    - 머리표 다음 줄에서 바로 본문을 시작하며, 본문은 줄바꿈 이후에만 작성한다.
+    - 정확히 5문단만 출력한다. 제목/서론/요약/맺음말/추가 문구/메타 발언은 금지한다(머리표 제외).
+
+    [등장인물]
+    - 오직 두 인물만 등장한다. 이름은 2글자의 한글 이름으로만 표기한다(예: 민우, 지연 등).
+    - 성(姓)/영문/별칭/이모지/괄호 설명은 금지한다.
+    - 첫 문단 첫 문장에 반드시 두 인물의 이름을 모두 명시한다.
+    - 제3의 ‘사람’(경찰/의사/친구/가해자/목격자 등)이 고유명사나 대사/능동적 결정으로 등장하는 것은 금지한다.
+    (비·도로·신호·차량 등 ‘배경/사물/환경’은 묘사 가능하되, 특정 인물을 행위 주체로 만들지 마라.)
+
+    [내용 구조]
+    - 이 이야기는 **연인 관계의 두 사람**이 주인공이다.
+    - [체크포인트 1]~[체크포인트 4]:
+    - 각 문단은 **구체적이고 현실적인 사건 하나만** 다룬다.
+    - 각 사건은 반드시 두 인물의 상호작용(대화나 행동)을 포함해야 하며, 만약 한 캐릭터가 과거로 시간 이동을 한다면 해당 사건에 개입할 수 있게 사건이 전개되어야 한다.
+    - 즉, 한쪽 인물의 단독 행동(혼자 사고, 혼자 병에 걸림 등)으로만 사건이 전개되는 것은 금지한다.
+    - 사건은 훗날 [엔딩]의 비극에 **직접 작용하는 원인(플래그)**이 되어야 하며, 점층적으로 위험이 커지는 연쇄가 되어야 한다.
+    - [엔딩]: 두 사람 중 한 명이 최종적으로 **죽음** 혹은 **돌이킬 수 없는 상실**을 맞이한다.
+        - [엔딩]에서의 비극은 앞선 4개의 사건 중 **최소 2개 이상의 플래그가 겹쳐** 필연적으로 발생한 결과임을 자연스럽게 드러내야 한다.
+    - “갑자기/우연히/운명처럼” 식의 돌발 전개 금지. **사건 단서 -> 선택/행동 -> 결과**의 인과를 명확히 보여라.
+    - 마지막 문장의 끝에서 반드시 피해자의 이름을 직접 명시한다. (예: “… 결국 민우는 숨을 거둔다.”)
+
+    [문체/언어]
+    - 성인이 쉽게 이해할 수 있는 **직관적인 한국어**로 쓴다. 영문 철자 금지(외래어는 한글 표기).
+    - 추상적·과장된 표현 금지: “비극의 기로”, “운명의 굴레”, “영혼 깊숙이” 등.
+    - 등장인물의 대사는 반드시 **일상적이고 현실적인 한국어 대화**여야 한다.
+    - 각 문단은 3~5문장으로 간결하게 쓴다.
+
+    명심해라. 전체 스토리 설정과 전개는 모두 타당하고 자연스러워야 해. 너가 최고의 작가라는 것을 잊지마.
+    """
+
+_STORY_USER_QUERY = (
+    "위 규칙을 정확히 지켜 정확히 5문단의 이야기를 작성하라. "
+    "[체크포인트 1: …]~[체크포인트 4: …], [엔딩: …] 형식을 반드시 지키고, "
+    "각 문단은 하나의 구체적 사건만 다루며 두 인물이 모두 관여할 수 있도록 하라. "
+    "각 문단이 자연스럽게 연결되어 엔딩의 비극으로 이어지게 만들어라."
+)
+
+_STORY_JSON_USER_QUERY = (
+    "위 규칙을 정확히 지켜 이야기를 작성하되, 머리표 대신 JSON으로만 출력하라. "
+    "characters에는 두 인물의 2글자 이름을 첫 문장에 등장하는 순서대로, victim에는 엔딩에서 비극을 맞는 인물의 이름을 넣는다. "
+    "checkpoints에는 [체크포인트 1]~[체크포인트 4]에 해당하는 4개 문단을 순서대로, ending에는 [엔딩] 문단을 넣는다. "
+    "각 문단의 title은 소제목(머리표·대괄호 없이), body는 본문이다. "
+    "각 문단은 하나의 구체적 사건만 다루며 두 인물이 모두 관여할 수 있도록 하고, 엔딩의 비극으로 자연스럽게 이어지게 만들어라."
+)
+
+def _story_messages(structured=False):
+    return [
+        {"role": "system", "content": _STORY_SYSTEM_QUERY},
+        {"role": "user", "content": _STORY_JSON_USER_QUERY if structured else _STORY_USER_QUERY},
+    ]
+
+def _lex_story(deltas, on_first_block=None):
+    """
+    자유 텍스트 델타를 story.delta 이벤트로 내보내며 CheckpointLexer로 문단을 나눈다 (반환: 렉서).
+    on_first_block: [체크포인트 1] 문단이 끝나는 순간(다음 머리표 등장) 그 문단 텍스트로 한 번 호출
+    """
+    lexer = CheckpointLexer()
+    first_block_sent = on_first_block is None
+
+    def _on_blocks(events):
+        nonlocal first_block_sent
+        for _, block in events:
+            if not first_block_sent and FIRST_CP_TAG.match(block):
+                first_block_sent = True
+                on_first_block(block)
+
+    for delta in deltas:
+        if not delta:
+            continue
+        _on_blocks(lexer.feed(delta))
+        yield "story.delta", delta
+    _on_blocks(lexer.close())
+    return lexer
+
+def _story_events(on_first_block=None):
+    """
+    스토리를 스트리밍 생성하고 (본문, 체크포인트 목록, 인물, 하이라이트 HTML)을 반환한다.
+    인물은 구조화 생성이 성공했을 때 (이름1, 이름2, 피해자), 자유 텍스트 경로면 None.
+    on_first_block은 자유 텍스트 경로에서만 호출된다 (구조화 경로는 인물을 함께 받으므로 불필요).
+    """
+    if STORY_FORMAT == "json" and not _structured_story_unsupported:
+        result = yield from _structured_story_events()
+        if result is not None:
+            return result
+
+    response = llm_calls.chat("story", get_client(), messages=_story_messages(), stream=True)
+    lexer = yield from _lex_story((chunk.choices[0].delta.content or "" for chunk in response), on_first_block)
+    return lexer.text, lexer.checkpoints(), None, lexer.html
+
+def _structured_story_events():
+    """구조화 스토리를 스트리밍. 실패하면 story.reset을 내고 None (호출 측이 자유 텍스트로 다시 생성)."""
+    global _structured_story_unsupported
+    from openai import BadRequestError
+    stream = story_json.StoryStream()
+    sent = []
+    try:
+        response = llm_calls.chat(
+            "story", get_client(),
+            messages=_story_messages(structured=True),
+            response_format=story_json.RESPONSE_FORMAT,
+            stream=True,
+        )
+        for chunk in response:
+            delta = stream.feed(chunk.choices[0].delta.content or "")
+            if delta:
+                sent.append(delta)
+                yield "story.delta", delta
+        tail = stream.close()
+        if tail:
+            sent.append(tail)
+            yield "story.delta", tail
+        story_text, checkpoints, cast = story_json.validate(stream.document())
+    except BadRequestError:
+        _structured_story_unsupported = True
+        story_json.STORY_FORMAT_RESULTS.inc(site="story", result="error")
+        if sent:
+            yield "story.reset", None
+        return None
+    except Exception:
+        story_json.STORY_FORMAT_RESULTS.inc(site="story", result="invalid")
+        if sent:
+            yield "story.reset", None
+        return None
+    story_json.STORY_FORMAT_RESULTS.inc(site="story", result="ok")
+    c1, c2, victim = (_clean_korean_name(x) for x in cast)
+    return story_text, checkpoints, (c1, c2, victim), highlight_checkpoints(story_text)
+
+def _produce_pooled_story(llm=None) -> dict:
+    """스토리 풀용: 비스트리밍으로 스토리를 만들고 체크포인트/인물/HTML까지 파싱해 반환"""
+    llm = llm or _get_worker_client()
+    if STORY_FORMAT == "json" and not _structured_story_unsupported:
+        entry = _produce_structured_story(llm)
+        if entry is not None:
+            return entry
+    resp = llm_calls.chat("story_pool", llm, messages=_story_messages())
+    story = resp.choices[0].message.content.strip()
+    checkpoints = extract_checkpoints(story)
+    cast = name_extractor.confident_cast(story, checkpoints)
+    chars = [] if cast or not checkpoints else _extract_characters(checkpoints[0], llm)
+    if cast:
+        c1, c2, victim = cast
+    elif len(chars) == 2:
+        c1, c2, victim = chars[0], chars[1], _resolve_victim(story, chars, checkpoints)
+    else:
+        c1, c2, victim = _extract_cast_and_victim(story, checkpoints, llm=llm)
+    return {
+        "init_story": story,
+        "init_story_html": story_html(story),
+        "checkpoints": checkpoints,
+        "char1": c1,
+        "char2": c2,
+        "victim": victim,
+    }
+
+def _produce_structured_story(llm) -> dict:
+    global _structured_story_unsupported
+    from openai import BadRequestError
+    try:
+        resp = llm_calls.chat(
+            "story_pool", llm,
+            messages=_story_messages(structured=True),
+            response_format=story_json.RESPONSE_FORMAT,
+        )
+        story, checkpoints, cast = story_json.validate(story_json.parse_document(resp.choices[0].message.content))
+    except BadRequestError:
+        _structured_story_unsupported = True
+        story_json.STORY_FORMAT_RESULTS.inc(site="story_pool", result="error")
+        return None
+    except Exception:
+        story_json.STORY_FORMAT_RESULTS.inc(site="story_pool", result="invalid")
+        return None
+    story_json.STORY_FORMAT_RESULTS.inc(site="story_pool", result="ok")
+    c1, c2, victim = (_clean_korean_name(x) for x in cast)
+    return {
+        "init_story": story,
+        "init_story_html": story_html(story),
+        "checkpoints": checkpoints,
+        "char1": c1,
+        "char2": c2,
+        "victim": victim,
+    }
+
+# ====== 결말 생성 ======
+def outcome_key(snap: dict) -> str:
+    """(risk, touched_cps, improved_cps, cp_logs) 해시 — 결말 추측의 유효성 판단용"""
+    payload = json.dumps(
+        [snap["risk"], sorted(snap["touched_cps"]), sorted(snap["improved_cps"]),
+         [[cp, [[ex["user"], ex["assistant"]] for ex in exs]] for cp, exs in sorted(snap["cp_logs"].items())]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _summarize_exchanges(role: str, prev_summary, exchanges, llm=None) -> str:
+    """이전 요약 + 새로 접히는 교환 → 새 누적 요약 (백그라운드 스레드에서 실행)"""
+    llm = llm or _get_worker_client()
+    P = prompts
+    log = "\n".join(
+        P.render("summary_exchange", role=role, user=ex["user"], assistant=ex["assistant"])
+        for ex in exchanges
+    )
+    segs = [P.segment("system", P.render("summary_system"), P.GLOBAL, "global")]
+    if prev_summary:
+        segs.append(P.segment("user", P.render("summary_prev", summary=prev_summary), P.HISTORY, "summary"))
+    segs.append(P.segment("user", P.render("summary_new", log=log), P.TURN, "log"))
+    messages, report = P.assemble(segs)
+    P.record("summary", report)
+    resp = llm_calls.chat("summary", llm, messages=messages)
+    return resp.choices[0].message.content.strip()
+
+def _history_text_for_outcome(snap: dict) -> str:
+    """각 체크포인트 원래 사건 + 플레이어 개입 전체 기록을 요약"""
+    lines = []
+    for cp_idx, exchanges in snap["cp_logs"].items():
+        cp_raw = snap["checkpoints"][cp_idx]
+        cp_body = strip_cp_tag(cp_raw)
+
+        lines.append(f"[체크포인트 {cp_idx+1}] 원래 사건: {cp_body}")
+        summary, exchanges = compaction.view(snap.get("cp_summaries"), cp_idx, exchanges)
+        if summary:
+            lines.append(f"  - 이전 개입 요약: {summary}")
+        for ex in exchanges:
+            lines.append(f"  - 개입: {ex['user']}")
+            lines.append(f"    결과: {ex['assistant']}")
+    return "\n".join(lines) if lines else "아직 개입 기록이 없습니다."
+
+
+def _outcome_messages(snap: dict):
+    """결말 생성 프롬프트. 게임 상태 대신 스냅샷만 사용한다 (백그라운드 추측 생성 가능)."""
+    summary = _history_text_for_outcome(snap)
+    role = snap["role"] or "플레이어"
+    victim = snap["victim"] or "피해자"
+    c1 = snap["char1"] or role
+    c2 = snap["char2"] or victim
+
+    # 현재 누적 상태
+    risk = int(snap["risk"])
+    touched = snap["touched_cps"]
+    improved = snap["improved_cps"]
+    touched_cnt  = len(touched)
+    improved_cnt = len(improved)
+
+    # 성공/실패 기준
+    is_success = (risk <= -2 and touched_cnt >= 2 and improved_cnt >= 2)
+
+    # 실패 모드 분기(원인 유지 vs 나비효과)
+    worsened_cnt = max(0, touched_cnt - improved_cnt)  # 악화로 볼 수 있는 개입 수 추정
+    if not is_success:
+        if improved_cnt == 0 or worsened_cnt > 0:
+            failure_mode = "same"        # 원래 원인이 그대로 남아 같은 형태의 비극
+        else:
+            failure_mode = "butterfly"   # 일부 완화는 되었으나 다른 조합으로 비극(새 형태)
+
+    cache = snap.get("prompt_cache")
+    P = prompts
+    if is_success:
+        variant = P.render("outcome_success", victim=victim)
+    else:
+        hint = P.render("failure_same" if failure_mode == "same" else "failure_butterfly", cache)
+        variant = P.render("outcome_failure", victim=victim, failure_hint=hint)
+
+    segs = [
+        P.segment("system", P.render("outcome_global", cache), P.GLOBAL, "global"),
+        P.segment("system", P.render("outcome_context", cache, c1=c1, c2=c2, victim=victim), P.SESSION, "context"),
+        P.segment("user", P.render("outcome_story", cache, full_story=snap["init_story"]), P.SESSION, "story"),
+        P.segment("user", P.render("outcome_history", summary=summary), P.HISTORY, "history"),
+        P.segment("system", variant, P.TURN, "outcome_rules"),
+    ]
+    messages, report = P.assemble(segs)
+    P.record("outcome", report)
+    return messages
+
+def _generate_outcome_nonstream(snap: dict, llm=None) -> str:
+    """세션 상태 대신 스냅샷만 사용한다 (백그라운드 추측 생성 가능)."""
+    llm = llm or get_client()
+    resp = llm_calls.chat(
+        "outcome", llm,
+        priority=llm_scheduler.BACKGROUND,      # 추측 생성: 플레이어가 기다리는 호출에 자리를 양보
+        messages=_outcome_messages(snap),
+    )
+    return resp.choices[0].message.content.strip()
+
+# ====== 이름 추출 ======
+def _clean_korean_name(name: str) -> str:
+    if not isinstance(name, str):
+        return ""
+    n = name.strip()
+    # 앞뒤 불필요한 기호 제거
+    n = re.sub(r'^[\"\'\(\)\[\]\{\}\,\.\?\!~…·\-:;]+', '', n)
+    n = re.sub(r'[\"\'\(\)\[\]\{\}\,\.\?\!~…·\-:;]+$', '', n)
+
+    # 조사 제거: 단, 조사 제거 후 이름이 2글자 미만으로 줄어들면 그대로 둠
+    tmp = re.sub(r'(은|는|이|가|을|를|과|와|랑|도|만)$', '', n)
+    if len(tmp) >= 2:
+        n = tmp
+
+    # 최종적으로 2~3글자 한글만 허용
+    m = re.match(r'^[가-힣]{2,3}$', n)
+    return m.group(0) if m else n
+
+def _parse_json_reply(raw: str):
+    raw = raw.strip()
+    # 혹시 코드펜스(````json````)로 출력되면 제거
+    raw = raw.strip("```").strip()
+    if raw.startswith("json"):
+        raw = raw[4:].strip()
+    return json.loads(raw)
+
+def _extraction_messages(task: str, text: str):
+    P = prompts
+    segs = [
+        P.segment("system", P.render("extract_system"), P.GLOBAL, "global"),
+        P.segment("user", P.render(task), P.GLOBAL, "instruction"),
+        P.segment("user", P.render("extract_text", text=text), P.SESSION, "text"),
+    ]
+    messages, report = P.assemble(segs)
+    P.record(task, report)
+    return messages
+
+def _extract_characters(first_block: str, llm=None):
+    """
+    첫 체크포인트 문단만으로 두 인물 이름을 추출한다 (백그라운드 스레드에서 실행).
+    게임 상태에 접근하지 않으며, 실패하면 빈 리스트를 반환한다.
+    """
+    llm = llm or get_client()
+    try:
+        resp = llm_calls.chat(
+            "extract_characters", llm,
+            messages=_extraction_messages("extract_characters", first_block),
+        )
+        data = _parse_json_reply(resp.choices[0].message.content)
+        chars = [_clean_korean_name(x) for x in data.get("characters", []) if isinstance(x, str)]
+        chars = [c for c in chars if re.match(r'^[가-힣]{2,3}$', c)]
+        return chars if len(chars) == 2 and chars[0] != chars[1] else []
+    except Exception:
+        return []
+
+def _resolve_victim(story_text: str, chars, checkpoints=None):
+    """
+    LLM이 고른 두 인물 중 피해자. 로컬 추출과 같은 규칙(name_extractor.find_victim: [엔딩] 문단의
+    죽음/상실 술어, 단서가 없을 때만 위치)으로 골라 엔진과 추출기가 서로 다른 피해자를 내지 않게 한다.
+    """
+    victim, _ = name_extractor.find_victim(name_extractor.story_blocks(story_text, checkpoints), list(chars))
+    return victim
+
+def _collect_cast(story_text: str, future=None, checkpoints=None):
+    """
+    로컬 추출이 충분히 확실하면 그대로 쓴다. 아니면 백그라운드 인물 추출 결과를 합치고,
+    그것도 실패하면 전체 스토리 기반 추출로 되돌아간다.
+    """
+    cast = name_extractor.confident_cast(story_text, checkpoints)
+    if cast:
+        if future is not None:
+            future.cancel()
+        return cast
+    chars = []
+    if future is not None:
+        try:
+            chars = future.result()
+        except Exception:
+            chars = []
+    if len(chars) == 2:
+        return chars[0], chars[1], _resolve_victim(story_text, chars, checkpoints)
+    return _extract_cast_and_victim(story_text, checkpoints)
+
+def _extract_cast_and_victim(story_text: str, checkpoints, llm=None):
+    """게임 상태를 읽지 않는다 (백그라운드 스레드에서 호출 가능)."""
+    llm = llm or get_client()
+    try:
+        resp = llm_calls.chat(
+            "extract_cast", llm,
+            messages=_extraction_messages("extract_cast", story_text),
+        )
+        data = _parse_json_reply(resp.choices[0].message.content)
+
+        # 이름 정제
+        chars = [_clean_korean_name(x) for x in data.get("characters", []) if isinstance(x, str)]
+        victim = _clean_korean_name(data.get("victim", ""))
+
+        # 유효성 체크
+        chars = [c for c in chars if re.match(r'^[가-힣]{2,3}$', c)]
+        if len(chars) == 2 and victim in chars:
+            return chars[0], chars[1], victim
+    except Exception:
+        pass
+
+    # ===== fallback: 로컬 추출기의 최선 추정 (신뢰도와 무관) =====
+    chars, victim, _ = name_extractor.extract(story_text, checkpoints or None)
+    if len(chars) < 2:
+        chars = ["인물A", "인물B"] if not chars else [chars[0], "인물B"]
+        victim = chars[0]
+    return chars[0], chars[1], victim
+
+
+def _other_of(c1: str, c2: str, victim: str) -> str:
+    """victim이 아닌 다른 쪽을 반환"""
+    return c2 if victim == c1 else c1
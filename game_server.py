@@ -0,0 +1,364 @@
+"""
+게임 엔진(game_engine.py)을 JSON/SSE로 내보내는 가벼운 비동기 HTTP 서버 (표준 라이브러리 asyncio만 사용).
+
+    python game_server.py --port 8600
+    curl -X POST http://127.0.0.1:8600/api/games
+    curl -N -X POST http://127.0.0.1:8600/api/games/<sid>/start
+
+엔드포인트 (요청/응답 본문은 JSON, 스트리밍 응답은 text/event-stream)
+- POST /api/games                   새 게임 → 201 {"sid", "state"}
+- GET  /api/games/<sid>             현재 상태 {"sid", "state"}
+- POST /api/games/<sid>/start       스토리 생성 (SSE: story.delta / story.reset / story.ready)
+- POST /api/games/<sid>/slip        {"checkpoint": 번호} 타임슬립
+- POST /api/games/<sid>/turns       {"text": "개입"} (SSE: turn.delta / turn.done)
+- POST /api/games/<sid>/present     현재로 돌아가 결말 확인 (SSE: ending.delta / ending.done)
+- POST /api/games/<sid>/ticket      티켓 사용
+- POST /api/games/<sid>/finish      게임 종료
+- GET  /healthz
+규칙 위반은 409 {"error": 메시지}, 없는 게임은 404. 스트림을 연 뒤의 실패는 event: error 로 알린다.
+
+행동마다 persistence.py 저장소에 커밋하므로(Streamlit 화면과 같은 ?sid= 토큰) 여러 서버 프로세스가
+같은 게임을 이어받을 수 있다. 한 게임의 행동은 한 번에 하나씩만 처리한다.
+"""
+import os, re, json, time
+import asyncio
+import argparse
+import threading
+
+import metrics
+import persistence
+import startup
+from game_engine import GameEngine, GameError, PERSIST_KEYS, init_state, get_session_registry
+
+HOST = os.getenv("GAME_SERVER_HOST", "127.0.0.1")
+PORT = int(os.getenv("GAME_SERVER_PORT", "8600"))
+# 이 시간(초) 동안 요청이 없던 게임은 메모리에서 내린다 (저장소에 남아 있으면 다음 요청 때 다시 읽음)
+IDLE_S = float(os.getenv("GAME_SERVER_IDLE_S", "1800"))
+MAX_BODY = 64 * 1024
+
+_ROUTE = re.compile(r"^/api/games/([^/]+)(?:/(start|slip|turns|present|ticket|finish))?$")
+_STREAMING = ("start", "turns", "present")
+_REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+_FAILED = "지금은 이야기를 이어 갈 수 없습니다. 잠시 후 다시 시도해 주세요."
+_CONFLICT = "다른 곳에서 이 게임이 먼저 진행되어 방금 한 행동은 반영되지 않았습니다."
+_END = object()
+
+REQUESTS = metrics.Counter("about_time_game_server_requests_total", "게임 서버 요청 수", ("action", "status"))
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Session:
+    __slots__ = ("holder", "engine", "lock", "touched")
+
+    def __init__(self, holder: dict):
+        self.holder = holder
+        self.engine = GameEngine(holder)
+        self.lock = asyncio.Lock()
+        self.touched = time.monotonic()
+
+
+def _head(status: int, content_type: str, length: int = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {content_type}", "Connection: close"]
+    if length is None:
+        lines += ["Cache-Control: no-cache", "X-Accel-Buffering: no"]     # 프록시가 스트림을 모아 두지 않도록
+    else:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _sse(kind: str, data) -> bytes:
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _action_of(path: str) -> str:
+    """지표 라벨용 행동 이름"""
+    if path in ("/healthz", "/api/games"):
+        return path
+    m = _ROUTE.match(path)
+    return (m.group(2) or "view") if m else "unknown"
+
+
+def _parse_json(body: bytes) -> dict:
+    if not body.strip():
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HttpError(400, "본문이 올바른 JSON이 아닙니다.")
+    if not isinstance(data, dict):
+        raise HttpError(400, "본문은 JSON 객체여야 합니다.")
+    return data
+
+
+class GameServer:
+    def __init__(self, idle_s: float = IDLE_S):
+        self.sessions = {}           # sid → _Session
+        self.idle_s = idle_s
+
+    # ---- 세션 ----
+    def _new_holder(self, sid: str):
+        holder = {}
+        persistence.restore(holder, sid, PERSIST_KEYS)
+        return holder
+
+    def _restore_holder(self, sid: str):
+        """저장소(또는 SESSION_SPILL_DIR에 내려써 둔 파일)에 있는 게임을 읽어 온다 (없으면 None)"""
+        holder = {}
+        return holder if self._reload(holder, sid) else None
+
+    def _reload(self, holder: dict, sid: str) -> bool:
+        if not (persistence.restore(holder, sid, PERSIST_KEYS)
+                or get_session_registry().rehydrate(holder, sid)):
+            return False
+        init_state(holder)
+        return True
+
+    def _drop(self, sid: str):
+        """세션 레지스트리가 메모리에서 내린 세션을 치운다 (다음 요청 때 _session이 다시 읽음)"""
+        session = self.sessions.pop(sid, None)
+        if session is not None:
+            session.engine.close()
+
+    async def _session(self, sid: str) -> _Session:
+        session = self.sessions.get(sid)
+        if session is None:
+            holder = await asyncio.to_thread(self._restore_holder, sid) if persistence.valid_token(sid) else None
+            if holder is None:
+                raise HttpError(404, "게임을 찾을 수 없습니다.")
+            session = self.sessions.setdefault(sid, _Session(holder))
+        session.touched = time.monotonic()
+        return session
+
+    def _sync(self, session: _Session):
+        # 다른 프로세스가 같은 게임을 먼저 진행했으면 그 상태에서 이어 간다
+        if persistence.sync(session.holder, PERSIST_KEYS):
+            init_state(session.holder)
+
+    def _commit(self, session: _Session):
+        if not persistence.save(session.holder, PERSIST_KEYS):
+            init_state(session.holder)
+            raise HttpError(409, _CONFLICT)
+
+    # ---- 행동 (작업 스레드에서 실행) ----
+    def _act(self, session: _Session, action: str, payload: dict) -> dict:
+        engine = session.engine
+        self._sync(session)
+        if action == "slip":
+            try:
+                engine.time_slip(int(payload.get("checkpoint")))
+            except (TypeError, ValueError):
+                raise HttpError(400, "checkpoint는 체크포인트 번호여야 합니다.")
+        elif action == "ticket":
+            engine.use_ticket()
+        elif action == "finish":
+            engine.finish()
+        self._commit(session)
+        return engine.view()
+
+    def _open_stream(self, session: _Session, action: str, payload: dict):
+        """규칙 검사까지 마치고 이벤트 제너레이터를 반환한다 (GameError는 스트림을 열기 전에 409로)."""
+        engine = session.engine
+        self._sync(session)
+        if action == "start":
+            return engine.start()
+        if action == "turns":
+            return engine.intervene(str(payload.get("text") or ""))
+        if engine.mode == "past":
+            engine.return_to_present()
+        return engine.reveal_ending()
+
+    # ---- HTTP ----
+    async def handle(self, reader, writer):
+        action, status = "unknown", 500
+        try:
+            method, path, body = await self._read_request(reader)
+            action = _action_of(path)
+            status = await self._dispatch(method, path, body, writer)
+        except (GameError, HttpError) as e:
+            status = getattr(e, "status", 409)
+            await self._send_json(writer, status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            await self._send_json(writer, 500, {"error": _FAILED})
+        finally:
+            REQUESTS.inc(action=action, status=str(status))
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _read_request(self, reader):
+        parts = (await reader.readline()).decode("latin-1").split()
+        if len(parts) < 2:
+            raise HttpError(400, "잘못된 요청입니다.")
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    raise HttpError(400, "잘못된 Content-Length입니다.")
+        if length > MAX_BODY:
+            raise HttpError(413, "본문이 너무 큽니다.")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return parts[0].upper(), parts[1].split("?", 1)[0], body
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer) -> int:
+        if path == "/healthz" and method == "GET":
+            return await self._send_json(writer, 200, {"ok": True, "sessions": len(self.sessions)})
+        if path == "/api/games" and method == "POST":
+            sid = persistence.new_token()
+            session = self.sessions[sid] = _Session(await asyncio.to_thread(self._new_holder, sid))
+            return await self._send_json(writer, 201, {"sid": sid, "state": session.engine.view()})
+        m = _ROUTE.match(path)
+        if m is None:
+            raise HttpError(404, "없는 경로입니다.")
+        sid, action = m.group(1), m.group(2) or "view"
+        if (method == "GET") != (action == "view") or method not in ("GET", "POST"):
+            raise HttpError(405, "허용되지 않는 메서드입니다.")
+        payload = _parse_json(body)
+        session = await self._session(sid)
+        registry = get_session_registry()
+        async with session.lock:
+            await asyncio.to_thread(registry.enter, sid)     # 다른 스레드가 내리는 중이면 끝날 때까지 기다림
+            try:
+                # 락을 기다리는 사이 메모리에서 내려졌으면 같은 holder에 다시 채운다
+                if "mode" not in session.holder and not await asyncio.to_thread(self._reload, session.holder, sid):
+                    raise HttpError(404, "게임을 찾을 수 없습니다.")
+                if action == "view":
+                    return await self._send_json(writer, 200, {"sid": sid, "state": session.engine.view()})
+                if action not in _STREAMING:
+                    view = await asyncio.to_thread(self._act, session, action, payload)
+                    return await self._send_json(writer, 200, {"sid": sid, "state": view})
+                events = await asyncio.to_thread(self._open_stream, session, action, payload)
+                return await self._stream(writer, session, events)
+            finally:
+                # 바이트 계산과 내려쓰기 파일 쓰기는 작업 스레드에서
+                await asyncio.to_thread(registry.touch, sid, session.holder, sid, lambda: self._drop(sid))
+
+    async def _send_json(self, writer, status: int, payload: dict) -> int:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(_head(status, "application/json; charset=utf-8", len(body)) + body)
+        await writer.drain()
+        return status
+
+    async def _stream(self, writer, session: _Session, events) -> int:
+        """
+        엔진 이벤트를 작업 스레드에서 돌려 SSE로 흘려보낸다. 클라이언트가 끊으면 다음 이벤트에서
+        제너레이터를 닫아(엔진이 진행 중이던 턴을 되돌림) 멈춘다. 끝나면 저장소에 커밋한다.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def _put(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def _pump():
+            error = None
+            try:
+                for item in events:
+                    _put(item)
+                    if cancelled.is_set():
+                        break
+            except GameError as e:
+                error = str(e)
+            except Exception:
+                error = _FAILED
+            finally:
+                events.close()
+                try:
+                    self._commit(session)
+                except HttpError as e:
+                    error = error or str(e)
+                if error:
+                    _put(("error", {"error": error}))
+                _put(_END)
+
+        writer.write(_head(200, "text/event-stream; charset=utf-8"))
+        pump = asyncio.ensure_future(asyncio.to_thread(_pump))
+        try:
+            await writer.drain()
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                writer.write(_sse(*item))
+                await writer.drain()
+        except (ConnectionError, OSError):
+            cancelled.set()
+        finally:
+            await pump          # 엔진이 상태 정리와 커밋을 마칠 때까지 게임 잠금을 쥐고 있는다
+        return 200
+
+    # ---- 실행 ----
+    async def _evict_idle(self):
+        while True:
+            await asyncio.sleep(max(1.0, min(60.0, self.idle_s)))
+            now = time.monotonic()
+            for sid, session in list(self.sessions.items()):
+                if now - session.touched > self.idle_s and not session.lock.locked():
+                    del self.sessions[sid]
+                    get_session_registry().forget(sid)
+                    session.engine.close()
+
+    async def start(self, host: str = HOST, port: int = PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        self._reaper = asyncio.ensure_future(self._evict_idle())
+        return server
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0):
+    """백그라운드 스레드(자체 이벤트 루프)로 서버를 띄우고 (GameServer, base_url)을 반환한다. port=0이면 빈 포트 사용."""
+    app = GameServer()
+    ready = threading.Event()
+    box = {}
+
+    def _main():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        box["server"] = loop.run_until_complete(app.start(host, port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=_main, name="game-server", daemon=True).start()
+    ready.wait()
+    return app, f"http://{host}:{box['server'].sockets[0].getsockname()[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="About Time 게임 엔진 HTTP/SSE 서버")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    args = ap.parse_args()
+
+    async def _serve():
+        server = await GameServer().start(args.host, args.port)
+        print(f"about-time game server → http://{args.host}:{args.port}/api/games")
+        async with server:
+            await server.serve_forever()
+
+    metrics.start_server()
+    startup.begin()         # 첫 게임 요청 전에 클라이언트와 업스트림 연결을 준비
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os, json, time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import metrics
+
+# ====== LLM 응답 캐시 ======
+# (모델, 메시지, 샘플링 파라미터)의 정규화 해시를 키로 응답 텍스트를 저장한다.
+# 1단: 프로세스 메모리 LRU, 2단: SQLite 파일 (TTL/용량 초과 시 오래 안 쓴 것부터 삭제).
+# 스트리밍 호출에는 캐시된 텍스트를 가짜 청크 스트림으로 재생해 돌려준다.
+# 호출 지점(site)별로 켠다 — 톤이 무작위로 정해지는 과거 개입 턴 등은 캐시하지 않는다.
+
+LLM_CACHE_SITES = {
+    s.strip() for s in os.getenv("LLM_CACHE_SITES", "extract_cast,extract_characters,outcome,summary").split(",")
+    if s.strip()
+}
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3")
+)
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REPLAY_CHUNK_CHARS = 24
+
+# 응답 내용에 영향을 주는 파라미터만 키에 포함
+_KEY_PARAMS = (
+    "model", "messages", "temperature", "top_p", "max_tokens", "max_completion_tokens",
+    "presence_penalty", "frequency_penalty", "seed", "stop", "response_format", "n",
+)
+
+CACHE_LOOKUPS = metrics.Counter("about_time_llm_cache_total", "LLM 응답 캐시 조회 결과", ("site", "tier", "result"))
+
+
+def enabled_for(site: str) -> bool:
+    return site in LLM_CACHE_SITES and LLM_CACHE_MEMORY_ITEMS > 0
+
+
+def cache_key(params: dict) -> str:
+    canon = {k: params[k] for k in _KEY_PARAMS if params.get(k) is not None}
+    payload = json.dumps(canon, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+                 ttl_s: float = LLM_CACHE_TTL_S, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.memory_items = memory_items
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._mem = OrderedDict()           # key → (저장 시각, 텍스트)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL,"
+                    " created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            except sqlite3.Error:
+                self._db = None
+
+    # ---- 조회/저장 ----
+    def get(self, key: str, site: str = ""):
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if now - hit[0] <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                    CACHE_LOOKUPS.inc(site=site, tier="memory", result="hit")
+                    return hit[1]
+                del self._mem[key]
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT content, created FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and now - row[1] > self.ttl_s:
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        row = None
+                    elif row:
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                except sqlite3.Error:
+                    row = None
+            if row:
+                self._remember(key, row[1], row[0])
+                CACHE_LOOKUPS.inc(site=site, tier="disk", result="hit")
+                return row[0]
+        CACHE_LOOKUPS.inc(site=site, tier="all", result="miss")
+        return None
+
+    def put(self, key: str, content: str):
+        if not content:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, content)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, content, len(content.encode("utf-8")), now, now),
+                )
+                self._evict_disk(now)
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key, created, content):
+        self._mem[key] = (created, content)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 오래 안 쓴 것부터 용량 한도의 90%까지 비운다
+        target = int(self.max_bytes * 0.9)
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            mem = len(self._mem)
+            disk = 0
+            if self._db is not None:
+                try:
+                    disk = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return {"memory_items": mem, "disk_items": disk}
+
+
+# ---- 캐시된 텍스트 → 응답 객체 ----
+def replay_response(content: str, model: str = ""):
+    """비스트리밍 ChatCompletion과 같은 모양의 객체"""
+    msg = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(
+        model=model, usage=None, cached=True,
+        choices=[SimpleNamespace(index=0, message=msg, finish_reason="stop")],
+    )
+
+
+def replay_stream(content: str, model: str = ""):
+    """스트리밍 청크와 같은 모양의 객체를 차례로 내놓는 제너레이터"""
+    for i in range(0, len(content), REPLAY_CHUNK_CHARS):
+        delta = SimpleNamespace(role=None, content=content[i:i + REPLAY_CHUNK_CHARS])
+        yield SimpleNamespace(
+            model=model, usage=None,
+            choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)],
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,218 @@
+import os, time
+from types import SimpleNamespace
+
+import metrics
+import llm_cache
+import llm_scheduler
+import model_routes
+
+# ====== LLM 호출 공통 진입점 ======
+# 모든 client.chat.completions.create 호출은 chat()을 거친다.
+# 호출 지점(site) 라벨로 첫 토큰 시간, 전체 소요 시간, 청크 수, 토큰 사용량, 오류를 기록한다.
+# 캐시가 켜진 호출 지점은 llm_cache에서 먼저 찾아보고, 없으면 호출 후 결과를 저장한다.
+# 실제 호출은 llm_scheduler의 자리(동시성/우선순위/모델 예산)를 받은 뒤에만 나가며,
+# 429/5xx/연결 오류는 마감 시간 안에서 백오프 후 재시도한다. 스트림은 다 읽거나 닫을 때 자리를 돌려준다.
+# 모델은 model_routes의 호출 지점별 경로가 고르며, 실패하면 같은 호출을 다음 단계 모델로 넘긴다.
+
+# 스트리밍 응답 끝에 usage 청크를 요청 (이를 지원하지 않는 호환 서버라면 0으로)
+STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") != "0"
+
+
+def _error_name(exc: Exception) -> str:
+    status = getattr(exc, "status_code", None)
+    return f"{type(exc).__name__}:{status}" if status else type(exc).__name__
+
+
+def _record_usage(usage, site: str, model: str):
+    if usage is None:
+        return
+    pt = getattr(usage, "prompt_tokens", None)
+    ct = getattr(usage, "completion_tokens", None)
+    if pt is not None:
+        metrics.LLM_PROMPT_TOKENS.observe(pt, site=site, model=model)
+    if ct is not None:
+        metrics.LLM_COMPLETION_TOKENS.observe(ct, site=site, model=model)
+    cost = model_routes.get_router().cost(model, pt, ct)
+    if cost:
+        model_routes.LLM_COST.inc(cost, site=site, model=model)
+
+
+class InstrumentedStream:
+    """스트리밍 응답을 감싸 지표를 기록한다. usage 전용 마지막 청크(choices 비어 있음)는 건너뛴다."""
+
+    def __init__(self, inner, site: str, model: str, started: float, on_complete=None, on_release=None):
+        self._inner = inner
+        self.site = site
+        self.model = model
+        self.started = started
+        self.on_complete = on_complete      # 정상 종료 시 전체 텍스트로 호출 (캐시 저장용)
+        self.on_release = on_release        # 종료/오류/닫기 시 사용량(없으면 None)으로 한 번 호출 (스케줄러 자리 반환)
+        self._parts = [] if on_complete else None
+        self.ttft = None
+        self.chunks = 0
+        self.usage = None
+        self._done = False
+
+    def __iter__(self):
+        labels = dict(site=self.site, model=self.model)
+        try:
+            for chunk in self._inner:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    self.usage = usage
+                if not chunk.choices:
+                    continue
+                self.chunks += 1
+                if self._parts is not None and chunk.choices[0].delta.content:
+                    self._parts.append(chunk.choices[0].delta.content)
+                if self.ttft is None and chunk.choices[0].delta.content:
+                    self.ttft = time.monotonic() - self.started
+                    metrics.LLM_TTFT.observe(self.ttft, **labels)
+                yield chunk
+        except Exception as e:
+            self._finish("error")
+            metrics.LLM_ERRORS.inc(error=_error_name(e), **labels)
+            raise
+        else:
+            self._finish("ok")
+        finally:
+            # 끝까지 읽지 않고 버려진 스트림(턴 취소, SSE 끊김, rerun으로 GeneratorExit)도
+            # 이미 쓴 시간·청크·토큰을 cancelled로 기록하고 자리를 돌려준다 (이미 기록했으면 아무것도 안 함)
+            self._finish("cancelled")
+        if self.on_complete is not None:
+            self.on_complete("".join(self._parts))
+
+    def _finish(self, status: str):
+        if self._done:
+            return
+        self._done = True
+        labels = dict(site=self.site, model=self.model)
+        metrics.LLM_REQUESTS.inc(stream="true", status=status, **labels)
+        metrics.LLM_LATENCY.observe(time.monotonic() - self.started, **labels)
+        metrics.LLM_CHUNKS.observe(self.chunks, **labels)
+        usage = self.usage
+        if usage is None and status == "cancelled" and self.chunks:
+            # usage 청크는 스트림 끝에 오므로 중간에 끊기면 없다: 받은 청크 수(청크당 토큰 하나)로 출력 토큰만 어림한다
+            usage = SimpleNamespace(prompt_tokens=None, completion_tokens=self.chunks, total_tokens=self.chunks)
+            self.usage = usage
+        _record_usage(usage, self.site, self.model)
+        self._release()
+
+    def _release(self):
+        if self.on_release is not None:
+            release, self.on_release = self.on_release, None
+            release(getattr(self.usage, "total_tokens", None))
+
+    def close(self):
+        close = getattr(self._inner, "close", None)
+        if close:
+            close()
+        self._finish("cancelled")
+
+
+def chat(site: str, client, cache: bool = None, priority: int = None, deadline_s: float = None, **kwargs):
+    """
+    client.chat.completions.create(**kwargs)를 계측해서 호출한다.
+    stream=True면 InstrumentedStream을, 아니면 원래 응답 객체를 반환한다.
+    cache: None이면 호출 지점 설정(LLM_CACHE_SITES)을 따르고, True/False로 강제할 수 있다.
+    priority: 스케줄러 우선순위 (None이면 호출 지점 기본값), deadline_s: 대기+재시도를 포함한 마감 시간(초)
+    model을 주지 않으면 model_routes의 경로 설정(모델/최대 토큰/마감/대체 모델)을 따른다.
+    """
+    router = model_routes.get_router()
+    route = router.route_for(site)
+    if "model" in kwargs:
+        models = [kwargs.pop("model")]
+    else:
+        models = router.tiers(route)
+    priority = llm_scheduler.priority_for(site, priority)
+    deadline = time.monotonic() + (deadline_s or route.timeout or llm_scheduler.deadline_for(priority))
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        call = dict(kwargs, model=model, **route.token_args(model))
+        try:
+            # 대체 모델이 남아 있으면 기본 모델 재시도는 한 번만 하고 빨리 넘긴다
+            return _chat_once(site, client, cache, priority, deadline, call, router, route,
+                              max_retries=None if last else min(1, llm_scheduler.MAX_RETRIES))
+        except Exception as e:
+            if last or not _should_fall_back(e) or time.monotonic() >= deadline:
+                raise
+            router.fell_back(route, model, models[i + 1], reason="error")
+
+
+def _should_fall_back(exc: Exception) -> bool:
+    """다른 모델로 다시 보낼 만한 실패인지 (요청 자체가 잘못된 400류는 제외, 모델 없음 404는 포함)"""
+    return llm_scheduler.is_retryable(exc) or getattr(exc, "status_code", None) == 404
+
+
+def _chat_once(site, client, cache, priority, deadline, kwargs, router, route, max_retries=None):
+    model = kwargs.get("model", "")
+    stream = bool(kwargs.get("stream"))
+    labels = dict(site=site, model=model)
+
+    use_cache = llm_cache.enabled_for(site) if cache is None else cache
+    key = None
+    if use_cache:
+        key = llm_cache.cache_key(kwargs)
+        hit = llm_cache.get_cache().get(key, site)
+        if hit is not None:
+            metrics.LLM_REQUESTS.inc(stream=str(stream).lower(), status="cached", **labels)
+            if stream:
+                return llm_cache.replay_stream(hit, model)
+            return llm_cache.replay_response(hit, model)
+
+    if stream and STREAM_USAGE:
+        kwargs.setdefault("stream_options", {"include_usage": True})
+
+    scheduler = llm_scheduler.get_scheduler()
+    tokens = llm_scheduler.estimate_tokens(kwargs)
+    attempt = 0
+    while True:
+        try:
+            ticket = scheduler.acquire(priority, model, tokens, deadline)
+        except llm_scheduler.DeadlineExceeded as e:
+            llm_scheduler.DEADLINES.inc(site=site, stage="queue")
+            metrics.LLM_REQUESTS.inc(stream=str(stream).lower(), status="error", **labels)
+            metrics.LLM_ERRORS.inc(error=_error_name(e), **labels)
+            raise
+        started = time.monotonic()
+        try:
+            resp = client.chat.completions.create(timeout=max(1.0, deadline - started), **kwargs)
+            break
+        except Exception as e:
+            scheduler.release(ticket)
+            metrics.LLM_ERRORS.inc(error=_error_name(e), **labels)
+            delay = llm_scheduler.backoff_delay(e, attempt, deadline, max_retries=max_retries)
+            if delay is None:
+                if llm_scheduler.is_retryable(e) and time.monotonic() >= deadline:
+                    llm_scheduler.DEADLINES.inc(site=site, stage="retry")
+                metrics.LLM_REQUESTS.inc(stream=str(stream).lower(), status="error", **labels)
+                router.observe(route, model, None, ok=False)
+                raise
+            metrics.LLM_RETRIES.inc(**labels)
+            attempt += 1
+            time.sleep(delay)
+
+    if stream:
+        on_complete = (lambda text: llm_cache.get_cache().put(key, text)) if key else None
+        wrapped = InstrumentedStream(resp, site, model, started, on_complete)
+
+        def _release(used):
+            scheduler.release(ticket, used)
+            router.observe(route, model, wrapped.ttft, ok=wrapped.ttft is not None)
+
+        wrapped.on_release = _release
+        return wrapped
+
+    scheduler.release(ticket, getattr(getattr(resp, "usage", None), "total_tokens", None))
+    elapsed = time.monotonic() - started
+    router.observe(route, model, elapsed)
+    metrics.LLM_REQUESTS.inc(stream="false", status="ok", **labels)
+    metrics.LLM_LATENCY.observe(elapsed, **labels)
+    metrics.LLM_TTFT.observe(elapsed, **labels)      # 비스트리밍은 전체 응답이 곧 첫 토큰
+    _record_usage(getattr(resp, "usage", None), site, model)
+    if key:
+        try:
+            llm_cache.get_cache().put(key, resp.choices[0].message.content)
+        except (AttributeError, IndexError):
+            pass
+    return resp
@@ -0,0 +1,289 @@
+import os, time, random
+import heapq
+import itertools
+import threading
+
+import metrics
+
+# ====== LLM 호출 스케줄러 ======
+# 프로세스 안의 모든 LLM 호출(llm_calls.chat)이 지나가는 관문.
+# - 동시 호출 수 상한(LLM_MAX_CONCURRENCY). 백그라운드 호출은 그중 LLM_BACKGROUND_MAX개까지만 쓴다.
+# - 우선순위 대기열: 빈 자리는 플레이어가 기다리는 호출(턴/스토리/결말)에 먼저 준다.
+# - 모델별 분당 요청/토큰 예산(LLM_MODEL_BUDGETS). 예산이 바닥난 모델의 호출만 기다리고 다른 모델은 지나간다.
+# - 429/5xx/연결 오류는 지터를 섞은 지수 백오프로 재시도 (Retry-After가 있으면 그보다 일찍 하지 않음).
+# - 호출마다 마감 시간: 대기열에서 마감을 넘기면 DeadlineExceeded, 재시도도 마감 안에서만.
+
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+# 호출 지점별 기본 우선순위 (chat(priority=…)로 덮어쓸 수 있음)
+SITE_PRIORITY = {
+    "turn": INTERACTIVE,
+    "story": INTERACTIVE,
+    "outcome": INTERACTIVE,
+    "extract_cast": NORMAL,
+    "extract_characters": NORMAL,
+    "summary": BACKGROUND,
+    "story_pool": BACKGROUND,
+}
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+BACKGROUND_MAX = int(os.getenv("LLM_BACKGROUND_MAX", str(max(1, MAX_CONCURRENCY // 2))))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "20"))
+DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "120"))
+BACKGROUND_DEADLINE_S = float(os.getenv("LLM_BACKGROUND_DEADLINE_S", "300"))
+# "모델=분당요청/분당토큰,…" 예: "gpt-4o=500/300000,gpt-4o-mini=5000/2000000" (없는 모델은 무제한)
+MODEL_BUDGETS = os.getenv("LLM_MODEL_BUDGETS", "")
+DEFAULT_COMPLETION_TOKENS = 1024      # max_tokens가 없을 때 예산에서 미리 잡아 두는 완성 토큰 수
+
+QUEUE_WAIT = metrics.Histogram(
+    "about_time_llm_queue_wait_seconds", "LLM 호출이 스케줄러 대기열에서 기다린 시간", ("priority",),
+)
+DEADLINES = metrics.Counter(
+    "about_time_llm_deadline_exceeded_total", "마감 시간을 넘겨 포기한 LLM 호출", ("site", "stage"),
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """대기열이나 재시도 중에 호출 마감 시간을 넘김"""
+
+
+def priority_for(site: str, priority=None) -> int:
+    return SITE_PRIORITY.get(site, NORMAL) if priority is None else priority
+
+
+def deadline_for(priority: int) -> float:
+    return BACKGROUND_DEADLINE_S if priority == BACKGROUND else DEADLINE_S
+
+
+def estimate_tokens(kwargs) -> int:
+    """예산 계산용 토큰 추정: 메시지 글자 수 / 2 + 완성 토큰 상한"""
+    chars = sum(len(m.get("content") or "") for m in kwargs.get("messages", ()) if isinstance(m.get("content"), str))
+    completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return chars // 2 + completion
+
+
+# ====== 재시도 판단 ======
+def is_retryable(exc: Exception) -> bool:
+    import openai       # 클라이언트가 이미 불러 둔 뒤라 비용 없음 (스케줄러 import는 가볍게 유지)
+    if isinstance(exc, openai.APIConnectionError):         # APITimeoutError 포함
+        return True
+    status = getattr(exc, "status_code", None)
+    return status is not None and (status == 429 or status == 408 or status >= 500)
+
+
+def _retry_after(exc: Exception):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(exc: Exception, attempt: int, deadline: float, rng=random, max_retries: int = None):
+    """재시도 전 쉴 시간(초). 재시도할 수 없거나 마감 안에 끝낼 수 없으면 None."""
+    if attempt >= (MAX_RETRIES if max_retries is None else max_retries) or not is_retryable(exc):
+        return None
+    delay = rng.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))   # full jitter
+    delay = max(delay, _retry_after(exc) or 0.0)
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+# ====== 모델별 예산 (토큰 버킷) ======
+class _Budget:
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests, self.tokens = rpm, tpm
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        dt = now - self.updated
+        self.updated = now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + dt * self.rpm / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + dt * self.tpm / 60)
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        """지금 tokens만큼 쓸 수 있으면 0, 아니면 모자란 만큼 채워지기까지의 시간"""
+        self._refill(now)
+        wait = 0.0
+        if self.rpm and self.requests < 1:
+            wait = max(wait, (1 - self.requests) * 60 / self.rpm)
+        if self.tpm:
+            need = min(tokens, self.tpm)
+            if self.tokens < need:
+                wait = max(wait, (need - self.tokens) * 60 / self.tpm)
+        return wait
+
+    def take(self, tokens: int):
+        if self.rpm:
+            self.requests -= 1
+        if self.tpm:
+            self.tokens -= min(tokens, self.tpm)
+
+    def settle(self, estimated: int, actual: int):
+        """호출이 끝난 뒤 실제 사용량으로 보정 (미리 많이 잡았으면 돌려준다)"""
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + min(estimated, self.tpm) - actual)
+
+
+def parse_budgets(spec: str) -> dict:
+    budgets = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        model, _, limits = item.partition("=")
+        rpm, _, tpm = limits.partition("/")
+        budgets[model.strip()] = _Budget(float(rpm or 0), float(tpm or 0))
+    return budgets
+
+
+# ====== 스케줄러 ======
+class Ticket:
+    __slots__ = ("priority", "model", "tokens", "deadline", "enqueued", "granted", "released", "cancelled")
+
+    def __init__(self, priority, model, tokens, deadline):
+        self.priority = priority
+        self.model = model
+        self.tokens = tokens
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.released = False
+        self.cancelled = False      # 마감으로 포기한 티켓: 힙에서는 꺼낼 때 버린다
+
+
+class Scheduler:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, background_max: int = BACKGROUND_MAX,
+                 budgets: dict = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.background_max = max(1, min(background_max, self.max_concurrency))
+        self.budgets = budgets or {}
+        self._cond = threading.Condition()
+        self._waiting = []           # 힙: (우선순위, 순번, Ticket). 취소된 티켓은 꺼낼 때 버린다
+        self._waiting_n = {}         # 우선순위 → 대기 중(취소 제외) 티켓 수
+        self._cancelled = 0          # 힙에 남아 있는 취소 티켓 수
+        self._seq = itertools.count()
+        self._active = 0
+        self._active_bg = 0
+        self._granted = 0
+        self._rejected = 0
+
+    def _dispatch(self, now):
+        """
+        빈 자리만큼 힙 앞에서부터 티켓을 꺼내 자리를 준다. 모델 예산이 모자라거나 백그라운드 상한에 걸린 티켓은
+        건너뛰었다가 다시 넣는다 (티켓 하나당 O(log n)). 아무도 못 받았을 때 다시 살펴볼 때까지의 시간을 돌려준다.
+        """
+        retry_in = None
+        skipped = []
+        while self._active < self.max_concurrency and self._waiting:
+            entry = heapq.heappop(self._waiting)
+            t = entry[2]
+            if t.cancelled:
+                self._cancelled -= 1
+                continue
+            if t.priority == BACKGROUND and self._active_bg >= self.background_max:
+                skipped.append(entry)
+                continue
+            budget = self.budgets.get(t.model)
+            wait = budget.wait_time(t.tokens, now) if budget else 0.0
+            if wait > 0:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                skipped.append(entry)
+                continue
+            self._grant(t)
+        for entry in skipped:
+            heapq.heappush(self._waiting, entry)
+        return retry_in
+
+    def acquire(self, priority: int, model: str, tokens: int, deadline: float) -> Ticket:
+        ticket = Ticket(priority, model, tokens, deadline)
+        with self._cond:
+            heapq.heappush(self._waiting, (priority, next(self._seq), ticket))
+            self._waiting_n[priority] = self._waiting_n.get(priority, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    before = self._granted
+                    retry_in = self._dispatch(now)
+                    if self._granted != before:
+                        self._cond.notify_all()      # 자리를 받은 다른 티켓을 깨운다
+                    if ticket.granted:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise DeadlineExceeded(f"queued {now - ticket.enqueued:.1f}s")
+                    self._cond.wait(min(remaining, retry_in) if retry_in else remaining)
+            except BaseException:
+                if ticket.granted:                   # 다른 스레드가 넘겨준 자리는 돌려준다 (Condition의 RLock이라 재진입 가능)
+                    self.release(ticket)
+                raise
+            finally:
+                if not ticket.granted:
+                    ticket.cancelled = True
+                    self._waiting_n[priority] -= 1
+                    self._cancelled += 1
+                    if self._cancelled > 64 and self._cancelled * 2 > len(self._waiting):
+                        # 취소 티켓이 힙의 절반을 넘으면 한 번에 걷어 낸다 (분할 상환 O(1))
+                        self._waiting = [e for e in self._waiting if not e[2].cancelled]
+                        heapq.heapify(self._waiting)
+                        self._cancelled = 0
+        QUEUE_WAIT.observe(time.monotonic() - ticket.enqueued, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        return ticket
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        self._waiting_n[ticket.priority] -= 1
+        self._active += 1
+        self._granted += 1
+        if ticket.priority == BACKGROUND:
+            self._active_bg += 1
+        budget = self.budgets.get(ticket.model)
+        if budget:
+            budget.take(ticket.tokens)
+
+    def release(self, ticket: Ticket, actual_tokens: int = None):
+        """자리를 돌려준다 (여러 번 불러도 한 번만 반영)"""
+        with self._cond:
+            if ticket.released or not ticket.granted:
+                return
+            ticket.released = True
+            self._active -= 1
+            if ticket.priority == BACKGROUND:
+                self._active_bg -= 1
+            budget = self.budgets.get(ticket.model)
+            if budget and actual_tokens is not None:
+                budget.settle(ticket.tokens, actual_tokens)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = {"active": self._active, "active_background": self._active_bg,
+                   "granted": self._granted, "deadline_exceeded": self._rejected}
+            for name in PRIORITY_NAMES.values():
+                out[f"waiting_{name}"] = 0
+            for p, n in self._waiting_n.items():
+                out[f"waiting_{PRIORITY_NAMES.get(p, p)}"] = n
+            return out
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(budgets=parse_budgets(MODEL_BUDGETS))
+        return _scheduler
+
+
+metrics.Gauge("about_time_llm_scheduler", "LLM 스케줄러 상태 (실행 중/대기 중/누적)", ("kind",),
+              collect=lambda: {(k,): v for k, v in get_scheduler().stats().items()})
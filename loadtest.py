@@ -0,0 +1,385 @@
+"""
+동시 접속 부하 테스트.
+
+`streamlit run about_time.py`를 실제로 띄우고, 헤드리스 세션 N개가 웹소켓으로 직접 접속해
+시작 → 체크포인트 선택 → 과거 개입 여러 턴 → 현재 → 티켓 → 게임 종료까지 진행한다.
+LLM은 프로세스 안에서 띄운 로컬 대역 서버(mock_llm_server.py)를 쓴다.
+
+    python loadtest.py --concurrency 1,4,16 --turns 3 --ttft 0.5 --tps 60 --out bench_output.json
+
+동시성 단계마다 rerun 지연 백분위, 서버 CPU/RSS, 웹소켓 수신 바이트, 처리량을 JSON으로 기록한다.
+필요 패키지: websockets (streamlit 설치 시 함께 설치되는 경우가 많다)
+"""
+import os, sys, json, time, socket, random
+import argparse
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+import mock_llm_server
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_FINISHED_FINAL = {
+    ForwardMsg.ScriptFinishedStatus.FINISHED_SUCCESSFULLY,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_WITH_COMPILE_ERROR,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+}
+
+_PLAYER_LINES = [
+    "오늘은 내가 운전할게, 너는 좀 쉬어.",
+    "약속 늦어서 미안해. 다음부터는 미리 연락할게.",
+    "병원부터 같이 가 보자. 내가 예약해 둘게.",
+    "그 얘기 끝까지 들을게. 화내지 않을게.",
+    "비 많이 오니까 오늘은 나가지 말자.",
+]
+
+
+# ====== 헤드리스 세션 ======
+class HeadlessSession:
+    """Streamlit 웹소켓 프로토콜(BackMsg/ForwardMsg)을 직접 말하는 최소 클라이언트"""
+
+    def __init__(self, url: str, timeout: float = 300.0):
+        self.url = url
+        self.ws = None
+        self.timeout = timeout
+        self.widgets = {}        # 라벨 → (종류, 위젯 id, 속한 fragment id)
+        self.values = {}         # 위젯 id → WidgetState (버튼 트리거 제외, 다음 rerun에도 유지)
+        self.bytes_in = 0
+        self.messages_in = 0
+        self.query_string = ""   # 앱이 st.query_params로 바꾼 URL 쿼리 (브라우저처럼 다음 rerun에 실어 보냄)
+        self.exceptions = 0      # 앱이 화면에 그린 예외 요소 수
+
+    def __enter__(self):
+        try:
+            from websockets.sync.client import connect
+        except ImportError:
+            raise SystemExit("부하 테스트에는 websockets 패키지가 필요합니다: pip install websockets")
+        self._conn = connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=30)
+        self.ws = self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def _collect(self, msg: ForwardMsg):
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            if not msg.new_session.fragment_ids_this_run:   # 조각만 다시 실행될 때는 나머지 위젯이 그대로 남는다
+                self.widgets = {}
+        elif kind == "page_info_changed":
+            self.query_string = msg.page_info_changed.query_string
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            el = msg.delta.new_element
+            etype = el.WhichOneof("type")
+            if etype == "exception":
+                self.exceptions += 1
+            proto = getattr(el, etype, None)
+            wid = getattr(proto, "id", "")
+            label = getattr(proto, "label", "")
+            if wid and label:
+                self.widgets[label] = (etype, wid, msg.delta.fragment_id)
+
+    def rerun(self, triggers=(), values=None):
+        """
+        rerun 요청 하나를 보내고, 앱이 최종적으로 멈출 때까지(st.rerun 연쇄 포함) 기다린다.
+        조작한 위젯이 모두 같은 st.fragment 안에 있으면 브라우저처럼 그 조각만 다시 실행하도록 요청한다.
+        반환: (소요 시간, 수신 바이트, 수신 메시지 수)
+        """
+        fragments = set()
+        for label, state in (values or {}).items():
+            etype, wid, fragment_id = self.widgets[label]
+            state.id = wid
+            self.values[wid] = state
+            fragments.add(fragment_id)
+        back = BackMsg()
+        cs = back.rerun_script
+        cs.page_script_hash = ""
+        cs.query_string = self.query_string
+        for ws in self.values.values():
+            cs.widget_states.widgets.append(ws)
+        for label in triggers:
+            etype, wid, fragment_id = self.widgets[label]
+            cs.widget_states.widgets.append(WidgetState(id=wid, trigger_value=True))
+            fragments.add(fragment_id)
+        if len(fragments) == 1 and "" not in fragments:
+            cs.fragment_id = fragments.pop()
+
+        start = time.perf_counter()
+        b0, m0 = self.bytes_in, self.messages_in
+        self.ws.send(back.SerializeToString())
+        while True:
+            raw = self.ws.recv(timeout=self.timeout)
+            if isinstance(raw, str):
+                raw = raw.encode("utf-8")
+            self.bytes_in += len(raw)
+            self.messages_in += 1
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            self._collect(msg)
+            if msg.WhichOneof("type") == "script_finished" and msg.script_finished in _FINISHED_FINAL:
+                break
+        return time.perf_counter() - start, self.bytes_in - b0, self.messages_in - m0
+
+    def has(self, label: str) -> bool:
+        return label in self.widgets
+
+    def text_label(self):
+        for label, (etype, _, _) in self.widgets.items():
+            if etype == "text_input":
+                return label
+        return None
+
+
+# ====== 시나리오 ======
+def play_game(url: str, turns: int, rng: random.Random, record):
+    """한 게임을 끝까지 진행. record(단계, 소요 시간, 바이트)를 단계마다 호출."""
+    with HeadlessSession(url) as s:
+        def step(name, **kw):
+            dt, nbytes, _ = s.rerun(**kw)
+            record(name, dt, nbytes)
+            if s.exceptions:
+                raise RuntimeError(f"{name}: 앱이 예외를 그렸습니다")
+
+        step("load")
+        step("start", triggers=["게임 시작"])
+        for cycle in range(4):
+            if not s.has("⏳ 이 시점으로 타임슬립"):
+                break
+            step("time_slip", triggers=["⏳ 이 시점으로 타임슬립"])
+            if cycle == 0 and s.has("메모"):
+                step("memo", values={"메모": WidgetState(string_value=f"{cycle + 1}번째 타임슬립: {rng.choice(_PLAYER_LINES)}")})
+            for _ in range(turns if cycle == 0 else 1):
+                label = s.text_label()
+                if not label or not s.has("답변 제출"):
+                    break
+                line = WidgetState(string_value=rng.choice(_PLAYER_LINES))
+                step("turn", triggers=["답변 제출"], values={label: line})
+            if not s.has("현재로 돌아가기 🕰️"):
+                break
+            step("present", triggers=["현재로 돌아가기 🕰️"])
+            if s.has("게임 종료로 이동"):
+                step("gameover", triggers=["게임 종료로 이동"])
+                return True
+            if s.has("🎟️ 티켓 사용하기 (체크포인트로 돌아가기)"):
+                step("ticket", triggers=["🎟️ 티켓 사용하기 (체크포인트로 돌아가기)"])
+        return False
+
+
+# ====== 서버 자원 측정 ======
+class ProcSampler(threading.Thread):
+    """/proc 에서 서버 프로세스의 CPU 시간과 RSS를 주기적으로 읽는다 (Linux)."""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self.rss_samples = []
+        self._stop = threading.Event()
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def cpu_seconds(self) -> float:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                parts = f.read().rsplit(")", 1)[1].split()
+            return (int(parts[11]) + int(parts[12])) / self._tick
+        except (OSError, IndexError, ValueError):
+            return 0.0
+
+    def rss_bytes(self) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    def run(self):
+        while not self._stop.is_set():
+            rss = self.rss_bytes()
+            self.rss_samples.append(rss)
+            self.rss_peak = max(self.rss_peak, rss)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int, base_url: str, extra_env=None):
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "local"),
+        "METRICS_PORT": "0",
+        "LLM_CACHE_PATH": "",
+    })
+    env.update(extra_env or {})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(BASE_DIR, "about_time.py"),
+         "--server.headless", "true", "--server.port", str(port),
+         "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit 서버가 시작되지 않았습니다.")
+
+
+# ====== 집계 ======
+def _pct(values, p):
+    if not values:
+        return None
+    xs = sorted(values)
+    k = max(0, min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def run_level(url: str, sampler: ProcSampler, concurrency: int, games: int, turns: int, seed: int):
+    lock = threading.Lock()
+    steps = []
+
+    def record(name, dt, nbytes):
+        with lock:
+            steps.append((name, dt, nbytes))
+
+    finished = []
+
+    def one(i):
+        ok = play_game(url, turns, random.Random(seed * 1000 + i), record)
+        with lock:
+            finished.append(ok)
+
+    cpu0 = sampler.cpu_seconds()
+    rss_before = sampler.rss_bytes()
+    sampler.rss_peak = rss_before
+    t0 = time.perf_counter()
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        for fut in [ex.submit(one, i) for i in range(games)]:
+            try:
+                fut.result()
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - t0
+    cpu = sampler.cpu_seconds() - cpu0
+
+    lat = [dt for _, dt, _ in steps]
+    by_step = {}
+    for name, dt, nbytes in steps:
+        d = by_step.setdefault(name, {"n": 0, "lat": [], "bytes": 0})
+        d["n"] += 1
+        d["lat"].append(dt)
+        d["bytes"] += nbytes
+    return {
+        "concurrency": concurrency,
+        "games": games,
+        "games_completed": len(finished),
+        "games_reached_gameover": sum(finished),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "interactions": len(steps),
+        "throughput_interactions_per_s": round(len(steps) / wall, 3) if wall else None,
+        "throughput_games_per_s": round(len(finished) / wall, 4) if wall else None,
+        "rerun_latency_s": {p: _pct(lat, int(p[1:])) for p in ("p50", "p90", "p95", "p99")},
+        "server_cpu_s": round(cpu, 3),
+        "server_cpu_util": round(cpu / wall, 3) if wall else None,
+        "server_rss_mb": {
+            "before": round(rss_before / 2**20, 1),
+            "peak": round(sampler.rss_peak / 2**20, 1),
+        },
+        "ws_bytes_total": sum(b for _, _, b in steps),
+        "ws_bytes_per_interaction": round(sum(b for _, _, b in steps) / len(steps)) if steps else None,
+        "by_step": {
+            name: {
+                "n": d["n"],
+                "p50_s": _pct(d["lat"], 50),
+                "p95_s": _pct(d["lat"], 95),
+                "bytes_avg": round(d["bytes"] / d["n"]),
+            }
+            for name, d in sorted(by_step.items())
+        },
+    }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except Exception:
+        return ""
+
+
+def main():
+    ap = argparse.ArgumentParser(description="About Time 동시 접속 부하 테스트")
+    ap.add_argument("--concurrency", default="1,4,16", help="쉼표로 구분한 동시 세션 수 단계")
+    ap.add_argument("--games-per-session", type=int, default=1, help="단계마다 세션당 진행할 게임 수")
+    ap.add_argument("--turns", type=int, default=3, help="첫 타임슬립에서 진행할 턴 수")
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--ttft", type=float, default=0.3)
+    ap.add_argument("--tps", type=float, default=80.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=os.path.join(BASE_DIR, "bench_output.json"))
+    args = ap.parse_args()
+
+    cfg = mock_llm_server.Config("synth", latency=args.latency, ttft=args.ttft, tps=args.tps,
+                                 error_rate=args.error_rate, seed=args.seed)
+    mock, base_url = mock_llm_server.start_in_thread(cfg)
+    port = _free_port()
+    proc = start_app(port, base_url)
+    sampler = ProcSampler(proc.pid)
+    sampler.start()
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    levels = []
+    try:
+        for c in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+            res = run_level(url, sampler, c, c * args.games_per_session, args.turns, args.seed)
+            levels.append(res)
+            print(f"[{c:>3}] rerun p50={res['rerun_latency_s']['p50']:.3f}s "
+                  f"p95={res['rerun_latency_s']['p95']:.3f}s "
+                  f"cpu={res['server_cpu_util']} rss={res['server_rss_mb']['peak']}MB "
+                  f"bytes/int={res['ws_bytes_per_interaction']} err={res['errors']}")
+    finally:
+        sampler.stop()
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        mock.shutdown()
+
+    report = {
+        "version": _git_rev(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "mock": {"latency": args.latency, "ttft": args.ttft, "tps": args.tps, "error_rate": args.error_rate},
+        "turns": args.turns,
+        "levels": levels,
+        "mock_stats": cfg.stats,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os, time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ====== Prometheus 형식 지표 ======
+# 외부 라이브러리 없이 카운터/게이지/히스토그램을 모아 두고,
+# Streamlit 서버와 같은 프로세스의 별도 스레드에서 /metrics 로 노출한다.
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))     # 0이면 엔드포인트 끔
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_registry = []
+_reg_lock = threading.Lock()
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _reg_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def expose(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        out.extend(self._lines(items))
+        return out
+
+    def _lines(self, items):
+        return [f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> dict:
+        """{라벨값 튜플: 값}"""
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect      # 스크랩 시점에 {라벨값 튜플: 값}을 돌려주는 함수
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def expose(self):
+        if self.collect is not None:
+            values = self.collect()
+            with self._lock:
+                self._values = dict(values)
+        return super().expose()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        k = self._key(labels)
+        with self._lock:
+            h = self._values.get(k)
+            if h is None:
+                h = self._values[k] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def snapshot(self) -> dict:
+        """{라벨값 튜플: (합계, 관측 수)}"""
+        with self._lock:
+            return {k: (h[1], h[2]) for k, h in self._values.items()}
+
+    def _lines(self, items):
+        out = []
+        for k, (counts, total, n) in items:
+            for b, c in zip(self.buckets, counts):
+                out.append(f"{self.name}_bucket{_label_str(self.labels, k, [('le', _fmt(b))])} {c}")
+            out.append(f"{self.name}_sum{_label_str(self.labels, k)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labels, k)} {n}")
+        return out
+
+
+def exposition() -> str:
+    with _reg_lock:
+        metrics = list(_registry)
+    lines = []
+    for m in metrics:
+        lines.extend(m.expose())
+    return "\n".join(lines) + "\n"
+
+
+# ====== LLM 호출 지표 ======
+LLM_REQUESTS = Counter("about_time_llm_requests_total", "LLM 호출 수", ("site", "model", "stream", "status"))
+LLM_ERRORS = Counter("about_time_llm_errors_total", "LLM 호출 오류 수", ("site", "model", "error"))
+LLM_RETRIES = Counter("about_time_llm_retries_total", "LLM 재시도 수", ("site", "model"))
+LLM_TTFT = Histogram("about_time_llm_ttft_seconds", "첫 토큰까지 걸린 시간", ("site", "model"))
+LLM_LATENCY = Histogram("about_time_llm_latency_seconds", "LLM 호출 전체 소요 시간", ("site", "model"))
+LLM_CHUNKS = Histogram("about_time_llm_chunks", "스트리밍 응답 청크 수", ("site", "model"), COUNT_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram("about_time_llm_prompt_tokens", "프롬프트 토큰 수", ("site", "model"), TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = Histogram("about_time_llm_completion_tokens", "완성 토큰 수", ("site", "model"), TOKEN_BUCKETS)
+
+# ====== 게임 흐름 지표 ======
+SESSION_IDLE_S = float(os.getenv("METRICS_SESSION_IDLE_S", "1800"))
+_sessions = {}          # session_id → (mode, 마지막 접속 시각)
+_sessions_lock = threading.Lock()
+
+
+def touch_session(session_id: str, mode: str):
+    if not session_id:
+        return
+    with _sessions_lock:
+        _sessions[session_id] = (mode, time.monotonic())
+
+
+def _active_sessions():
+    now = time.monotonic()
+    counts = {}
+    with _sessions_lock:
+        for sid, (mode, seen) in list(_sessions.items()):
+            if now - seen > SESSION_IDLE_S:
+                del _sessions[sid]
+                continue
+            counts[(mode,)] = counts.get((mode,), 0) + 1
+    return counts
+
+
+ACTIVE_SESSIONS = Gauge("about_time_active_sessions", "모드별 활성 세션 수", ("mode",), collect=_active_sessions)
+TURNS = Counter("about_time_turns_total", "진행된 턴 수", ())
+TICKETS_USED = Counter("about_time_tickets_used_total", "사용된 티켓 수", ())
+OUTCOMES = Counter("about_time_outcomes_total", "현재 결말 판정 결과", ("result",))
+GAMES = Counter("about_time_games_total", "끝난 게임 수(결과별)", ("result",))
+GAME_TURNS = Histogram("about_time_game_turns", "게임당 사용한 턴 수", (), (1, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20))
+PRESENT_FIRST_TEXT = Histogram("about_time_present_first_text_seconds", "현재 화면에서 결말 첫 글자가 보이기까지 걸린 시간", ("source",))
+GAME_TICKETS = Histogram("about_time_game_tickets_used", "게임당 사용한 티켓 수", (), (0, 1, 2, 3))
+
+
+# ====== /metrics 엔드포인트 ======
+_server = None
+_server_tried = False
+_server_lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int = None, host: str = None):
+    """프로세스당 한 번만 띄운다. 포트가 이미 쓰이고 있으면 조용히 건너뜀."""
+    global _server, _server_tried
+    port = METRICS_PORT if port is None else port
+    if port <= 0:
+        return None
+    with _server_lock:
+        if _server is not None or _server_tried:
+            return _server
+        _server_tried = True
+        try:
+            _server = ThreadingHTTPServer((host or METRICS_HOST, port), _Handler)
+        except OSError:
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -0,0 +1,253 @@
+"""
+세션 저장소(STATE_STORE=redis://…) 시험용 미니 Redis 서버 (RESP2, 메모리 전용).
+
+    python mini_redis.py --port 6390
+    STATE_STORE=redis://127.0.0.1:6390/0 streamlit run about_time.py --server.port 8501
+    STATE_STORE=redis://127.0.0.1:6390/0 streamlit run about_time.py --server.port 8502
+
+state_store.RedisStore가 쓰는 명령만 지원한다:
+PING, SELECT, AUTH, GET, SET [EX], DEL, EXISTS, EXPIRE, TTL, INCR, RPUSH, LRANGE, LLEN,
+WATCH/UNWATCH/MULTI/EXEC/DISCARD, DBSIZE, FLUSHALL.
+WATCH는 키마다 수정 횟수를 세어, EXEC 시점에 달라졌으면 트랜잭션을 버리고 nil을 돌려준다.
+"""
+import time
+import argparse
+import threading
+import socketserver
+
+
+class _Data:
+    def __init__(self):
+        self.values = {}         # 키 → str 또는 list
+        self.expires = {}        # 키 → 만료 시각
+        self.revs = {}           # 키 → 수정 횟수 (WATCH용)
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        exp = self.expires.get(key)
+        if exp is not None and exp <= time.time():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+            self._touch(key)
+        return key in self.values
+
+    def _touch(self, key):
+        self.revs[key] = self.revs.get(key, 0) + 1
+
+    def rev(self, key):
+        self._alive(key)
+        return self.revs.get(key, 0)
+
+    # ---- 명령 (lock을 잡은 상태에서 호출) ----
+    def run(self, cmd, args):
+        fn = getattr(self, "cmd_" + cmd, None)
+        if fn is None:
+            return Error(f"ERR unknown command '{cmd}'")
+        try:
+            return fn(*args)
+        except TypeError:
+            return Error(f"ERR wrong number of arguments for '{cmd}' command")
+        except ValueError:
+            return Error("ERR value is not an integer or out of range")
+
+    def cmd_ping(self, msg=None):
+        return Simple("PONG") if msg is None else msg
+
+    def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self.values[key]
+        return Error("WRONGTYPE") if isinstance(value, list) else value
+
+    def cmd_set(self, key, value, *opts):
+        self.values[key] = value
+        self.expires.pop(key, None)
+        if len(opts) == 2 and opts[0].upper() == "EX":
+            self.expires[key] = time.time() + int(opts[1])
+        self._touch(key)
+        return Simple("OK")
+
+    def cmd_del(self, *keys):
+        n = 0
+        for key in keys:
+            if self._alive(key):
+                del self.values[key]
+                self.expires.pop(key, None)
+                self._touch(key)
+                n += 1
+        return n
+
+    def cmd_exists(self, *keys):
+        return sum(1 for k in keys if self._alive(k))
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        exp = self.expires.get(key)
+        return -1 if exp is None else max(0, int(exp - time.time()))
+
+    def cmd_incr(self, key):
+        value = int(self.values.get(key, "0") if self._alive(key) else "0") + 1
+        self.values[key] = str(value)
+        self._touch(key)
+        return value
+
+    def cmd_rpush(self, key, *items):
+        lst = self.values.get(key) if self._alive(key) else None
+        if lst is None:
+            lst = self.values[key] = []
+        elif not isinstance(lst, list):
+            return Error("WRONGTYPE")
+        lst.extend(items)
+        self._touch(key)
+        return len(lst)
+
+    def cmd_lrange(self, key, start, stop):
+        lst = self.values.get(key) if self._alive(key) else []
+        start, stop = int(start), int(stop)
+        stop = len(lst) + stop if stop < 0 else stop
+        return lst[start:stop + 1]
+
+    def cmd_llen(self, key):
+        return len(self.values.get(key, [])) if self._alive(key) else 0
+
+    def cmd_dbsize(self):
+        return sum(1 for k in list(self.values) if self._alive(k))
+
+    def cmd_flushall(self):
+        for key in list(self.values):
+            self._touch(key)
+        self.values.clear()
+        self.expires.clear()
+        return Simple("OK")
+
+
+class Simple(str):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Error):
+        return b"-" + value.encode("utf-8") + b"\r\n"
+    if isinstance(value, Simple):
+        return b"+" + value.encode("utf-8") + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    b = value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(b), b)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    data = None                  # start_in_thread()/main()에서 _Data로 채움
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode("utf-8").split()          # 인라인 명령 (redis-cli/telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            n = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(n + 2)[:-2].decode("utf-8"))
+        return args
+
+    def handle(self):
+        data = self.data
+        watched = {}             # 키 → WATCH 시점의 수정 횟수
+        queued = None            # MULTI 이후 쌓인 명령
+        while True:
+            try:
+                args = self._read_command()
+            except (ValueError, ConnectionError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            cmd, rest = args[0].lower(), args[1:]
+            if cmd == "quit":
+                self.wfile.write(_encode(Simple("OK")))
+                return
+            if cmd in ("select", "auth"):
+                reply = Simple("OK")
+            elif cmd == "watch":
+                with data.lock:
+                    for key in rest:
+                        watched.setdefault(key, data.rev(key))
+                reply = Simple("OK")
+            elif cmd == "unwatch":
+                watched.clear()
+                reply = Simple("OK")
+            elif cmd == "multi":
+                queued = []
+                reply = Simple("OK")
+            elif cmd == "discard":
+                queued, reply = None, Simple("OK")
+                watched.clear()
+            elif cmd == "exec":
+                if queued is None:
+                    reply = Error("ERR EXEC without MULTI")
+                else:
+                    with data.lock:
+                        if any(data.rev(k) != r for k, r in watched.items()):
+                            reply = None
+                        else:
+                            reply = [data.run(c, a) for c, a in queued]
+                    queued = None
+                    watched.clear()
+            elif queued is not None:
+                queued.append((cmd, rest))
+                reply = Simple("QUEUED")
+            else:
+                with data.lock:
+                    reply = data.run(cmd, rest)
+            self.wfile.write(_encode(reply))
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _make_server(host: str, port: int) -> Server:
+    handler = type("BoundHandler", (Handler,), {"data": _Data()})
+    return Server((host, port), handler)
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0):
+    """백그라운드 스레드로 서버를 띄우고 (서버, redis URL)을 반환한다. port=0이면 빈 포트 사용."""
+    server = _make_server(host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="About Time 세션 저장소 시험용 미니 Redis 서버")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    args = ap.parse_args()
+    server = _make_server(args.host, args.port)
+    print(f"mini redis on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+OpenAI 호환 로컬 대역 서버 (/v1/chat/completions, 스트리밍/비스트리밍).
+
+    python mock_llm_server.py --mode synth --port 8765 --ttft 0.4 --tps 60
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run about_time.py
+
+모드
+- synth : 요청 종류(스토리/턴/결말/인물 추출/요약)를 알아보고 템플릿으로 형식에 맞는 답을 만든다.
+- replay: cassettes/ 의 녹화본에서 같은 요청을 찾아 그대로 돌려준다 (없으면 synth로 대체, --strict면 404).
+- record: 실제 업스트림(--upstream)으로 프록시하면서 요청/응답을 카세트로 녹화한다.
+모든 모드에 지연(--latency), 첫 토큰 시간(--ttft), 초당 토큰(--tps), 오류율(--error-rate)을 주입할 수 있다.
+"""
+import os, re, json, time, random, glob
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_cache import cache_key
+
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+
+_NAMES = ["민우", "지연", "서준", "하은", "도윤", "수아", "지호", "예린", "현우", "유나", "태오", "소희"]
+_PLACES = ["한강 공원", "퇴근길 버스 정류장", "비 오는 밤 국도", "겨울 스키장", "새벽 편의점", "부산 바닷가"]
+_HABITS = ["늦은 밤 운전", "약 복용을 미루는 습관", "연락을 끊고 혼자 버티는 버릇", "무리한 야근", "빙판길 과속"]
+
+
+# ====== 합성 응답 ======
+def _all_text(messages) -> str:
+    return "\n".join(m.get("content") or "" for m in messages if isinstance(m.get("content"), str))
+
+
+def classify(messages) -> str:
+    text = _all_text(messages)
+    if "시나리오 작가" in text:
+        return "story"
+    if "JSON만 출력" in text:
+        return "extract"
+    if "대화 기록을 압축" in text:
+        return "summary"
+    if "결말을 쓰는 작가" in text:
+        return "outcome"
+    return "turn"
+
+
+def _synth_story(rng) -> str:
+    a, b = rng.sample(_NAMES, 2)
+    victim = rng.choice([a, b])
+    place = rng.choice(_PLACES)
+    h1, h2 = rng.sample(_HABITS, 2)
+    return (
+        f"[체크포인트 1: 어긋난 약속]\n{a}와 {b}는 {place}에서 만나기로 했지만 {a}가 한 시간 늦었다. "
+        f"{b}는 괜찮다고 웃었지만 \"다음엔 미리 말해줘\"라고 조용히 말했다. "
+        f"{a}는 고개를 끄덕였지만 휴대폰만 바라봤다.\n\n"
+        f"[체크포인트 2: 작은 신호]\n며칠 뒤 {victim}는 {h1} 때문에 몸이 무겁다고 털어놓았다. "
+        f"{a if victim == b else b}는 \"주말에 쉬면 괜찮아\"라며 대수롭지 않게 넘겼다. "
+        f"{victim}는 더 말하려다 입을 다물었다.\n\n"
+        f"[체크포인트 3: 다툼]\n{a}와 {b}는 기념일 계획을 두고 크게 다퉜다. "
+        f"{b}는 \"넌 늘 네 일정만 중요하지\"라고 쏘아붙였고 {a}는 방문을 닫고 나가 버렸다. "
+        f"그날 밤 두 사람은 서로에게 연락하지 않았다.\n\n"
+        f"[체크포인트 4: 무리한 선택]\n화해하려던 날, {victim}는 {h2}을 고집하며 혼자 나서겠다고 했다. "
+        f"{a if victim == b else b}는 말리려 했지만 \"이번엔 나 믿어\"라는 말에 물러섰다. "
+        f"밖에는 점점 비가 거세졌다.\n\n"
+        f"[엔딩: 돌이킬 수 없는 밤]\n쌓인 피로와 그날의 고집이 겹치며 사고는 피할 수 없었다. "
+        f"{a if victim == b else b}는 뒤늦게 달려갔지만 모든 것이 늦어 있었다. "
+        f"결국 {victim}는 숨을 거둔다."
+    )
+
+
+def _synth_story_json(rng) -> str:
+    """구조화 스토리 요청(response_format=json_schema)용: 같은 합성 스토리를 JSON 문서로"""
+    text = _synth_story(rng)
+    sections = []
+    for block in text.split("\n\n"):
+        head, body = block.split("\n", 1)
+        sections.append({"title": head.split(":", 1)[1].rstrip("]").strip(), "body": body})
+    m = re.search(r'([가-힣]{2})와 ([가-힣]{2})는', text)
+    victim = re.search(r'결국 ([가-힣]{2})는 숨을 거둔다', text).group(1)
+    return json.dumps({
+        "characters": [m.group(1), m.group(2)], "victim": victim,
+        "checkpoints": sections[:4], "ending": sections[4],
+    }, ensure_ascii=False)
+
+
+def _synth_extract(messages) -> str:
+    text = messages[-1].get("content", "")
+    m = re.search(r'([가-힣]{2})(?:와|과)\s*([가-힣]{2})(?:는|은)', text)
+    chars = [m.group(1), m.group(2)] if m else _NAMES[:2]
+    ending = text[text.rfind("[엔딩"):] if "[엔딩" in text else text
+    last = max(chars, key=lambda c: ending.rfind(c))
+    if "victim" in _all_text(messages):
+        return json.dumps({"characters": chars, "victim": last}, ensure_ascii=False)
+    return json.dumps({"characters": chars}, ensure_ascii=False)
+
+
+def _synth_turn(messages, rng) -> str:
+    text = _all_text(messages)
+    m = re.search(r'<<<\n(.*?)\n>>>', messages[-1].get("content", ""), re.S)
+    said = m.group(1).strip() if m else "..."
+    if "risk_down1>'만" in text:
+        tag, body = "<STATUS: risk_down1>", "상대는 잠시 망설이다가 천천히 고개를 끄덕였다. 굳어 있던 표정이 조금 풀렸다. 하지만 아직 확답은 하지 않았다."
+    elif "neutral>'만" in text:
+        tag, body = "<STATUS: neutral>", "상대는 알겠다고 대답했지만 시선을 잠깐 피했다. 대화는 평소처럼 이어졌다. 말끝이 살짝 흐려졌다."
+    else:
+        tag = rng.choice(["<STATUS: risk_up1>", "<STATUS: neutral>"])
+        body = "상대는 팔짱을 낀 채 한숨을 쉬었다. \"지금 그 얘기를 왜 해?\"라며 목소리를 높였다. 방 안 공기가 차갑게 가라앉았다."
+    return f"{said} {body} {tag}"
+
+
+def _synth_outcome(messages) -> str:
+    if "해피엔딩" in _all_text(messages):
+        return ("작은 선택들이 모여 위험한 밤은 끝내 오지 않았다. 두 사람은 미리 약속을 지키고, 서로의 몸 상태를 챙겼다. "
+                "그해 겨울, 두 사람은 같은 길을 나란히 걸으며 다음 계획을 이야기했다. <ENDING: success>")
+    return ("잠시 나아지는 듯했지만 남아 있던 불씨가 다시 겹쳤다. 같은 밤, 같은 길 위에서 비극은 되풀이되었다. "
+            "남겨진 사람은 끝내 그날을 되돌리지 못했다. <ENDING: failure>")
+
+
+def synthesize(messages, seed: str, response_format=None) -> str:
+    rng = random.Random(seed)
+    kind = classify(messages)
+    if kind == "story":
+        if (response_format or {}).get("type") == "json_schema":
+            return _synth_story_json(rng)
+        return _synth_story(rng)
+    if kind == "extract":
+        return _synth_extract(messages)
+    if kind == "summary":
+        return "플레이어는 여러 번 설득을 시도했고 상대는 조금씩 마음을 열었지만 갈등의 원인은 아직 남아 있다."
+    if kind == "outcome":
+        return _synth_outcome(messages)
+    return _synth_turn(messages, rng)
+
+
+# ====== 카세트 ======
+class CassetteStore:
+    """카세트 디렉터리의 *.jsonl (한 줄당 요청/응답 1건)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._cursor = {}
+        self._out = None
+        for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._by_key.setdefault(rec["key"], []).append(rec["response"])
+
+    def __len__(self):
+        return sum(len(v) for v in self._by_key.values())
+
+    def lookup(self, key: str):
+        """같은 요청이 여러 번 녹화됐으면 차례대로 돌려준다."""
+        with self._lock:
+            hits = self._by_key.get(key)
+            if not hits:
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            return hits[i % len(hits)]
+
+    def append(self, key: str, body: dict, response: str):
+        with self._lock:
+            if self._out is None:
+                os.makedirs(self.directory, exist_ok=True)
+                name = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}.jsonl"
+                self._out = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+            rec = {
+                "key": key,
+                "kind": classify(body.get("messages", [])),
+                "model": body.get("model"),
+                "messages": body.get("messages"),
+                "response": response,
+            }
+            self._out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._out.flush()
+            self._by_key.setdefault(key, []).append(response)
+
+
+# ====== HTTP ======
+class Config:
+    def __init__(self, mode="synth", cassettes=DEFAULT_CASSETTE_DIR, strict=False, upstream=None,
+                 latency=0.0, ttft=0.2, tps=80.0, error_rate=0.0, seed=0):
+        self.mode = mode
+        self.strict = strict
+        self.upstream = (upstream or "https://api.openai.com/v1").rstrip("/")
+        self.latency = latency          # 요청마다 추가되는 고정 지연(초)
+        self.ttft = ttft                # 첫 토큰까지 지연(초)
+        self.tps = tps                  # 초당 토큰(≈ 2글자 = 1토큰으로 계산)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.store = CassetteStore(cassettes)
+        self.stats = {"requests": 0, "errors": 0, "replayed": 0, "synthesized": 0, "recorded": 0}
+        self.lock = threading.Lock()
+
+    def bump(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _pieces(text: str, size: int = 4):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: Config = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            with self.config.lock:
+                self._json(200, dict(self.config.stats))
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        cfg = self.config
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        cfg.bump("requests")
+
+        with cfg.lock:
+            fail = cfg.rng.random() < cfg.error_rate
+            status = cfg.rng.choice([429, 500, 503])
+        if fail:
+            cfg.bump("errors")
+            self._json(status, {"error": {"message": "injected error", "type": "mock_error", "code": status}})
+            return
+
+        key = cache_key(body)
+        if cfg.mode == "record":
+            self._proxy_and_record(body, key)
+            return
+
+        text = cfg.store.lookup(key) if cfg.mode == "replay" else None
+        if text is None:
+            if cfg.mode == "replay" and cfg.strict:
+                self._json(404, {"error": {"message": f"cassette miss: {key}"}})
+                return
+            text = synthesize(body.get("messages", []), key, body.get("response_format"))
+            cfg.bump("synthesized")
+        else:
+            cfg.bump("replayed")
+        self._respond(body, text)
+
+    # ---- 응답 ----
+    def _respond(self, body: dict, text: str):
+        cfg = self.config
+        model = body.get("model", "mock")
+        created = int(time.time())
+        cid = f"chatcmpl-mock-{created}-{threading.get_ident()}"
+        usage = {
+            "prompt_tokens": _tokens(_all_text(body.get("messages", []))),
+            "completion_tokens": _tokens(text),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(cfg.latency)
+
+        if not body.get("stream"):
+            time.sleep(cfg.ttft + (_tokens(text) / cfg.tps if cfg.tps > 0 else 0))
+            self._json(200, {
+                "id": cid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(payload):
+            self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish=None):
+            return {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+        try:
+            time.sleep(cfg.ttft)
+            send(chunk({"role": "assistant", "content": ""}))
+            per_piece = (2 / cfg.tps) if cfg.tps > 0 else 0       # 4글자 ≈ 2토큰
+            for piece in _pieces(text):
+                send(chunk({"content": piece}))
+                if per_piece:
+                    time.sleep(per_piece)
+            send(chunk({}, "stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send({"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                      "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _proxy_and_record(self, body: dict, key: str):
+        cfg = self.config
+        req = urllib.request.Request(
+            cfg.upstream + "/chat/completions",
+            data=json.dumps(body).encode("utf-8"),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}",
+            },
+        )
+        try:
+            resp = urllib.request.urlopen(req, timeout=600)
+        except urllib.error.HTTPError as e:
+            self._json(e.code, json.loads(e.read() or b"{}"))
+            return
+        if not body.get("stream"):
+            data = json.loads(resp.read())
+            cfg.store.append(key, body, data["choices"][0]["message"]["content"])
+            cfg.bump("recorded")
+            self._json(200, data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        parts = []
+        for raw in resp:
+            self.wfile.write(raw)
+            self.wfile.flush()
+            line = raw.decode("utf-8").strip()
+            if line.startswith("data: ") and line != "data: [DONE]":
+                try:
+                    choices = json.loads(line[6:]).get("choices") or []
+                except ValueError:
+                    continue
+                if choices:
+                    parts.append(choices[0].get("delta", {}).get("content") or "")
+        cfg.store.append(key, body, "".join(parts))
+        cfg.bump("recorded")
+
+
+def start_in_thread(config: Config, host: str = "127.0.0.1", port: int = 0):
+    """백그라운드 스레드로 서버를 띄우고 (서버, base_url)을 반환한다. port=0이면 빈 포트 사용."""
+    handler = type("BoundHandler", (Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="About Time용 OpenAI 호환 로컬 대역 서버")
+    ap.add_argument("--mode", choices=["synth", "replay", "record"], default="synth")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--cassettes", default=DEFAULT_CASSETTE_DIR)
+    ap.add_argument("--strict", action="store_true", help="replay 모드에서 녹화본이 없으면 404")
+    ap.add_argument("--upstream", default=os.getenv("MOCK_UPSTREAM_URL"), help="record 모드의 실제 API 주소")
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--ttft", type=float, default=0.2)
+    ap.add_argument("--tps", type=float, default=80.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    cfg = Config(args.mode, args.cassettes, args.strict, args.upstream,
+                 args.latency, args.ttft, args.tps, args.error_rate, args.seed)
+    handler = type("BoundHandler", (Handler,), {"config": cfg})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"mock LLM ({args.mode}, 카세트 {len(cfg.store)}건) → OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os, time
+import threading
+
+try:
+    import tomllib
+except ImportError:                       # Python < 3.11
+    tomllib = None
+
+import metrics
+
+# ====== 호출 지점별 모델 라우팅 ======
+# 작업(경로)마다 모델, 최대 토큰, 마감 시간, 지연 목표(SLO), 대체 모델 단계를 둔다.
+# - 기본 모델이 오류(재시도 가능한 오류/모델 없음)로 실패하면 같은 호출을 다음 단계 모델로 다시 보낸다.
+# - 기본 모델의 최근 지연(EWMA; 스트리밍은 첫 토큰 시간)이 SLO를 넘으면 LLM_ROUTE_COOLDOWN_S 동안
+#   처음부터 다음 단계 모델로 보내고, 그 뒤 다시 기본 모델을 시험한다.
+# 설정 우선순위: LLM_ROUTE_<경로>="모델[,대체…]" 환경 변수 > LLM_ROUTES_FILE(TOML) > 기본값.
+
+gpt_4_1_mini = 'gpt-4.1-mini'
+gpt_4o_mini = 'gpt-4o-mini'
+gpt_4o = 'gpt-4o'
+gpt_5_nano = 'gpt-5-nano'
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", gpt_4o)
+ROUTES_FILE = os.getenv("LLM_ROUTES_FILE", "")
+COOLDOWN_S = float(os.getenv("LLM_ROUTE_COOLDOWN_S", "60"))
+EWMA_ALPHA = 0.2
+
+# 호출 지점 → 경로
+SITE_ROUTES = {
+    "story": "story",
+    "story_pool": "story",
+    "turn": "turn",
+    "outcome": "ending",
+    "extract_cast": "extraction",
+    "extract_characters": "extraction",
+    "summary": "summary",
+}
+
+# 경로별 기본값. max_tokens None이면 보내지 않음, timeout None이면 스케줄러 기본 마감, slo_s None이면 지연 기반 전환 안 함
+DEFAULT_ROUTES = {
+    "story":      {"model": DEFAULT_MODEL, "fallback": [gpt_4_1_mini], "max_tokens": None, "timeout": None, "slo_s": 6.0},
+    "turn":       {"model": DEFAULT_MODEL, "fallback": [gpt_4o_mini], "max_tokens": None, "timeout": 60, "slo_s": 3.0},
+    "ending":     {"model": DEFAULT_MODEL, "fallback": [gpt_4_1_mini], "max_tokens": None, "timeout": 90, "slo_s": 4.0},
+    "extraction": {"model": gpt_4o_mini, "fallback": [gpt_4_1_mini], "max_tokens": 200, "timeout": 30, "slo_s": None},
+    "summary":    {"model": gpt_4o_mini, "fallback": [gpt_4_1_mini], "max_tokens": 600, "timeout": None, "slo_s": None},
+}
+
+# 1M 토큰당 USD (입력, 출력) — 비용 지표용. TOML [prices."모델"] input/output으로 덮어쓴다.
+DEFAULT_PRICES = {
+    gpt_4o: (2.50, 10.00),
+    gpt_4o_mini: (0.15, 0.60),
+    gpt_4_1_mini: (0.40, 1.60),
+    gpt_5_nano: (0.05, 0.40),
+}
+
+LLM_COST = metrics.Counter("about_time_llm_cost_usd_total", "토큰 사용량으로 추정한 LLM 비용(USD)", ("site", "model"))
+ROUTE_FALLBACKS = metrics.Counter(
+    "about_time_llm_route_fallbacks_total", "대체 모델로 넘긴 호출 수", ("route", "from_model", "to_model", "reason"),
+)
+
+
+class Route:
+    __slots__ = ("name", "model", "fallback", "max_tokens", "timeout", "slo_s")
+
+    def __init__(self, name, model, fallback=(), max_tokens=None, timeout=None, slo_s=None):
+        self.name = name
+        self.model = model
+        self.fallback = [m for m in fallback if m and m != model]
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.slo_s = slo_s
+
+    def token_args(self, model: str) -> dict:
+        """
+        모델 계열에 맞는 최대 토큰 인자 (gpt-5/o 계열은 max_completion_tokens).
+        추론 모델은 추론 토큰도 이 예산에서 쓰므로, 짧은 예산이 추론에 다 쓰여 본문이 비지 않게 추론 강도를 가장 낮춘다.
+        """
+        if not self.max_tokens:
+            return {}
+        if model.startswith("gpt-5-chat"):            # gpt-5 계열이지만 추론하지 않는 모델
+            return {"max_completion_tokens": self.max_tokens}
+        if model.startswith("gpt-5"):
+            return {"max_completion_tokens": self.max_tokens, "reasoning_effort": "minimal"}
+        if model.startswith(("o3", "o4")):
+            return {"max_completion_tokens": self.max_tokens, "reasoning_effort": "low"}
+        if model.startswith("o1"):                    # o1-mini/preview는 reasoning_effort를 받지 않는다
+            return {"max_completion_tokens": self.max_tokens}
+        return {"max_tokens": self.max_tokens}
+
+
+def load_routes(path: str = ROUTES_FILE):
+    """(경로 이름 → Route, 가격표)"""
+    conf = {name: dict(r) for name, r in DEFAULT_ROUTES.items()}
+    prices = dict(DEFAULT_PRICES)
+    if path:
+        if tomllib is None:
+            raise RuntimeError("LLM_ROUTES_FILE을 읽으려면 Python 3.11 이상(tomllib)이 필요합니다.")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+        for name, r in data.get("routes", {}).items():
+            conf.setdefault(name, dict(DEFAULT_ROUTES["turn"])).update(r)
+        for model, p in data.get("prices", {}).items():
+            prices[model] = (float(p.get("input", 0)), float(p.get("output", 0)))
+    for name, r in conf.items():
+        env = os.getenv(f"LLM_ROUTE_{name.upper()}")
+        if env:
+            models = [m.strip() for m in env.split(",") if m.strip()]
+            r["model"], r["fallback"] = models[0], models[1:]
+    routes = {name: Route(name, r["model"], r.get("fallback") or (), r.get("max_tokens"),
+                          r.get("timeout"), r.get("slo_s")) for name, r in conf.items()}
+    return routes, prices
+
+
+class _Health:
+    __slots__ = ("ewma", "calls", "errors", "degraded_until")
+
+    def __init__(self):
+        self.ewma = None
+        self.calls = 0
+        self.errors = 0
+        self.degraded_until = 0.0
+
+
+class Router:
+    def __init__(self, routes: dict, prices: dict):
+        self.routes = routes
+        self.prices = prices
+        self._health = {}            # (경로, 모델) → _Health
+        self._lock = threading.Lock()
+
+    def route_for(self, site: str) -> Route:
+        name = SITE_ROUTES.get(site, site)
+        route = self.routes.get(name)
+        if route is None:
+            route = self.routes[name] = Route(name, DEFAULT_MODEL)
+        return route
+
+    def _h(self, route: str, model: str) -> _Health:
+        h = self._health.get((route, model))
+        if h is None:
+            h = self._health[(route, model)] = _Health()
+        return h
+
+    def tiers(self, route: Route):
+        """이번 호출에 시도할 모델 순서. 기본 모델이 SLO 초과로 쉬는 중이면 뒤로 미룬다."""
+        models = [route.model] + route.fallback
+        if not route.fallback:
+            return models
+        with self._lock:
+            if self._h(route.name, route.model).degraded_until > time.monotonic():
+                ROUTE_FALLBACKS.inc(route=route.name, from_model=route.model, to_model=models[1], reason="slo")
+                return models[1:] + models[:1]
+        return models
+
+    def observe(self, route: Route, model: str, latency, ok: bool = True):
+        """호출 결과 기록. latency는 스트리밍이면 첫 토큰 시간, 아니면 전체 시간 (없으면 None)."""
+        with self._lock:
+            h = self._h(route.name, model)
+            h.calls += 1
+            if not ok:
+                h.errors += 1
+                return
+            if latency is None:
+                return
+            h.ewma = latency if h.ewma is None else (1 - EWMA_ALPHA) * h.ewma + EWMA_ALPHA * latency
+            if model == route.model and route.slo_s and route.fallback and h.ewma > route.slo_s:
+                h.degraded_until = time.monotonic() + COOLDOWN_S
+                h.ewma = None        # 쿨다운 뒤 첫 시험 호출부터 새로 잰다
+
+    def fell_back(self, route: Route, from_model: str, to_model: str, reason: str = "error"):
+        ROUTE_FALLBACKS.inc(route=route.name, from_model=from_model, to_model=to_model, reason=reason)
+
+    def cost(self, model: str, prompt_tokens, completion_tokens) -> float:
+        price = self.prices.get(model)
+        if price is None:
+            return 0.0
+        return ((prompt_tokens or 0) * price[0] + (completion_tokens or 0) * price[1]) / 1_000_000
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        out = {}
+        with self._lock:
+            for name, route in self.routes.items():
+                models = {}
+                for model in [route.model] + route.fallback:
+                    h = self._health.get((name, model))
+                    if h is None:
+                        continue
+                    models[model] = {
+                        "calls": h.calls, "errors": h.errors,
+                        "ewma_s": round(h.ewma, 3) if h.ewma is not None else None,
+                        "degraded": h.degraded_until > now,
+                    }
+                out[name] = {"model": route.model, "fallback": route.fallback, "slo_s": route.slo_s, "models": models}
+        return out
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router(*load_routes())
+        return _router
+
+
+def _degraded_routes():
+    return {(name,): int(any(m["degraded"] for m in r["models"].values()))
+            for name, r in get_router().stats().items()}
+
+
+metrics.Gauge("about_time_llm_route_degraded", "기본 모델이 SLO 초과로 대체 모델을 쓰는 중인 경로 (1/0)", ("route",),
+              collect=_degraded_routes)
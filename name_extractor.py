@@ -0,0 +1,329 @@
+import os, re
+import functools
+
+import metrics
+from checkpoint_lexer import TAG_RE
+
+# ====== 로컬 인물 이름 추출 ======
+# 스토리 본문만 보고 두 주인공 이름과 피해자를 고른다 (LLM 호출 없음, 스토리 한 편에 수백 µs).
+# - 한글 어절마다 조사(josa)를 뒤에서부터 최장 일치로 떼어 내 명사 후보를 만든다.
+# - 점수: 조사가 붙은 등장 횟수, 등장한 문단 수, 첫 문장 등장, 'A와 B는' 병렬 구문, 성씨 표, 받침-조사 호응.
+# - 피해자: [엔딩] 문단에서 이름 주변의 죽음/상실 술어와 생존자 술어를 센다 (위치는 단서가 없을 때만).
+# confidence가 NAME_EXTRACT_MIN_CONFIDENCE 이상일 때만 LLM 추출을 건너뛴다.
+
+NAME_EXTRACT_MIN_CONFIDENCE = float(os.getenv("NAME_EXTRACT_MIN_CONFIDENCE", "0.7"))
+
+NAME_EXTRACTIONS = metrics.Counter(
+    "about_time_name_extractions_total", "로컬 인물 추출 결과 (local=LLM 생략, llm=신뢰도 부족으로 LLM 사용)", ("stage", "result"),
+)
+
+SURNAMES = set(
+    "김이박최정강조윤장임한오서신권황안송류전홍고문양손배백허유남심노하곽성차주우구민진나지엄채원천방공현함변염여추도소석선설마길연위표명기반왕금옥육인맹제모탁국어은편용예경봉사부"
+)
+COMPOUND_SURNAMES = {"남궁", "황보", "제갈", "선우", "독고", "사공", "서문"}
+
+# 이름처럼 조사를 달고 자주 나오는 일반 명사/대명사/부사
+STOPWORDS = {
+    "그녀", "그들", "우리", "너희", "자신", "서로", "사람", "두사람", "상대", "연인", "애인", "남자", "여자",
+    "친구", "가족", "엄마", "아빠", "부모", "동생", "언니", "오빠", "누나", "선배", "후배", "회사", "직장",
+    "마음", "생각", "기분", "표정", "목소리", "대화", "이야기", "얘기", "사실", "진심", "말투", "눈물", "한숨",
+    "순간", "시간", "오늘", "내일", "어제", "그날", "그때", "그날밤", "이번", "다음", "처음", "마지막", "하루",
+    "주말", "아침", "저녁", "새벽", "오후", "밤새", "평소", "결국", "하지", "그러", "그리", "하지만", "그러나",
+    "그래서", "그리고", "그런데", "다시", "아직", "이미", "점점", "조금", "모든", "모두", "혼자", "함께", "같이",
+    "약속", "전화", "문자", "연락", "휴대폰", "핸드폰", "메시지", "사고", "병원", "의사", "경찰", "차량", "도로",
+    "운전", "신호", "빗길", "날씨", "건강", "몸살", "피로", "문제", "걱정", "이유", "결과", "선택", "고집", "비극",
+    "사랑", "기념일", "여행", "계획", "일정", "야근", "퇴근", "출근", "집앞", "거리", "바다", "공원", "무리",
+    "위험", "경고", "부탁", "대답", "질문", "미래", "과거", "현재", "체크", "포인트", "엔딩", "결말", "이것",
+    "그것", "저것", "여기", "거기", "이곳", "그곳", "무엇", "누구", "아무", "정말", "진짜", "너무", "계속",
+}
+
+_SUBJECT = ("은", "는", "이", "가", "께서")
+_CONJ = ("와", "과", "랑", "이랑", "하고")
+_JOSA = (
+    "은", "는", "이", "가", "을", "를", "의", "에", "도", "만", "와", "과", "랑", "야", "아", "여",
+    "에게", "한테", "께서", "에게서", "한테서", "에서", "으로", "로", "까지", "부터", "처럼", "보다",
+    "이랑", "하고", "이나", "나", "조차", "마저", "이다", "였다", "이었다", "이라고", "라고", "이라는", "라는",
+    "이를", "이는", "이가", "이도", "이와", "이의", "이에게", "이한테", "이만", "이랑은", "에게는", "에게도",
+    "한테는", "와는", "과는", "와의", "과의", "와도", "과도", "씨", "씨는", "씨가", "씨를", "씨의", "씨에게",
+)
+# 받침 있는 말 뒤에만 오는 조사 / 받침 없는 말 뒤에만 오는 조사
+_JOSA_AFTER_FINAL = {"은", "이", "을", "과", "아", "이랑", "이나", "으로", "이다", "이었다", "이라고", "이라는"}
+_JOSA_AFTER_OPEN = {"는", "가", "를", "와", "야", "랑", "나", "로", "였다", "라고", "라는"}
+
+_HANGUL_RUN = re.compile(r"[가-힣]+")
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’」』)]*\s*|\n+")
+_QUOTE = re.compile(r"([\"“][^\"”]*[\"”]|[‘'][^’']*[’'])")
+
+
+def _build_suffix_trie(words):
+    """어절 끝에서부터 읽는 조사 트라이. 노드의 None 키는 조사 끝(수락 상태)."""
+    root = {}
+    for w in words:
+        node = root
+        for ch in reversed(w):
+            node = node.setdefault(ch, {})
+        node[None] = w
+    return root
+
+
+_JOSA_TRIE = _build_suffix_trie(_JOSA)
+
+
+def _has_final(ch: str) -> bool:
+    return (ord(ch) - 0xAC00) % 28 != 0
+
+
+@functools.lru_cache(maxsize=8192)
+def split_josa(word: str):
+    """
+    어절 → (어간, 조사). 남는 어간이 2글자 이상인 가장 긴 조사를 뗀다.
+    조사가 없으면 (word, "").
+    """
+    node = _JOSA_TRIE
+    best = None
+    for i in range(len(word) - 1, 1, -1):        # 어간이 최소 2글자 남도록
+        node = node.get(word[i])
+        if node is None:
+            break
+        if None in node:
+            best = i
+    if best is None:
+        return word, ""
+    return word[:best], word[best:]
+
+
+def _josa_agrees(stem: str, josa: str) -> bool:
+    head = josa.split("씨")[0] if josa.startswith("씨") else josa
+    if head in _JOSA_AFTER_FINAL:
+        return _has_final(stem[-1])
+    if head in _JOSA_AFTER_OPEN:
+        return not _has_final(stem[-1])
+    return True
+
+
+def _given_name(stem: str) -> str:
+    """성까지 붙은 이름(서지연, 남궁민우)이면 이름 부분만"""
+    if len(stem) == 4 and stem[:2] in COMPOUND_SURNAMES:
+        return stem[2:]
+    if len(stem) == 3 and stem[0] in SURNAMES:
+        return stem[1:]
+    return stem
+
+
+def _strip_block(block: str) -> str:
+    return TAG_RE.sub(" ", block).strip()
+
+
+def split_blocks(story_text: str):
+    blocks = [b for b in re.split(r"\s*(?=" + TAG_RE.pattern + ")", story_text) if b.strip()]
+    if len(blocks) < 2:
+        blocks = [p for p in story_text.split("\n\n") if p.strip()]
+    return [_strip_block(b) for b in blocks]
+
+
+def _sentences(text: str):
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+# ====== 두 인물 ======
+def _scan(blocks):
+    """후보 어간별 통계 [조사 붙은 횟수, 맨 어간 횟수, 등장 문단 집합, 호응 횟수, 대사 안 횟수, 성 붙은 적 있음]와 병렬 구문 목록"""
+    stats = {}
+    pairs = []
+    for bi, block in enumerate(blocks):
+        # split 결과의 홀수 번째 조각이 따옴표 안(대사)
+        for qi, seg in enumerate(_QUOTE.split(block)):
+            in_quote = qi % 2
+            prev = None
+            for word in _HANGUL_RUN.findall(seg):
+                stem, josa = split_josa(word) if 2 <= len(word) <= 7 else ("", "")
+                if not 2 <= len(stem) <= 4 or (not josa and len(stem) > 3) or stem in STOPWORDS:
+                    prev = None
+                    continue
+                s = stats.get(stem)
+                if s is None:
+                    s = stats[stem] = [0, 0, set(), 0, 0, False]
+                if josa:
+                    s[0] += 1
+                    if _josa_agrees(stem, josa):
+                        s[3] += 1
+                else:
+                    s[1] += 1
+                s[2].add(bi)
+                s[4] += in_quote
+                # 'A와 B는' 병렬 구문 (첫 문단에서만)
+                if bi == 0 and prev is not None and josa and prev[1] in _CONJ and prev[0] != stem:
+                    pairs.append((prev[0], stem))
+                prev = (stem, josa)
+    stats = _merge_full_names(stats)
+    pairs = [tuple(_given_name(n) if _given_name(n) in stats else n for n in p) for p in pairs]
+    return stats, pairs
+
+
+def _merge_full_names(stats):
+    """'서지연'과 '지연'이 모두 나오면 성을 뗀 쪽으로 합친다 (성씨 표에 있는 경우만)."""
+    for stem in [n for n in stats if len(n) >= 3]:
+        name = _given_name(stem)
+        if name == stem or name not in stats:
+            continue
+        full, s = stats.pop(stem), stats[name]
+        s[0] += full[0]
+        s[1] += full[1]
+        s[2] |= full[2]
+        s[3] += full[3]
+        s[4] += full[4]
+        s[5] = True
+    return stats
+
+
+def _score(name, s, first_sentence, pair_names):
+    with_josa, bare, blocks, agree, in_quote, had_surname = s
+    score = with_josa * 1.0 + bare * 0.3 + agree * 0.5 + len(blocks) * 2.0 - in_quote * 0.5
+    if name in first_sentence:
+        score += 3.0
+    if name in pair_names:
+        score += 4.0
+    if had_surname:
+        score += 1.0
+    return score
+
+
+def extract_pair(blocks):
+    """
+    머리표를 뗀 문단 목록 → ([이름1, 이름2], 신뢰도 0~1). 이름은 첫 등장 순서.
+    후보가 둘 미만이면 ([...], 0.0).
+    """
+    stats, pairs = _scan(blocks)
+    if not stats:
+        return [], 0.0
+    first_sentence = (_sentences(blocks[0]) or [""])[0]
+    pair_names = {n for p in pairs[:1] for n in p}
+    scored = sorted(
+        ((_score(n, s, first_sentence, pair_names), n) for n, s in stats.items() if s[0]),
+        reverse=True,
+    )
+    if len(scored) < 2:
+        return [n for _, n in scored], 0.0
+    (_, n1), (s2, n2) = scored[0], scored[1]
+    s3 = scored[2][0] if len(scored) > 2 else 0.0
+    sep = max(0.0, (s2 - s3) / s2) if s2 > 0 else 0.0
+    spread = min(len(stats[n1][2]), len(stats[n2][2]))
+    confidence = 0.5 * sep + 0.2 * min(1.0, spread / min(3, len(blocks)))
+    if pair_names == {n1, n2}:
+        confidence += 0.3
+    elif n1 in first_sentence and n2 in first_sentence:
+        confidence += 0.15
+    order = blocks[0] if blocks else ""
+    names = sorted([n1, n2], key=lambda n: (order.find(n) if n in order else len(order)))
+    return names, min(1.0, confidence)
+
+
+# ====== 피해자 ======
+# 위치가 아니라 이름 주변의 술어로 고른다: "민우를 잃은 지연은 홀로 남았다"의 피해자는 마지막 이름(지연)이 아니라 민우.
+_DEATH = re.compile(
+    r"숨을\s*거[두뒀둔]|숨이\s*멎|숨[지졌]|세상을\s*떠[나났난]|생을\s*마감|목숨을\s*잃|죽[었음고는은다]|사망|"
+    r"눈을\s*감[았고은]|돌아오지\s*못|깨어나지\s*못|영영\s*떠|희생되|다시는\s*볼\s*수"
+)
+_LOST = re.compile(r"(?:\s*[가-힣]+에(?:서)?)?(?:\s*잃[었은고어]|\s*떠나보[내냈낸]|\s*보내야|\s*묻[었고은]|\s*애도|\s*기리)")   # X를 (어디에) ___
+_DEATH_NOUN = re.compile(r"\s*(?:죽음|장례|빈소|영정|유골|무덤|부고|사고\s*소식|마지막\s*숨|이름을\s*부르)")   # X의 ___
+_SURVIVOR = re.compile(r"홀로\s*남|혼자\s*남|남겨[진졌]|살아남|오열|울부짖|무너져\s*내렸|곁을\s*지켰")
+_SURVIVOR_BEFORE = re.compile(r"(?:잃은|잃고|떠나보낸|보낸|남겨진|홀로\s*남은)\s*$")
+_CLAUSE_END = re.compile(r"[,.!?…\n]")
+_SUBJECT_JOSA = ("은", "는", "이", "가", "도", "께서", "이는", "이가", "이도")
+_OBJECT_JOSA = ("을", "를", "이를")
+_WINDOW = 30
+_AMBIGUOUS_CAP = 0.5            # 두 이름이 마지막 문장에 함께 있고 술어 단서가 분명하지 않으면 이 값을 넘기지 않는다 (임계값 0.7 미만 → LLM 확인)
+
+
+def _predicate_scores(text: str, chars):
+    """이름별 (피해자 단서 수, 생존자 단서 수). 단서는 이름 바로 뒤 조사와, 그 뒤 같은 절 안(다음 인물 이름 전까지)의 술어."""
+    scores = {c: [0, 0] for c in chars}
+    hits = sorted((m.start(), m.end(), c) for c in chars for m in re.finditer(re.escape(c), text))
+    # 절은 쉼표/문장 끝이나 다음 인물 이름에서 끊는다: "지연은 달려갔지만 민우는 숨을 거뒀다"의 지연은 단서를 가져가지 않는다
+    for i, (start, end, name) in enumerate(hits):
+        limit = min(len(text), end + _WINDOW, *(h[0] for h in hits[i + 1:i + 2]))
+        cut = _CLAUSE_END.search(text, end, limit)
+        clause = text[end:cut.end() if cut else limit]
+        m = re.match(r"(?:씨)?([가-힣]{0,3})", clause)
+        josa, rest = m.group(1), clause[m.end():]
+        if josa in _OBJECT_JOSA and _LOST.match(rest):
+            scores[name][0] += 2
+        elif josa == "의" and _DEATH_NOUN.match(rest):
+            scores[name][0] += 2
+        elif josa in _SUBJECT_JOSA or josa == "":
+            if _DEATH.search(rest):
+                scores[name][0] += 1
+            if _SURVIVOR.search(rest):
+                scores[name][1] += 1
+        if _SURVIVOR_BEFORE.search(text, max(0, start - 8), start):
+            scores[name][1] += 2
+    return scores
+
+
+def find_victim(blocks, chars):
+    """
+    (피해자, 신뢰도). [엔딩] 문단에서 이름 주변의 죽음/상실 술어(숨을 거두다, X를 잃은, X의 장례)와
+    생존자 술어(잃은 X, 홀로 남다)를 세어 고른다. 단서가 없으면 마지막 문장 위치로 정하되 신뢰도를 낮춘다.
+    두 이름이 모두 마지막 문장에 있으면, 한쪽에만 죽음/상실 단서가 있는 분명한 경우가 아니면 신뢰도를 _AMBIGUOUS_CAP 이하로 둔다.
+    """
+    if len(chars) < 2:
+        return (chars[0] if chars else ""), 0.0
+    ending = blocks[-1] if blocks else ""
+    sentences = _sentences(ending)
+    last = sentences[-1] if sentences else ""
+    both_in_last = all(c in last for c in chars)
+
+    scores = _predicate_scores(ending, chars)
+    net = {c: scores[c][0] - scores[c][1] for c in chars}
+    a, b = sorted(chars, key=lambda c: net[c], reverse=True)
+    clear = False
+    if net[a] > net[b] and (scores[a][0] or scores[b][1]):
+        victim = a
+        clear = bool(scores[a][0]) and net[b] <= 0
+        confidence = 0.95 if clear else 0.75
+    else:
+        in_last = {c: last.rfind(c) for c in chars}
+        present = [c for c in chars if in_last[c] >= 0]
+        if present:
+            victim, confidence = max(chars, key=lambda c: in_last[c]), (0.7 if len(present) == 1 else 0.4)
+        elif any(c in ending for c in chars):
+            victim, confidence = max(chars, key=lambda c: ending.rfind(c)), 0.3
+        else:
+            text = " ".join(blocks)
+            victim, confidence = (chars[0] if text.count(chars[0]) >= text.count(chars[1]) else chars[1]), 0.2
+    if both_in_last and not clear:
+        confidence = min(confidence, _AMBIGUOUS_CAP)
+    return victim, confidence
+
+
+def story_blocks(story_text: str, checkpoints=None):
+    """머리표를 뗀 문단 목록 (체크포인트 목록이 있으면 그것을, 없으면 본문을 나눈다)"""
+    return [_strip_block(b) for b in checkpoints] if checkpoints else split_blocks(story_text)
+
+
+def extract(story_text: str, checkpoints=None):
+    """스토리 → ([이름1, 이름2], 피해자, 신뢰도). 신뢰도는 인물·피해자 신뢰도 중 낮은 쪽."""
+    blocks = story_blocks(story_text, checkpoints)
+    chars, cast_conf = extract_pair(blocks)
+    victim, victim_conf = find_victim(blocks, chars)
+    return chars, victim, min(cast_conf, victim_conf)
+
+
+def confident(confidence: float) -> bool:
+    return confidence >= NAME_EXTRACT_MIN_CONFIDENCE
+
+
+def first_block_is_clear(first_block: str) -> bool:
+    """첫 체크포인트 문단만으로 두 인물이 확실한지 (스트리밍 중 LLM 추출을 걸지 판단)"""
+    chars, confidence = extract_pair([_strip_block(first_block)])
+    ok = len(chars) == 2 and confident(confidence)
+    NAME_EXTRACTIONS.inc(stage="first_block", result="local" if ok else "llm")
+    return ok
+
+
+def confident_cast(story_text: str, checkpoints=None):
+    """신뢰도가 충분하면 (이름1, 이름2, 피해자), 아니면 None — 호출 측이 LLM 추출로 넘어간다."""
+    chars, victim, confidence = extract(story_text, checkpoints)
+    ok = len(chars) == 2 and confident(confidence)
+    NAME_EXTRACTIONS.inc(stage="story", result="local" if ok else "llm")
+    return (chars[0], chars[1], victim) if ok else None
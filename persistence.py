@@ -0,0 +1,245 @@
+import os, re
+import copy
+import secrets
+import sqlite3
+import threading
+
+import metrics
+import state_store
+
+# ====== 세션 영속화 (추가 전용 로그) ======
+# URL의 세션 토큰(?sid=…)을 키로, rerun이 끝날 때마다 바뀐 상태만 연산(op)으로 기록한다.
+# - set: 값 교체 / extend: 리스트 뒤에 추가 / put·put_extend·del: 딕셔너리 항목 단위 변경
+# - 로그가 PERSIST_COMPACT_EVERY 줄을 넘으면 전체 스냅샷 한 줄로 접는다.
+# 복원은 스냅샷 + 그 뒤의 op 재생. 집합/튜플/정수 키 딕셔너리도 그대로 돌아오도록 태그를 붙여 인코딩한다.
+
+PERSIST_PATH = os.getenv(
+    "PERSIST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sessions.sqlite3")
+)
+STATE_STORE = os.getenv("STATE_STORE", "sqlite")   # sqlite | memory | redis://host:port/db
+
+STATE = "_persist"            # holder에 두는 내부 상태: {"sid", "version", "last": 마지막으로 저장한 값들}
+_STORE_ERRORS = (sqlite3.Error, OSError, ValueError, state_store.RedisError)
+
+CONFLICTS = metrics.Counter(
+    "about_time_session_conflicts_total", "다른 탭/워커와 충돌해 버려진 rerun 변경분",
+)
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def valid_token(token) -> bool:
+    return isinstance(token, str) and bool(_TOKEN_RE.match(token))
+
+
+# ---- 인코딩 (JSON + 태그) ----
+_TYPES = {}     # 타입 → (태그, 값 → 목록)
+_TAGS = {}      # 태그 → 목록 → 값
+
+
+def register_type(cls, tag: str, dump, load):
+    """태그를 붙여 저장할 값 타입 (예: session_model.Exchange). tag는 "$"로 시작해야 한다."""
+    _TYPES[cls] = (tag, dump)
+    _TAGS[tag] = load
+
+
+def encode(v):
+    custom = _TYPES.get(type(v))
+    if custom is not None:
+        return {custom[0]: [encode(x) for x in custom[1](v)]}
+    if isinstance(v, (set, frozenset)):
+        return {"$set": sorted((encode(x) for x in v), key=repr)}
+    if isinstance(v, tuple):
+        return {"$tuple": [encode(x) for x in v]}
+    if isinstance(v, list):
+        return [encode(x) for x in v]
+    if isinstance(v, dict):
+        if all(isinstance(k, str) and not k.startswith("$") for k in v):
+            return {k: encode(x) for k, x in v.items()}
+        return {"$dict": [[encode(k), encode(x)] for k, x in v.items()]}
+    return v
+
+
+def decode(v):
+    if isinstance(v, list):
+        return [decode(x) for x in v]
+    if isinstance(v, dict):
+        if "$set" in v:
+            return {decode(x) for x in v["$set"]}
+        if "$tuple" in v:
+            return tuple(decode(x) for x in v["$tuple"])
+        if "$dict" in v:
+            return {decode(k): decode(x) for k, x in v["$dict"]}
+        if len(v) == 1:
+            tag = next(iter(v))
+            if tag in _TAGS:
+                return _TAGS[tag]([decode(x) for x in v[tag]])
+        return {k: decode(x) for k, x in v.items()}
+    return v
+
+
+# ---- 변경분 계산/적용 ----
+def _extends(old, new) -> bool:
+    return isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[:len(old)] == old
+
+
+def diff(key, old, new):
+    """이전 값 → 새 값을 만드는 op 목록"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [["del", key, encode(k)] for k in old if k not in new]
+        for k, v in new.items():
+            if k not in old:
+                ops.append(["put", key, encode(k), encode(v)])
+            elif old[k] != v:
+                if _extends(old[k], v):
+                    ops.append(["put_extend", key, encode(k), encode(v[len(old[k]):])])
+                else:
+                    ops.append(["put", key, encode(k), encode(v)])
+        return ops
+    if _extends(old, new):
+        return [["extend", key, encode(new[len(old):])]]
+    return [["set", key, encode(new)]]
+
+
+def apply(state: dict, op):
+    kind, key = op[0], op[1]
+    if kind == "snapshot":
+        state.clear()
+        state.update(decode(op[2]))
+    elif kind == "set":
+        state[key] = decode(op[2])
+    elif kind == "extend":
+        state.setdefault(key, []).extend(decode(op[2]))
+    elif kind == "put":
+        state.setdefault(key, {})[decode(op[2])] = decode(op[3])
+    elif kind == "put_extend":
+        state.setdefault(key, {}).setdefault(decode(op[2]), []).extend(decode(op[3]))
+    elif kind == "del":
+        state.get(key, {}).pop(decode(op[2]), None)
+
+
+# ====== 저장소 (state_store.py) ======
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """STATE_STORE 백엔드. 영속화를 끄거나(빈 PERSIST_PATH) 열 수 없으면 None."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = state_store.open_store(STATE_STORE, PERSIST_PATH, apply) or False
+            except _STORE_ERRORS:
+                _store = False
+        return _store or None
+
+
+# ====== 세션 상태 연동 ======
+# session_state는 rerun 한 번 동안의 작업 사본이다.
+#   rerun 시작: sync() — 저장소 버전이 앞서 있으면(다른 탭/워커가 진행) 저장소 상태로 덮어쓴다.
+#   rerun 끝:   save() — 읽어 온 버전을 기대값으로 커밋. 그 사이 다른 쪽이 먼저 커밋했으면
+#               이번 변경은 버리고 저장소 상태로 되돌린다 (턴/티켓 이중 소모 방지).
+#               Streamlit은 이번 rerun에서 이미 만든 위젯의 키(notes)를 쓸 수 없으므로 되돌리기를 다음 sync()로 미룬다.
+def _fill(holder, sid, state, version, keys, drop_missing=False):
+    for key in keys:
+        if key in (state or {}):
+            holder[key] = state[key]
+        elif drop_missing and key in holder:
+            del holder[key]
+    holder[STATE] = {
+        "sid": sid, "version": version,
+        "last": copy.deepcopy({k: v for k, v in (state or {}).items() if k in keys}),
+    }
+
+
+def restore(holder, sid: str, keys) -> bool:
+    """sid로 저장된 상태를 holder에 채운다. 세션당 한 번만 동작하며, 복원했으면 True."""
+    if STATE in holder:
+        return False
+    store = get_store()
+    state, version = None, 0
+    if store is not None:
+        try:
+            state, version = store.load(sid)
+        except _STORE_ERRORS:
+            state, version = None, 0
+    _fill(holder, sid, state, version, keys)
+    return bool(state)
+
+
+def sync(holder, keys) -> bool:
+    """다른 탭/워커가 이 세션을 먼저 진행했으면 저장소 상태로 다시 채우고 True"""
+    meta = holder.get(STATE)
+    store = get_store()
+    if meta is None or store is None:
+        return False
+    stale = meta.get("stale", False)         # save()가 충돌한 뒤 되돌리기를 미뤄 둠
+    try:
+        if not stale and store.version(meta["sid"]) == meta["version"]:
+            return False
+        state, version = store.load(meta["sid"])
+    except _STORE_ERRORS:
+        return False
+    _fill(holder, meta["sid"], state, version, keys, drop_missing=stale)
+    return True
+
+
+def save(holder, keys, defer_refill=False) -> bool:
+    """
+    마지막 저장 이후 바뀐 키만 op로 커밋한다 (rerun이 끝날 때마다 호출).
+    다른 쪽이 먼저 커밋해 충돌하면 저장소 상태로 되돌리고 False.
+    defer_refill이면 holder는 그대로 두고 표시만 해 두어, 다음 sync()가 저장소 상태로 다시 채운다.
+    """
+    meta = holder.get(STATE)
+    store = get_store()
+    if meta is None or store is None or meta.get("stale"):
+        return True
+    last = meta["last"]
+    ops = []
+    current = {}
+    for key in keys:
+        if key not in holder:
+            continue
+        value = holder[key]
+        current[key] = value
+        if key in last and last[key] == value:
+            continue
+        ops.extend(diff(key, last.get(key), value) if key in last else [["set", key, encode(value)]])
+    if not ops:
+        return True
+    try:
+        meta["version"] = store.commit(meta["sid"], meta["version"], ops, snapshot_fn=lambda: encode(current))
+    except state_store.Conflict:
+        CONFLICTS.inc()
+        if defer_refill:
+            meta["stale"] = True
+            return False
+        holder.pop(STATE, None)
+        for key in keys:
+            holder.pop(key, None)
+        restore(holder, meta["sid"], keys)
+        return False
+    except _STORE_ERRORS:
+        return True
+    meta["last"] = copy.deepcopy(current)
+    return True
+
+
+def is_saved(holder, keys) -> bool:
+    """마지막 저장 이후 바뀐 키가 없으면 True (저장소에서 그대로 다시 채울 수 있음)"""
+    meta = holder[STATE] if STATE in holder else None
+    if meta is None:
+        return False
+    if meta.get("stale"):
+        return True             # 버릴 변경분: 저장소 상태가 기준이고 다음 복원이 그것으로 채운다
+    last = meta["last"]
+    return all(k not in holder or (k in last and last[k] == holder[k]) for k in keys)
+
+
+def forget(holder):
+    """새 게임: 이 세션의 영속화 상태를 떼어 낸다 (저장된 로그는 GC/만료가 정리)."""
+    holder.pop(STATE, None)
@@ -0,0 +1,227 @@
+import os
+import math
+import threading
+
+# ====== 프롬프트 조립 ======
+# 메시지를 "변하지 않는 것 → 자주 바뀌는 것" 순으로 쌓는다.
+#   전역 규칙 → 인물/스토리 맥락 → 체크포인트 본문 → 이전 대화 → 톤/상태별 규칙 → 플레이어 입력
+# 앞부분이 턴마다 동일하게 유지되므로 제공자 측 프롬프트 캐시가 적중할 수 있다.
+# 렌더링된 정적 세그먼트는 세션별 dict(cache)에 메모이즈한다. 단, 스토리 본문이 그대로 들어가는 템플릿은
+# 메모하면 키(파라미터)와 값(렌더 결과)에 본문 사본이 세션마다 더 생기므로 매번 렌더링한다 (str.format 한 번).
+
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v1")
+UNCACHED_TEMPLATES = {"outcome_story", "turn_checkpoint"}     # 스토리/체크포인트 본문을 담는 템플릿
+
+# 안정도: 숫자가 작을수록 오래 유지된다
+GLOBAL, SESSION, CHECKPOINT, HISTORY, TURN = range(5)
+
+TEMPLATES = {
+    "v1": {
+        # ---- 과거 개입 턴 ----
+        "turn_global": (
+            "아래 '플레이어 발화'는 글자 하나도 바꾸지 말고 **첫 문장으로 그대로** 넣어라. "
+            "따옴표/어미/조사/구두점/순서를 수정하거나 요약/확장/의역해서는 안 된다. "
+            "상대 인물의 반응과 사건 서술은 **플레이어 발화의 직접적 결과**로 이어져야 하며, 인과 개연성을 절대로 훼손하지 마라. "
+            "예: 조언을 따른 경우 상대가 불만을 표현할 수는 있으나, '무시했다'와 같이 모순되는 반응은 금지. "
+            "한 문단(3~5문장)으로 작성하되, 이번 장면에서는 누구도 죽거나 완전히 구원받지 않는다(최종 결말 금지). "
+            "사건을 즉시 종결하지 말고 이후 개입 여지를 남겨라. "
+            "제3의 사람(친구/가족/경찰/의사/동료/목격자 등) 및 외부 기관/연락은 등장 금지. "
+            "배경 사물/환경은 묘사 가능하되 의사결정을 하지 않는다. "
+            "메타 표현/설명은 금지한다. "
+            "마커 '<<<'와 '>>>'는 **입력 경계 표시용**이다. "
+            "**출력 텍스트에는 절대 포함하지 마라.** "
+            "첫 문장은 마커를 제거하고 **플레이어 발화 내용만** 그대로 넣어라. "
+            "문단의 '마지막 줄 끝'에 태그를 **따옴표 없이 단독으로** 정확히 1개 붙여라. "
+            "허용 형식: <STATUS: risk_upN>, <STATUS: risk_downN>, <STATUS: neutral>. "
+            "N 생략 시 1, N의 절대값 최대 2. "
+            "태그 앞뒤에는 마침표/쉼표/따옴표/괄호 등 문장부호를 두지 마라."
+        ),
+        "turn_context": (
+            "등장인물은 '{c1}'와 '{c2}' 두 명뿐이다. "
+            "플레이어는 '{role}', 상대 인물은 '{partner}', 피해자는 '{victim}'이다."
+        ),
+        "turn_checkpoint": "원래 사건:\n{cp_body}",
+        "turn_prior_user": "{role}의 이전 개입: {user}",
+        "turn_tone": (
+            "이번 턴의 **장면 톤은 '{tone_kind}'** 이다. 이 톤은 **오직 상대 인물('{partner}')의 반응과 사건 서술**에만 적용한다. "
+            "플레이어('{role}')의 첫 문장은 톤 적용 대상이 아니다. "
+            "{tone_rules}"
+        ),
+        "tone_negative_anchor": (
+            "상대 인물('{partner}')의 반응과 서술은 **부정적 정서**(의심/냉담/회피/짜증 등)를 담되, "
+            "플레이어 발화 내용과 모순되지 않게 **합리적 맥락**을 유지하라. "
+            "STATUS 태그는 '<STATUS: risk_up1>' 또는 '<STATUS: neutral>' 중 하나만 사용한다."
+        ),
+        "tone_positive_feint": (
+            "상대 인물('{partner}')의 반응과 서술은 **긍정적 정서**(따뜻함/안도/작은 화해/격려)를 드러내되, "
+            "근본 문제 해결 확정은 피하고 작은 숙제를 남겨라. "
+            "STATUS 태그는 반드시 '<STATUS: risk_down1>'만 사용한다."
+        ),
+        "tone_subtle_mixed": (
+            "상대 인물('{partner}')의 반응과 서술은 대체로 평온하되, **미묘한 이상 신호 1개만** 심어라 "
+            "(시선 회피, 말끝 흐리기 등). 급격한 정서 전환은 금지. "
+            "STATUS 태그는 반드시 '<STATUS: neutral>'만 사용한다."
+        ),
+        "turn_input": (
+            "플레이어 발화(첫 문장에 그대로 삽입, 변경 금지):\n"
+            "<<<\n{user_input}\n>>>\n\n"
+            "위 규칙에 따라 1문단(3~5문장)으로 작성하라."
+        ),
+
+        # ---- 현재 결말 ----
+        "outcome_global": (
+            "너는 이야기 결말을 쓰는 작가다. "
+            "제3자(친구/가족/경찰/의사/목격자/군중/기관)의 고유명사/대사/능동적 결정은 금지한다. "
+            "배경 사물/환경은 묘사 가능하되 인격을 부여하지 마라. "
+            "주어진 원래 이야기와 플레이어의 개입 기록을 바탕으로 결말을 작성한다."
+        ),
+        "outcome_context": (
+            "결말에서도 등장인물은 오직 '{c1}'와 '{c2}' 두 사람만 등장한다. "
+            "목표: '{victim}'의 비극을 막는 것이다."
+        ),
+        "outcome_story": "원래 이야기:\n{full_story}",
+        "outcome_history": "플레이어 개입 요약:\n{summary}",
+        "outcome_success": (
+            "'{victim}'의 비극이 **완전히 막아진 해피엔딩**을 작성하라. "
+            "플레이어의 개입 덕분에 문제가 근본적으로 해결되었음을 **구체적 사건**으로 보여주라. "
+            "가능하면 어떤 체크포인트의 위험이 어떻게 상쇄/해결되었는지 1~2문장으로 자연스럽게 드러내라. "
+            "두 사람의 관계가 회복되고, 서로 신뢰하며 미래가 안정적이라는 점을 분명히 하라. "
+            "불안, 단서, 갈등, 여운은 절대로 남기지 마라. "
+            "마지막에 반드시 '<ENDING: success>'를 붙여라."
+        ),
+        "outcome_failure": (
+            "'{victim}'의 비극이 **결국 피할 수 없는 실패 결말**로 이어지도록 작성하라. "
+            "{failure_hint} "
+            "겉보기에는 잠시 좋아 보일 수 있으나, 근본 문제가 해결되지 않아 "
+            "'{victim}'이(가) 상실 또는 죽음에 도달해야 한다. "
+            "사건의 인과관계를 통해 비극이 불가피함을 보여라. "
+            "마지막에 반드시 '<ENDING: failure>'를 붙여라."
+        ),
+        "failure_same": (
+            "이번 실패는 **원래 비극의 원인 조합이 그대로 유지**되어 발생한다. "
+            "원래 이야기의 [체크포인트]들 중 **최소 2개**의 위험 플래그가 **그대로 겹쳐** 비극이 일어났음을 "
+            "1~2문장으로 **명확히 드러내라**(예: \"[체크포인트 2]의 늦은 연락과 [체크포인트 4]의 무리한 운전이 다시 겹쳤다\"). "
+            "가능하면 원래 엔딩과 **동일한 유형의 비극**으로 귀결되게 하라."
+        ),
+        "failure_butterfly": (
+            "이번 실패는 **나비효과**로 인해 **원래와 다른 형태의 비극**이 발생한다. "
+            "플레이어의 개입으로 완화/변경된 위험(예: 한 체크포인트의 문제)은 있었으나, "
+            "그로 인해 **다른 플래그 조합이나 새로운 변수**가 겹쳐 **다른 유형의 상실/사고**로 이어졌음을 "
+            "1~2문장으로 **명확히 드러내라**(예: \"[체크포인트 1]의 일정은 조정했지만, 그 탓에 [체크포인트 3]의 약속이 엇갈렸다\"). "
+            "원래 엔딩과 **유형이 겹치지 않도록** 유의하라."
+        ),
+
+        # ---- 대화 압축 ----
+        "summary_system": (
+            "너는 게임 대화 기록을 압축하는 도우미다. "
+            "플레이어의 개입과 그 결과를 사건 순서대로 짧은 한국어 문장들로 요약하라. "
+            "인물 이름, 플레이어가 실제로 한 말/행동의 핵심, 상대 인물의 반응, 남은 갈등/단서는 반드시 유지한다. "
+            "새로운 사건을 지어내거나 평가/해설을 덧붙이지 마라. 5문장 이내로 출력하라."
+        ),
+        "summary_prev": "지금까지의 요약:\n{summary}",
+        "summary_new": "새로 요약에 포함할 개입 기록:\n{log}",
+        "summary_exchange": "- {role}의 개입: {user}\n  결과: {assistant}",
+        "turn_summary": "{role}의 이전 개입 요약:\n{summary}",
+
+        # ---- 인물 추출 ----
+        "extract_system": "너는 한국어 이야기에서 등장인물 이름을 추출하는 도우미다. 반드시 JSON만 출력하라.",
+        "extract_cast": (
+            "아래 이야기에서 중심이 되는 두 인물의 '이름'을 정확히 추출하고, "
+            "마지막 문단 기준으로 비극을 맞이하는 인물을 판단하여 반환하라. "
+            'JSON: {{ "characters": ["이름1","이름2"], "victim": "이름중하나" }}'
+        ),
+        "extract_characters": (
+            "아래는 이야기의 첫 문단이다. 첫 문장에 등장하는 중심 인물 두 명의 '이름'을 정확히 추출하라. "
+            'JSON: {{ "characters": ["이름1","이름2"] }}'
+        ),
+        "extract_text": "{text}",
+    },
+}
+
+
+def render(name: str, cache: dict = None, **params) -> str:
+    """템플릿 렌더링. cache가 주어지면 (버전, 이름, 파라미터) 단위로 메모이즈한다 (UNCACHED_TEMPLATES 제외)."""
+    if cache is None or name in UNCACHED_TEMPLATES:
+        return TEMPLATES[PROMPT_VERSION][name].format(**params)
+    key = (PROMPT_VERSION, name, tuple(sorted(params.items())))
+    text = cache.get(key)
+    if text is None:
+        text = cache[key] = TEMPLATES[PROMPT_VERSION][name].format(**params)
+    return text
+
+
+def segment(role: str, content: str, stability: int, name: str = "") -> dict:
+    return {"role": role, "content": content, "stability": stability, "name": name}
+
+
+def estimate_tokens(text: str) -> int:
+    """tiktoken이 있으면 정확히, 없으면 한국어 기준 대략(1.5자당 1토큰)으로 센다."""
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    return math.ceil(len(text) / 1.5)
+
+
+_enc = False
+
+def _encoder():
+    global _enc
+    if _enc is False:
+        try:
+            import tiktoken
+            _enc = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _enc = None
+    return _enc
+
+
+def assemble(segments, stable_upto: int = HISTORY):
+    """
+    세그먼트 목록 → (OpenAI messages, 리포트).
+    같은 역할이 연속되는 system 세그먼트는 한 메시지로 합친다.
+    리포트의 stable_prefix_tokens: 안정도 stable_upto 이하 세그먼트가 앞에서부터 이어지는 구간의 토큰 수
+    """
+    ordered = sorted(enumerate(segments), key=lambda x: (x[1]["stability"], x[0]))
+    messages = []
+    stable_tokens = 0
+    total_tokens = 0
+    prefix_open = True
+    by_segment = []
+    for _, seg in ordered:
+        n = estimate_tokens(seg["content"])
+        total_tokens += n
+        if prefix_open and seg["stability"] <= stable_upto:
+            stable_tokens += n
+        else:
+            prefix_open = False
+        by_segment.append((seg["name"] or seg["role"], seg["stability"], n))
+        if messages and seg["role"] == "system" and messages[-1]["role"] == "system":
+            messages[-1]["content"] += "\n\n" + seg["content"]
+        else:
+            messages.append({"role": seg["role"], "content": seg["content"]})
+    report = {
+        "version": PROMPT_VERSION,
+        "total_tokens": total_tokens,
+        "stable_prefix_tokens": stable_tokens,
+        "stable_ratio": (stable_tokens / total_tokens) if total_tokens else 0.0,
+        "segments": by_segment,
+    }
+    return messages, report
+
+
+# ---- 호출 지점별 누적 리포트 ----
+_lock = threading.Lock()
+_totals = {}
+
+
+def record(site: str, report: dict):
+    with _lock:
+        t = _totals.setdefault(site, {"calls": 0, "total_tokens": 0, "stable_prefix_tokens": 0})
+        t["calls"] += 1
+        t["total_tokens"] += report["total_tokens"]
+        t["stable_prefix_tokens"] += report["stable_prefix_tokens"]
+
+
+def stats() -> dict:
+    with _lock:
+        return {site: dict(t) for site, t in _totals.items()}
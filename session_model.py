@@ -0,0 +1,290 @@
+import os, sys, json, time
+import weakref
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import metrics
+import persistence
+
+# ====== 압축 세션 상태 ======
+# 한 판의 상태에서 큰 부분은 스토리 본문과 대화 기록이다.
+# - 대화는 append-only 기록(history: [Exchange, …]) 하나에만 담고, 체크포인트별 로그는 그 기록의 색인(CpView)으로 본다.
+# - 스토리 하이라이트 HTML은 저장하지 않는다 (game_engine.story_html이 본문에서 만들고 프로세스 LRU에 둔다).
+# - 인물 이름은 sys.intern으로 프로세스 안에서 한 벌만 둔다.
+# SessionRegistry는 세션별 바이트를 세고, 오래 쉰 세션과 메모리 상한을 넘긴 만큼의 세션을 메모리에서 내린다.
+
+# 이 시간(초) 동안 아무 행동이 없던 세션은 메모리에서 내린다 (0이면 끔)
+SESSION_IDLE_S = float(os.getenv("SESSION_IDLE_S", "1800"))
+# 세션 상태 합계가 이 바이트를 넘으면 가장 오래 쉰 세션부터 내린다 (0이면 상한 없음)
+SESSION_MEMORY_MAX_BYTES = int(os.getenv("SESSION_MEMORY_MAX_BYTES", "0"))
+# 세션 저장소(persistence)를 쓰지 않을 때 내린 세션을 써 둘 디렉터리 (비우면 저장소가 없는 세션은 내리지 않음)
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "")
+
+NAME_KEYS = ("char1", "char2", "victim", "role")
+LEGACY_KEYS = ("cp_logs", "init_story_html")     # 이전 버전 상태에 있던 중복 키
+
+
+@dataclass(slots=True, frozen=True)
+class Exchange:
+    """과거 개입 한 턴: 체크포인트 번호(0부터), 플레이어 입력, 화면에 보인 응답"""
+    cp: int
+    user: str
+    assistant: str
+
+    def __getitem__(self, key):         # ex["user"]로 읽는 코드(compaction, 프롬프트) 호환
+        return getattr(self, key)
+
+    def keys(self):                     # dict(ex) → {"user": …, "assistant": …}
+        return ("user", "assistant")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):       # 불변이므로 persistence의 마지막 저장 사본과 같은 객체를 쓴다
+        return self
+
+
+persistence.register_type(Exchange, "$ex", lambda ex: [ex.cp, ex.user, ex.assistant], lambda v: Exchange(*v))
+
+
+class CpView(Sequence):
+    """한 체크포인트의 교환 목록. 기록을 복사하지 않고 위치만 들고 있는 읽기 전용 시퀀스."""
+    __slots__ = ("_log", "_idx")
+
+    def __init__(self, log, cp: int):
+        self._log = log
+        self._idx = tuple(i for i, ex in enumerate(log) if ex.cp == cp)
+
+    def __len__(self):
+        return len(self._idx)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._log[j] for j in self._idx[i]]
+        return self._log[self._idx[i]]
+
+
+def cp_logs(history, num_checkpoints: int) -> dict:
+    """{체크포인트 번호: [Exchange, …]} — 모든 체크포인트를 (개입이 없어도) 순서대로 담는다 (결말 스냅샷용)"""
+    out = {i: [] for i in range(num_checkpoints)}
+    for ex in history:
+        out.setdefault(ex.cp, []).append(ex)
+    return out
+
+
+def compact(state):
+    """이전 버전/복원된 상태를 압축 표현으로: 튜플 기록 → Exchange, 이름 intern, 중복 키 제거"""
+    history = state["history"] if "history" in state else None
+    if history and not all(isinstance(ex, Exchange) for ex in history):
+        state["history"] = [ex if isinstance(ex, Exchange) else Exchange(int(ex[0]), ex[1], ex[2]) for ex in history]
+    for key in NAME_KEYS:
+        if key in state and isinstance(state[key], str) and state[key]:
+            state[key] = sys.intern(state[key])
+    for key in LEGACY_KEYS:
+        if key in state:
+            del state[key]
+    return state
+
+
+# ====== 바이트 계산 ======
+def nbytes(value, seen=None) -> int:
+    """값이 차지하는 메모리(sys.getsizeof 합). 같은 객체는 한 번만 센다."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(nbytes(k, seen) + nbytes(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(nbytes(x, seen) for x in value)
+    elif isinstance(value, Exchange):
+        size += nbytes(value.user, seen) + nbytes(value.assistant, seen)
+    return size
+
+
+def state_bytes(holder, keys) -> int:
+    seen = set()
+    return sum(nbytes(holder[k], seen) for k in keys if k in holder)
+
+
+# ====== 세션 레지스트리 ======
+@dataclass(slots=True)
+class SessionInfo:
+    ref: object                 # 상태 holder를 돌려주는 호출 (가능하면 약한 참조)
+    token: str                  # 저장소/내려쓰기 파일 이름 (persistence sid)
+    nbytes: int = 0
+    touched: float = 0.0
+    busy: bool = False
+    on_evict: object = None     # 내린 뒤 부를 콜백 (게임 서버가 세션 객체를 치움)
+    evicting: bool = False      # 내리는 중: enter()는 끝날 때까지 기다린다
+
+
+SESSION_EVICTIONS = metrics.Counter(
+    "about_time_session_evictions_total", "메모리에서 내린 세션 수", ("reason", "to"),
+)
+
+
+class SessionRegistry:
+    """
+    세션 상태 holder(dict나 Streamlit 세션 상태)를 키별로 추적한다.
+    행동 시작에 enter(), 끝에 touch()를 부르면 바이트를 다시 세고 정책에 따라 다른 세션을 내린다.
+    내릴 때는 게임을 잃지 않는 경우에만: 저장소에 이미 커밋되어 있거나(다음 요청 때 복원) 내려쓰기 파일을 쓸 수 있을 때.
+    """
+
+    def __init__(self, keys, measure_keys, release, idle_s: float = SESSION_IDLE_S,
+                 max_bytes: int = SESSION_MEMORY_MAX_BYTES, spill_dir: str = SESSION_SPILL_DIR):
+        self.keys = tuple(keys)                   # 저장/내려쓰기 대상
+        self.measure_keys = tuple(measure_keys)   # 바이트 계산 대상 (캐시 포함)
+        self.release = release                    # holder를 비우는 함수 (진행 중인 작업 정리 포함)
+        self.idle_s = idle_s
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._evicted = threading.Condition(self._lock)     # 내리기가 끝나면 깨운다 (enter 대기용)
+        self._sessions = {}                       # 키 → SessionInfo
+        self._counts = {"evicted": 0, "spilled": 0, "rehydrated": 0, "pinned": 0}
+
+    def enter(self, key: str):
+        """행동 시작: 끝날 때까지 이 세션은 내리지 않는다. 지금 내리는 중이면 끝날 때까지 기다린다
+        (돌아온 뒤 holder가 비어 있으면 호출 측이 저장소/내려쓰기 파일에서 다시 채운다)."""
+        with self._lock:
+            info = self._sessions.get(key)
+            while info is not None and info.evicting:
+                self._evicted.wait()
+                info = self._sessions.get(key)
+            if info is not None:
+                info.busy = True
+
+    def touch(self, key: str, holder, token: str, on_evict=None) -> int:
+        """행동 끝: 바이트를 다시 세고, 다른 세션에 정책을 적용한다. 이 세션의 바이트를 돌려준다."""
+        size = state_bytes(holder, self.measure_keys)
+        try:
+            ref = weakref.ref(holder)
+        except TypeError:
+            ref = lambda h=holder: h            # dict는 약한 참조가 안 된다 (게임 서버는 forget으로 정리)
+        with self._lock:
+            while key in self._sessions and self._sessions[key].evicting:
+                self._evicted.wait()
+            self._sessions[key] = SessionInfo(ref, token, size, time.monotonic(), False, on_evict)
+        self.enforce(exclude=key)
+        return size
+
+    def forget(self, key: str):
+        with self._lock:
+            while key in self._sessions and self._sessions[key].evicting:
+                self._evicted.wait()
+            self._sessions.pop(key, None)
+
+    def _victims(self, exclude):
+        now = time.monotonic()
+        with self._lock:
+            for key, info in list(self._sessions.items()):
+                if info.ref() is None:
+                    del self._sessions[key]          # 브라우저 세션이 이미 사라짐
+            idle = sorted((info.touched, key, info.nbytes) for key, info in self._sessions.items()
+                          if key != exclude and not info.busy and not info.evicting)
+            total = sum(info.nbytes for info in self._sessions.values())
+        victims = []
+        for touched, key, size in idle:         # 가장 오래 쉰 세션부터
+            if self.idle_s and now - touched > self.idle_s:
+                victims.append((key, "idle"))
+            elif self.max_bytes and total > self.max_bytes:
+                victims.append((key, "memory"))
+            else:
+                continue
+            total -= size
+        return victims
+
+    def enforce(self, exclude=None):
+        """정책에 걸린 세션을 내리고 내린 키 목록을 돌려준다"""
+        evicted = []
+        for key, reason in self._victims(exclude):
+            if self.evict(key, reason):
+                evicted.append(key)
+        return evicted
+
+    def evict(self, key: str, reason: str = "manual") -> bool:
+        # 내리는 중 표시를 한 뒤에는 enter()가 기다리므로, 그 사이 새 행동이 holder를 쓰기 시작할 수 없다
+        with self._lock:
+            info = self._sessions.get(key)
+            if info is None or info.busy or info.evicting:
+                return False
+            holder = info.ref()
+            if holder is None:
+                del self._sessions[key]
+                return False
+            info.evicting = True
+        done = False
+        try:
+            if persistence.get_store() is not None and persistence.is_saved(holder, self.keys):
+                to = "store"                        # 다음 요청 때 persistence.restore가 다시 채운다
+            elif self.spill_dir and persistence.valid_token(info.token):
+                try:
+                    self._spill(holder, info.token)
+                except OSError:
+                    # 쓸 수 없는 디렉터리/디스크 부족: 이 세션은 그대로 두고, 정책을 적용하던 다른 세션의 요청은 계속한다
+                    with self._lock:
+                        self._counts["pinned"] += 1
+                    return False
+                to = "spill"
+            else:
+                with self._lock:
+                    self._counts["pinned"] += 1
+                return False
+            with self._lock:
+                if info.busy:                       # 표시 전에 시작된 행동이 있으면 건드리지 않는다
+                    return False
+            self.release(holder)
+            if persistence.STATE in holder:
+                del holder[persistence.STATE]
+            done = True
+        finally:
+            with self._lock:
+                info.evicting = False
+                if done:
+                    self._sessions.pop(key, None)
+                    self._counts["evicted"] += 1
+                    if to == "spill":
+                        self._counts["spilled"] += 1
+                self._evicted.notify_all()
+        SESSION_EVICTIONS.inc(reason=reason, to=to)
+        if info.on_evict is not None:
+            info.on_evict()
+        return True
+
+    # ---- 내려쓰기 파일 ----
+    def _spill_path(self, token: str) -> str:
+        return os.path.join(self.spill_dir, f"{token}.json")
+
+    def _spill(self, holder, token: str):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(token)
+        payload = persistence.encode({k: holder[k] for k in self.keys if k in holder})
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def rehydrate(self, holder, token: str) -> bool:
+        """내려써 둔 세션이면 holder에 다시 채우고 파일을 지운다"""
+        if not self.spill_dir or not persistence.valid_token(token):
+            return False
+        path = self._spill_path(token)
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = persistence.decode(json.load(f))
+            os.remove(path)
+        except (OSError, ValueError):
+            return False
+        for k, v in state.items():
+            holder[k] = v
+        with self._lock:
+            self._counts["rehydrated"] += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = list(self._sessions.values())
+            return {"sessions": len(live), "bytes": sum(i.nbytes for i in live),
+                    "max_session_bytes": max((i.nbytes for i in live), default=0), **self._counts}
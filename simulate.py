@@ -0,0 +1,358 @@
+"""
+자동 플레이 시뮬레이터 (처리량·밸런스 측정).
+
+게임 엔진(game_engine.GameEngine)을 UI 없이 그대로 돌려, 정해진 플레이어 정책으로
+시작 → 체크포인트 선택 → 개입 턴 → 현재 → (실패 시 티켓) → 게임 종료까지 수천 판을 진행한다.
+턴 프롬프트·STATUS 태그 처리·성공 판정은 실제 게임과 같은 코드를 쓴다.
+게임은 multiprocessing 프로세스 풀에 나눠 돌린다.
+
+    python simulate.py --games 2000 --workers 8                        # 로컬 대역 서버(즉시 응답)
+    python simulate.py --games 500 --policy random,sweep --ttft 0.3 --tps 80 --out sim.json
+    python simulate.py --games 20 --workers 2 --backend openai         # 실제 API (비용 발생!)
+
+백엔드
+- mock: 워커 프로세스마다 로컬 대역 서버(mock_llm_server.py, synth 모드)를 띄운다.
+- openai: 환경 변수(.env 포함)의 OPENAI_BASE_URL/OPENAI_API_KEY를 그대로 쓴다.
+
+정책
+- random: 매번 무작위 체크포인트에서 1~4턴, 대사도 무작위.
+- sweep:  체크포인트를 앞에서부터 차례로 돌며 방문마다 --turns-per-visit 턴, 대사는 순서대로.
+
+결과: 정책별 게임/초, 게임당 토큰·비용(호출 지점별), 턴 지연/TTFT 백분위, 성공률,
+성공 조건(risk <= -2, 개선 2곳 이상, 개입 2곳 이상) 도달률, 티켓 사용 분포.
+LLM 응답 캐시는 기본으로 끈다 (게임마다 전체 비용을 세도록). --llm-cache로 앱 기본값(메모리만)을 쓴다.
+"""
+import os, sys, json, time, random
+import argparse
+import platform
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PLAYER_LINES = [
+    "오늘은 내가 운전할게, 너는 좀 쉬어.",
+    "약속 늦어서 미안해. 다음부터는 미리 연락할게.",
+    "병원부터 같이 가 보자. 내가 예약해 둘게.",
+    "그 얘기 끝까지 들을게. 화내지 않을게.",
+    "비 많이 오니까 오늘은 나가지 말자.",
+    "네 말이 맞아. 내가 너무 내 일정만 챙겼어.",
+    "혼자 가지 마. 내가 같이 갈게.",
+    "요즘 많이 힘들어 보여. 무슨 일 있어?",
+]
+
+
+# ====== 플레이어 정책 ======
+class Policy:
+    """체크포인트 선택, 방문당 턴 수, 대사를 정한다. 숨은 수치(위험도)는 보지 않는다."""
+    name = ""
+
+    def checkpoint(self, engine, visit: int, rng) -> int:
+        raise NotImplementedError
+
+    def turns(self, engine, visit: int, rng) -> int:
+        raise NotImplementedError
+
+    def line(self, engine, turn: int, rng) -> str:
+        raise NotImplementedError
+
+
+class RandomPolicy(Policy):
+    name = "random"
+
+    def checkpoint(self, engine, visit, rng):
+        return rng.choice(engine.selectable_checkpoints())
+
+    def turns(self, engine, visit, rng):
+        return rng.randint(1, 4)
+
+    def line(self, engine, turn, rng):
+        return rng.choice(_PLAYER_LINES)
+
+
+class SweepPolicy(Policy):
+    name = "sweep"
+
+    def __init__(self, turns_per_visit: int = 3):
+        self.turns_per_visit = turns_per_visit
+
+    def checkpoint(self, engine, visit, rng):
+        cps = engine.selectable_checkpoints()
+        return cps[visit % len(cps)]
+
+    def turns(self, engine, visit, rng):
+        return self.turns_per_visit
+
+    def line(self, engine, turn, rng):
+        return _PLAYER_LINES[turn % len(_PLAYER_LINES)]
+
+
+POLICIES = {"random": RandomPolicy, "sweep": SweepPolicy}
+
+
+def make_policy(name: str, turns_per_visit: int = 3) -> Policy:
+    if name not in POLICIES:
+        raise ValueError(f"알 수 없는 정책: {name} (가능: {', '.join(POLICIES)})")
+    return SweepPolicy(turns_per_visit) if name == "sweep" else POLICIES[name]()
+
+
+# ====== 워커 프로세스 ======
+_engine_mod = None      # 워커 안에서 환경 변수를 정한 뒤 import한 game_engine
+_mock_server = None
+
+
+def _init_worker(backend: dict, env: dict):
+    """워커 시작: 환경 변수 → (mock이면) 대역 서버 → game_engine import 순서를 지킨다."""
+    global _engine_mod, _mock_server
+    os.environ.update(env)
+    if backend["kind"] == "mock":
+        import mock_llm_server
+        cfg = mock_llm_server.Config(
+            "synth", latency=backend["latency"], ttft=backend["ttft"], tps=backend["tps"],
+            error_rate=backend["error_rate"], seed=backend["seed"] + os.getpid(),
+        )
+        _mock_server, base_url = mock_llm_server.start_in_thread(cfg)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "local")
+    import game_engine
+    _engine_mod = game_engine
+
+
+def _drain(events, on_delta=None):
+    """엔진 이벤트 제너레이터를 끝까지 소비하고 마지막 *.done / story.ready 데이터를 돌려준다."""
+    done = None
+    for kind, data in events:
+        if kind.endswith(".delta"):
+            if on_delta:
+                on_delta()
+        elif kind.endswith(".done") or kind == "story.ready":
+            done = data
+    return done
+
+
+def play_game(policy: Policy, rng) -> dict:
+    """한 판을 끝까지 진행하고 기록을 돌려준다."""
+    ge = _engine_mod
+    engine = ge.GameEngine()
+    s = engine.state
+    rec = {
+        "success": False, "condition_met": False, "turns": 0, "tickets_used": 0, "risk": 0,
+        "touched": 0, "improved": 0, "endings": [], "turn_s": [], "ttft_s": [],
+        "turn_errors": 0, "error": None, "wall_s": 0.0,
+    }
+    started = time.perf_counter()
+    try:
+        _drain(engine.start())
+        visit = 0
+        while True:
+            engine.time_slip(policy.checkpoint(engine, visit, rng))
+            for _ in range(policy.turns(engine, visit, rng)):
+                if s["turn"] >= ge.MAX_TURNS:
+                    break
+                t0 = time.perf_counter()
+                first = []
+                try:
+                    _drain(engine.intervene(policy.line(engine, s["turn"], rng)),
+                           lambda: first or first.append(time.perf_counter() - t0))
+                except Exception:
+                    rec["turn_errors"] += 1        # 엔진이 턴을 되돌려 둔다
+                    continue
+                rec["turn_s"].append(time.perf_counter() - t0)
+                if first:
+                    rec["ttft_s"].append(first[0])
+            engine.return_to_present()
+            ending = _drain(engine.reveal_ending())
+            rec["endings"].append(ending["source"])
+            visit += 1
+            if engine.can_use_ticket():
+                engine.use_ticket()
+                continue
+            engine.finish()
+            break
+    except Exception as e:
+        rec["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        engine.close()
+    rec.update(
+        success=engine.outcome_success(), turns=s["turn"], tickets_used=ge.MAX_TICKETS - s["tickets"],
+        risk=int(s["risk"]), touched=len(s["touched_cps"]), improved=len(s["improved_cps"]),
+        wall_s=time.perf_counter() - started,
+    )
+    rec["condition_met"] = rec["risk"] <= -2 and rec["improved"] >= 2 and rec["touched"] >= 2
+    return rec
+
+
+def _usage_snapshot() -> dict:
+    import metrics, model_routes
+    return {
+        "prompt": metrics.LLM_PROMPT_TOKENS.snapshot(),
+        "completion": metrics.LLM_COMPLETION_TOKENS.snapshot(),
+        "cost": model_routes.LLM_COST.snapshot(),
+        "requests": metrics.LLM_REQUESTS.snapshot(),
+    }
+
+
+def _usage_delta(before: dict, after: dict) -> dict:
+    """호출 지점(site)별 토큰·비용·호출 수 증가분. 라벨 튜플의 첫 값이 site."""
+    out = {}
+
+    def add(site, field, value):
+        out.setdefault(site, {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "calls": 0})[field] += value
+
+    for kind, field in (("prompt", "prompt_tokens"), ("completion", "completion_tokens")):
+        for key, (total, _) in after[kind].items():
+            add(key[0], field, total - before[kind].get(key, (0, 0))[0])
+    for key, value in after["cost"].items():
+        add(key[0], "cost_usd", value - before["cost"].get(key, 0))
+    for key, value in after["requests"].items():
+        add(key[0], "calls", value - before["requests"].get(key, 0))
+    return {site: v for site, v in out.items() if any(v.values())}
+
+
+def _run_batch(task):
+    """워커 작업 단위: 같은 정책으로 여러 판. 백그라운드 호출까지 끝낸 뒤 사용량을 잰다."""
+    policy_name, turns_per_visit, seeds = task
+    policy = make_policy(policy_name, turns_per_visit)
+    before = _usage_snapshot()
+    records = [play_game(policy, random.Random(seed)) for seed in seeds]
+    _engine_mod.drain_background()
+    return policy_name, records, _usage_delta(before, _usage_snapshot())
+
+
+# ====== 집계 ======
+def _pct(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))], 4)
+
+
+def _dist(values):
+    return {"p50": _pct(values, 50), "p90": _pct(values, 90), "p99": _pct(values, 99),
+            "mean": round(sum(values) / len(values), 4) if values else None}
+
+
+def summarize(records, usage: dict, wall_s: float) -> dict:
+    n = len(records)
+    turn_s = [t for r in records for t in r["turn_s"]]
+    ttft_s = [t for r in records for t in r["ttft_s"]]
+    tickets = {}
+    for r in records:
+        tickets[r["tickets_used"]] = tickets.get(r["tickets_used"], 0) + 1
+    sources = {}
+    for r in records:
+        for src in r["endings"]:
+            sources[src] = sources.get(src, 0) + 1
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "calls": 0}
+    for v in usage.values():
+        for k in totals:
+            totals[k] += v[k]
+    per_game = {k: round(v / n, 4 if k == "cost_usd" else 1) for k, v in totals.items()} if n else {}
+    return {
+        "games": n,
+        "wall_s": round(wall_s, 2),
+        "games_per_s": round(n / wall_s, 2) if wall_s else None,
+        "success_rate": round(sum(r["success"] for r in records) / n, 4) if n else None,
+        "condition_met_rate": round(sum(r["condition_met"] for r in records) / n, 4) if n else None,
+        "tickets_used": {str(k): tickets[k] for k in sorted(tickets)},
+        "tickets_used_mean": round(sum(r["tickets_used"] for r in records) / n, 3) if n else None,
+        "turns_per_game": _dist([r["turns"] for r in records]),
+        "final_risk": _dist([r["risk"] for r in records]),
+        "game_s": _dist([r["wall_s"] for r in records]),
+        "turn_s": _dist(turn_s),
+        "turn_ttft_s": _dist(ttft_s),
+        "ending_sources": sources,
+        "per_game": per_game,
+        "per_game_by_site": {site: {k: round(x / n, 4 if k == "cost_usd" else 1) for k, x in v.items()}
+                             for site, v in sorted(usage.items())} if n else {},
+        "turn_errors": sum(r["turn_errors"] for r in records),
+        "game_errors": sum(1 for r in records if r["error"]),
+        "error_samples": sorted({r["error"] for r in records if r["error"]})[:5],
+    }
+
+
+def _merge_usage(total: dict, delta: dict):
+    for site, v in delta.items():
+        dst = total.setdefault(site, {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "calls": 0})
+        for k, x in v.items():
+            dst[k] += x
+
+
+def run_policy(pool, policy_name: str, args) -> dict:
+    seeds = [args.seed * 1_000_003 + i for i in range(args.games)]
+    tasks = [(policy_name, args.turns_per_visit, seeds[i:i + args.batch]) for i in range(0, len(seeds), args.batch)]
+    records, usage = [], {}
+    started = time.perf_counter()
+    for _, batch, delta in pool.imap_unordered(_run_batch, tasks):
+        records.extend(batch)
+        _merge_usage(usage, delta)
+        if not args.quiet:
+            print(f"\r[{policy_name}] {len(records)}/{args.games}", end="", file=sys.stderr, flush=True)
+    if not args.quiet:
+        print(file=sys.stderr)
+    return summarize(records, usage, time.perf_counter() - started)
+
+
+def _backend_env(args) -> dict:
+    env = {"METRICS_PORT": "0", "STORY_POOL_SIZE": "0", "LLM_CACHE_PATH": ""}
+    if not args.llm_cache:
+        env["LLM_CACHE_SITES"] = ""
+    if args.backend == "mock":
+        env["OPENAI_MODEL"] = os.getenv("OPENAI_MODEL", "gpt-4o")
+    return env
+
+
+def main():
+    ap = argparse.ArgumentParser(description="자동 플레이 시뮬레이터")
+    ap.add_argument("--games", type=int, default=200, help="정책별 게임 수")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--batch", type=int, default=10, help="워커 작업 하나에 묶을 게임 수")
+    ap.add_argument("--policy", default="random,sweep", help=f"쉼표로 여러 개 ({', '.join(POLICIES)})")
+    ap.add_argument("--turns-per-visit", type=int, default=3, help="sweep 정책의 방문당 턴 수")
+    ap.add_argument("--backend", choices=("mock", "openai"), default="mock")
+    ap.add_argument("--latency", type=float, default=0.0, help="mock: 요청당 고정 지연(초)")
+    ap.add_argument("--ttft", type=float, default=0.0, help="mock: 첫 토큰까지 지연(초)")
+    ap.add_argument("--tps", type=float, default=0.0, help="mock: 초당 토큰 (0이면 즉시)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="mock: 오류 응답 비율")
+    ap.add_argument("--llm-cache", action="store_true", help="LLM 응답 캐시를 앱 기본값(메모리만)으로 켠다")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="", help="결과 JSON 경로")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args()
+
+    policies = [p.strip() for p in args.policy.split(",") if p.strip()]
+    for name in policies:
+        make_policy(name)
+    if args.backend == "openai":
+        from dotenv import load_dotenv
+        load_dotenv()
+        if not os.getenv("OPENAI_API_KEY"):
+            sys.exit("OPENAI_API_KEY가 없습니다 (.env 또는 환경 변수).")
+    backend = {"kind": args.backend, "latency": args.latency, "ttft": args.ttft, "tps": args.tps,
+               "error_rate": args.error_rate, "seed": args.seed}
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.workers, initializer=_init_worker, initargs=(backend, _backend_env(args))) as pool:
+        for name in policies:
+            results[name] = run_policy(pool, name, args)
+
+    report = {
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                "workers": args.workers, "backend": backend, "llm_cache": args.llm_cache,
+                "turns_per_visit": args.turns_per_visit},
+        "policies": results,
+    }
+    for name, r in results.items():
+        print(f"[{name}] {r['games']}판 {r['games_per_s']}판/초 | 성공률 {r['success_rate']} "
+              f"(조건 도달 {r['condition_met_rate']}) | 티켓 {r['tickets_used']} | "
+              f"턴 p50/p90 {r['turn_s']['p50']}/{r['turn_s']['p90']}s | "
+              f"게임당 토큰 {r['per_game'].get('prompt_tokens')}+{r['per_game'].get('completion_tokens')} "
+              f"${r['per_game'].get('cost_usd')} | 오류 {r['turn_errors']}/{r['game_errors']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
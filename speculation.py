@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
+
+# ====== 추측 실행(speculative execution) ======
+# 다음에 필요할 가능성이 높은 결과를 미리 백그라운드에서 만들어 두고,
+# 실제로 필요해졌을 때 키가 같으면 그대로 사용한다.
+# 세션별 진행 중인 추측은 호출 측이 넘겨주는 dict(holder, 보통 st.session_state)에 보관한다.
+
+_lock = threading.Lock()
+_stats = {
+    "submitted": 0,   # 시작된 추측 수
+    "hits": 0,        # 키가 일치해 결과를 재사용
+    "misses": 0,      # 필요할 때 쓸 수 있는 추측이 없었음 (late/errors 포함)
+    "late": 0,        # 키는 맞았지만 기다린 시간 안에 끝나지 않음 (늦게 끝나면 wasted)
+    "cancelled": 0,   # 실행 전에 취소되어 비용이 들지 않음
+    "wasted": 0,      # 실행(=토큰 소모)됐지만 버려짐
+    "errors": 0,      # 추측 실행 중 예외
+}
+
+
+def _bump(name: str, n: int = 1):
+    with _lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    """프로세스 전체 hit/miss/waste 카운터 스냅샷"""
+    with _lock:
+        snap = dict(_stats)
+    used = snap["hits"] + snap["misses"]
+    snap["hit_rate"] = (snap["hits"] / used) if used else 0.0
+    return snap
+
+
+def _discard(spec):
+    """더 이상 쓰지 않을 추측을 정리한다. 이미 실행 중이면 끝난 뒤 낭비로 집계."""
+    fut = spec["future"]
+    if fut.cancel():
+        _bump("cancelled")
+        return
+
+    def _count_waste(f):
+        if not f.cancelled() and f.exception() is None:
+            _bump("wasted")
+    fut.add_done_callback(_count_waste)
+
+
+def submit(holder, slot: str, key: str, executor, fn, *args):
+    """
+    holder[slot]에 새 추측을 건다. 키가 다른 기존 추측은 취소(또는 낭비 처리)한다.
+    같은 키의 추측이 이미 있으면 그대로 둔다.
+    """
+    prev = holder.get(slot)
+    if prev is not None:
+        if prev["key"] == key:
+            return
+        _discard(prev)
+    holder[slot] = {"key": key, "future": executor.submit(fn, *args)}
+    _bump("submitted")
+
+
+def take(holder, slot: str, key: str, timeout=None):
+    """
+    키가 일치하는 추측 결과를 꺼낸다(아직 실행 중이면 기다림).
+    쓸 수 있는 결과가 없으면 None을 반환하고 miss로 집계한다.
+    """
+    spec = holder.get(slot)
+    holder[slot] = None
+    if spec is None or spec["key"] != key:
+        if spec is not None:
+            _discard(spec)
+        _bump("misses")
+        return None
+    try:
+        result = spec["future"].result(timeout=timeout)
+    except FutureTimeout:
+        _discard(spec)                  # 늦게 끝나면 낭비로 집계
+        _bump("late")
+        _bump("misses")
+        return None
+    except CancelledError:
+        _bump("misses")
+        return None
+    except Exception:
+        _bump("errors")
+        _bump("misses")
+        return None
+    _bump("hits")
+    return result
+
+
+def discard(holder, slot: str):
+    """보관 중인 추측을 버린다(게임 종료 등). holder는 in/[]만 지원해도 된다 (다른 스레드에서 세션을 내릴 때)."""
+    spec = holder[slot] if slot in holder else None
+    holder[slot] = None
+    if spec is not None:
+        _discard(spec)
@@ -0,0 +1,110 @@
+import os, time
+import threading
+
+import metrics
+
+# ====== 콜드 스타트 ======
+# game_engine은 openai import, .env 읽기, 클라이언트 생성을 첫 LLM 호출 직전까지 미룬다.
+# 랜딩 페이지가 그려지면 여기서 그 준비를 백그라운드로 미리 해 두고 업스트림 연결도 열어 둔다(keep-alive 풀 예열).
+# 플레이어가 "게임 시작"을 누를 즈음에는 첫 스토리 요청이 import나 TCP/TLS 연결을 기다리지 않는다.
+# SDK(httpx)의 keep-alive 연결은 5초 쉬면 닫히므로, 랜딩 페이지를 마지막으로 연 뒤 PREWARM_HOLD_S 동안 주기적으로 다시 두드린다.
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").strip().lower()   # lazy | eager (랜딩 페이지에서 준비가 끝날 때까지 기다림, 비교용)
+PREWARM_CONNECTIONS = int(os.getenv("PREWARM_CONNECTIONS", "2"))   # 미리 열어 둘 연결 수 (0이면 연결 예열 안 함)
+PREWARM_HOLD_S = float(os.getenv("PREWARM_HOLD_S", "60"))
+PREWARM_INTERVAL_S = float(os.getenv("PREWARM_INTERVAL_S", "4"))
+PREWARM_TIMEOUT_S = 5.0
+
+STARTUP_SECONDS = metrics.Histogram(
+    "about_time_startup_seconds", "콜드 스타트 준비 단계별 소요 시간", ("phase",),
+)
+PREWARM_PINGS = metrics.Counter("about_time_prewarm_pings_total", "연결 예열 요청 수", ("status",))
+
+_lock = threading.Lock()
+_thread = None
+_ready = threading.Event()
+_hold_until = 0.0
+_timings = {}           # 단계 → 초 (프로세스에서 처음 준비할 때 한 번)
+_error = None
+
+
+def begin():
+    """랜딩 페이지를 그릴 때마다 호출: 준비/연결 유지 스레드가 없으면 띄우고, 연결 유지 시간을 늘린다."""
+    global _thread, _hold_until
+    with _lock:
+        _hold_until = time.monotonic() + PREWARM_HOLD_S
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="about-time-prewarm", daemon=True)
+            _thread.start()
+    if STARTUP_MODE == "eager":
+        _ready.wait()
+
+
+def wait(timeout: float = None) -> bool:
+    """준비(클라이언트 생성과 첫 연결)가 끝났으면 True"""
+    return _ready.wait(timeout)
+
+
+def timings() -> dict:
+    return {"mode": STARTUP_MODE, "ready": _ready.is_set(), "phases": dict(_timings), "error": _error}
+
+
+def _phase(name: str, fn):
+    started = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        elapsed = time.perf_counter() - started
+        _timings[name] = round(elapsed, 4)
+        STARTUP_SECONDS.observe(elapsed, phase=name)
+
+
+def _prepare():
+    import game_engine
+    _phase("import_openai", lambda: __import__("openai"))
+    llm = _phase("client", game_engine.get_client)
+    _phase("resources", lambda: llm.chat.completions)     # SDK가 처음 접근할 때 불러오는 리소스 모듈
+    game_engine.get_story_pool()        # 풀을 쓰면 랜딩 페이지에 있는 동안 채우기 시작
+    if PREWARM_CONNECTIONS > 0:
+        _phase("connect", lambda: ping(llm, PREWARM_CONNECTIONS))
+    return llm
+
+
+def _run():
+    global _error
+    if _error is not None:
+        return
+    try:
+        if not _ready.is_set():
+            llm = _prepare()
+        else:
+            import game_engine
+            llm = game_engine.get_client()
+    except Exception as e:
+        # 키가 없는 등: 게임을 시작하면 같은 오류가 화면에 뜬다
+        _error = f"{type(e).__name__}: {e}"
+        return
+    finally:
+        _ready.set()
+    while PREWARM_CONNECTIONS > 0 and time.monotonic() < _hold_until:
+        time.sleep(PREWARM_INTERVAL_S)
+        ping(llm, PREWARM_CONNECTIONS)
+
+
+def ping(llm, connections: int = 1):
+    """가벼운 GET /models를 동시에 connections개 보내 클라이언트 커넥션 풀에 연결을 열어 둔다.
+    with_options로 만든 사본은 원래 클라이언트와 같은 HTTP 풀을 쓴다."""
+    quick = llm.with_options(timeout=PREWARM_TIMEOUT_S)
+
+    def _one():
+        try:
+            quick.models.list()
+            PREWARM_PINGS.inc(status="ok")
+        except Exception:
+            PREWARM_PINGS.inc(status="error")
+
+    threads = [threading.Thread(target=_one, daemon=True) for _ in range(max(1, connections))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
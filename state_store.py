@@ -0,0 +1,330 @@
+import os, json, time
+import copy
+import queue
+import socket
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+# ====== 세션 상태 저장소 ======
+# 세션 하나 = (버전, op 로그). 모든 백엔드가 같은 인터페이스를 가진다.
+#   version(sid)                       → 현재 버전 (없으면 0)
+#   load(sid)                          → (상태 dict 또는 None, 버전)
+#   commit(sid, expected, ops, snap)   → 새 버전. 저장된 버전이 expected와 다르면 Conflict
+# 낙관적 동시성: 같은 세션을 두 탭/두 워커가 동시에 진행하면 먼저 커밋한 쪽만 반영된다.
+# op 형식과 적용은 persistence.py가 정의한다 (apply_fn으로 주입).
+
+STATE_TTL_S = float(os.getenv("PERSIST_TTL_S", str(7 * 24 * 3600)))
+COMPACT_EVERY = int(os.getenv("PERSIST_COMPACT_EVERY", "50"))
+GC_INTERVAL_S = 3600
+
+
+class Conflict(Exception):
+    """다른 탭/워커가 먼저 같은 세션을 갱신함"""
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# ====== 메모리 (단일 프로세스, 테스트용) ======
+class MemoryStore:
+    def __init__(self, apply_fn, ttl_s: float = STATE_TTL_S):
+        self.apply_fn = apply_fn
+        self.ttl_s = ttl_s
+        self._data = {}          # sid → [버전, 상태, 마지막 갱신]
+        self._lock = threading.Lock()
+
+    def version(self, sid: str) -> int:
+        with self._lock:
+            entry = self._data.get(sid)
+            return entry[0] if entry else 0
+
+    def load(self, sid: str):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None, 0
+            return copy.deepcopy(entry[1]), entry[0]
+
+    def commit(self, sid: str, expected: int, ops, snapshot_fn=None) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(sid) or [0, {}, now]
+            if entry[0] != expected:
+                raise Conflict(sid)
+            state = copy.deepcopy(entry[1])
+            for op in json.loads(_dumps(ops)):
+                self.apply_fn(state, op)
+            self._data[sid] = [expected + 1, state, now]
+            for old in [k for k, e in self._data.items() if now - e[2] > self.ttl_s]:
+                del self._data[old]
+            return expected + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._data)}
+
+
+# ====== SQLite (같은 호스트의 여러 워커 프로세스) ======
+class SqliteStore:
+    def __init__(self, path: str, apply_fn, ttl_s: float = STATE_TTL_S, compact_every: int = COMPACT_EVERY):
+        self.apply_fn = apply_fn
+        self.ttl_s = ttl_s
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_log ("
+            " sid TEXT NOT NULL, seq INTEGER NOT NULL, ops TEXT NOT NULL, PRIMARY KEY (sid, seq))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY, seq INTEGER NOT NULL, since_snapshot INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def version(self, sid: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT seq FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, sid: str):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                row = self._db.execute("SELECT seq FROM sessions WHERE sid = ?", (sid,)).fetchone()
+                rows = self._db.execute(
+                    "SELECT ops FROM session_log WHERE sid = ? ORDER BY seq", (sid,)
+                ).fetchall()
+            finally:
+                self._db.execute("COMMIT")
+        if not row or not rows:
+            return None, 0
+        state = {}
+        for (ops,) in rows:
+            for op in json.loads(ops):
+                self.apply_fn(state, op)
+        return state, row[0]
+
+    def commit(self, sid: str, expected: int, ops, snapshot_fn=None) -> int:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: 버전 확인과 기록 사이에 다른 프로세스가 끼어들지 못하게 쓰기 잠금을 먼저 잡는다
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._db.execute("SELECT seq, since_snapshot FROM sessions WHERE sid = ?", (sid,)).fetchone()
+                seq, since = cur if cur else (0, 0)
+                if seq != expected:
+                    raise Conflict(sid)
+                seq, since = seq + 1, since + 1
+                if snapshot_fn is not None and since > self.compact_every:
+                    self._db.execute("DELETE FROM session_log WHERE sid = ?", (sid,))
+                    ops, since = [["snapshot", None, snapshot_fn()]], 0
+                self._db.execute(
+                    "INSERT INTO session_log (sid, seq, ops) VALUES (?, ?, ?)", (sid, seq, _dumps(ops)),
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (sid, seq, since_snapshot, updated) VALUES (?, ?, ?, ?)",
+                    (sid, seq, since, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if now - self._last_gc > GC_INTERVAL_S:
+                self._last_gc = now
+                self._gc(now)
+        return seq
+
+    def _gc(self, now: float):
+        cutoff = now - self.ttl_s
+        self._db.execute(
+            "DELETE FROM session_log WHERE sid IN (SELECT sid FROM sessions WHERE updated < ?)", (cutoff,)
+        )
+        self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            rows = self._db.execute("SELECT COUNT(*) FROM session_log").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "log_rows": rows}
+
+
+# ====== Redis 프로토콜 (여러 호스트의 워커) ======
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    """RESP2 최소 클라이언트 (redis 패키지 없이 동작)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: str = None, timeout: float = 5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def execute(self, *args):
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        self.sock.sendall(b"".join(out))
+        return self._read()
+
+    def _read(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.rfile.read(n + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            n = int(rest)
+            if n < 0:
+                return None
+            return [self._read() for _ in range(n)]
+        raise RedisError(f"bad reply: {line!r}")
+
+
+class RedisStore:
+    """
+    세션당 키 세 개: {prefix}{sid}:v (버전), :log (op 줄 리스트), :since (스냅샷 이후 줄 수).
+    커밋은 WATCH v → 버전 확인 → MULTI … EXEC. 그 사이 다른 쪽이 v를 바꾸면 EXEC가 nil → Conflict.
+    만료는 EXPIRE로 맡긴다.
+    """
+
+    def __init__(self, url: str, apply_fn, ttl_s: float = STATE_TTL_S, compact_every: int = COMPACT_EVERY,
+                 prefix: str = "about_time:session:", pool_size: int = 8):
+        u = urlparse(url)
+        self._conn_args = dict(
+            host=u.hostname or "127.0.0.1", port=u.port or 6379,
+            db=int((u.path or "/0").lstrip("/") or 0), password=u.password,
+        )
+        self.apply_fn = apply_fn
+        self.ttl_s = int(ttl_s)
+        self.compact_every = compact_every
+        self.prefix = prefix
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _conn(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return RespConnection(**self._conn_args)
+
+    def _release(self, conn, broken=False):
+        if broken:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _call(self, fn):
+        conn = self._conn()
+        try:
+            result = fn(conn)
+        except (OSError, ConnectionError, RedisError):
+            self._release(conn, broken=True)
+            raise
+        except BaseException:
+            conn.execute("UNWATCH")
+            self._release(conn)
+            raise
+        self._release(conn)
+        return result
+
+    def _keys(self, sid):
+        base = self.prefix + sid
+        return base + ":v", base + ":log", base + ":since"
+
+    def version(self, sid: str) -> int:
+        v, _, _ = self._keys(sid)
+        return int(self._call(lambda c: c.execute("GET", v)) or 0)
+
+    def load(self, sid: str):
+        v, log, _ = self._keys(sid)
+
+        def _load(c):
+            c.execute("MULTI")
+            c.execute("GET", v)
+            c.execute("LRANGE", log, 0, -1)
+            return c.execute("EXEC")
+
+        version, rows = self._call(_load)
+        if not version or not rows:
+            return None, 0
+        state = {}
+        for ops in rows:
+            for op in json.loads(ops):
+                self.apply_fn(state, op)
+        return state, int(version)
+
+    def commit(self, sid: str, expected: int, ops, snapshot_fn=None) -> int:
+        v, log, since_key = self._keys(sid)
+
+        def _commit(c):
+            c.execute("WATCH", v)
+            current = int(c.execute("GET", v) or 0)
+            if current != expected:
+                c.execute("UNWATCH")
+                raise Conflict(sid)
+            since = int(c.execute("GET", since_key) or 0) + 1
+            body = ops
+            c.execute("MULTI")
+            if snapshot_fn is not None and since > self.compact_every:
+                c.execute("DEL", log)
+                body, since = [["snapshot", None, snapshot_fn()]], 0
+            c.execute("RPUSH", log, _dumps(body))
+            c.execute("SET", v, expected + 1)
+            c.execute("SET", since_key, since)
+            for key in (v, log, since_key):
+                c.execute("EXPIRE", key, self.ttl_s)
+            if c.execute("EXEC") is None:
+                raise Conflict(sid)
+            return expected + 1
+
+        return self._call(_commit)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "server": f"{self._conn_args['host']}:{self._conn_args['port']}"}
+
+
+def open_store(spec: str, sqlite_path: str, apply_fn):
+    """
+    STATE_STORE 값으로 백엔드를 고른다.
+    sqlite(기본) / memory / redis://host:port/db
+    """
+    spec = (spec or "sqlite").strip()
+    if spec == "memory":
+        return MemoryStore(apply_fn)
+    if spec.startswith("redis://"):
+        return RedisStore(spec, apply_fn)
+    if spec == "sqlite":
+        return SqliteStore(sqlite_path, apply_fn) if sqlite_path else None
+    raise ValueError(f"unknown STATE_STORE: {spec}")
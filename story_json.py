@@ -0,0 +1,297 @@
+import re
+import json
+
+import metrics
+
+# ====== 구조화(JSON) 스토리 생성 ======
+# 스토리 한 번의 스트리밍 호출로 인물·피해자·체크포인트 4개·엔딩을 JSON 스키마에 맞춰 받는다.
+# 스트리밍 중에는 JSON 델타를 증분 파싱해 기존 자유 텍스트 형식([체크포인트 N: 소제목]\n본문)의
+# 델타로 바꿔 내보내므로, 화면 출력(CheckpointLexer/StreamRenderer)은 자유 텍스트 경로와 같다.
+# 스트림이 끝나면 전체 문서를 검증하고, 실패하면 호출 측이 자유 텍스트 경로로 되돌아간다.
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "characters": {"type": "array", "items": {"type": "string"}},
+        "victim": {"type": "string"},
+        "checkpoints": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"title": {"type": "string"}, "body": {"type": "string"}},
+                "required": ["title", "body"],
+                "additionalProperties": False,
+            },
+        },
+        "ending": {
+            "type": "object",
+            "properties": {"title": {"type": "string"}, "body": {"type": "string"}},
+            "required": ["title", "body"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["characters", "victim", "checkpoints", "ending"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "about_time_story", "strict": True, "schema": SCHEMA},
+}
+
+NUM_CHECKPOINTS = 4
+
+STORY_FORMAT_RESULTS = metrics.Counter(
+    "about_time_story_format_total", "구조화 스토리 생성 결과 (ok/invalid/error)", ("site", "result"),
+)
+
+_NAME_RE = re.compile(r"^[가-힣]{2,3}$")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", '"': '"', "\\": "\\", "/": "/"}
+_WS = " \t\r\n"
+
+
+# ====== 증분 JSON 스캐너 ======
+class JsonEventStream:
+    """
+    JSON 텍스트를 조각 단위로 받아, 문자열 값이 들어오는 대로
+    (경로, 새로 들어온 내용, 완료 여부, 완료 시 전체 값) 이벤트를 낸다.
+    경로는 객체 키/배열 인덱스의 튜플 — 예: ("checkpoints", 0, "body").
+    숫자/불리언/null 값은 건너뛴다 (이 스키마에는 문자열만 필요).
+    """
+
+    def __init__(self):
+        self._stack = []         # [종류('o'|'a'), 현재 키 또는 인덱스]
+        self._mode = "value"     # value | key_or_close | key | colon | value_or_close | string | after | literal | done
+        self._buf = []
+        self._emitted = 0
+        self._esc = None         # None | "" (역슬래시 직후) | "uXXXX" 수집 중
+        self._high = None        # \uD800-\uDBFF 상위 대리 코드
+        self.error = None
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def _close(self):
+        self._stack.pop()
+        self._mode = "after" if self._stack else "done"
+
+    def _string_char(self, c):
+        """문자열 안의 문자 하나 처리. 닫는 따옴표면 True."""
+        esc = self._esc
+        if esc is None:
+            if c == "\\":
+                self._esc = ""
+                return False
+            if c == '"':
+                return True
+            self._buf.append(c)
+            return False
+        if esc == "":
+            if c == "u":
+                self._esc = "u"
+                return False
+            self._esc = None
+            self._buf.append(_ESCAPES.get(c, c))
+            return False
+        esc += c
+        if len(esc) < 5:
+            self._esc = esc
+            return False
+        self._esc = None
+        cp = int(esc[1:], 16)
+        if 0xD800 <= cp < 0xDC00:
+            self._high = cp
+        elif 0xDC00 <= cp < 0xE000 and self._high is not None:
+            self._buf.append(chr(0x10000 + ((self._high - 0xD800) << 10) + (cp - 0xDC00)))
+            self._high = None
+        else:
+            self._buf.append(chr(cp))
+        return False
+
+    def feed(self, text: str):
+        events = []
+        i, n = 0, len(text)
+        while i < n:
+            c = text[i]
+            mode = self._mode
+            if mode == "string":
+                if self._string_char(c):
+                    value = "".join(self._buf)
+                    events.append((self._path(), value[self._emitted:], True, value))
+                    self._mode = "after"
+            elif mode == "key":
+                if self._string_char(c):
+                    self._stack[-1][1] = "".join(self._buf)
+                    self._mode = "colon"
+            elif c in _WS:
+                pass
+            elif mode == "value":
+                if c == "{":
+                    self._stack.append(["o", None])
+                    self._mode = "key_or_close"
+                elif c == "[":
+                    self._stack.append(["a", 0])
+                    self._mode = "value_or_close"
+                elif c == '"':
+                    self._buf, self._emitted, self._mode = [], 0, "string"
+                else:
+                    self._mode = "literal"
+            elif mode == "literal":
+                if c in ",}]":
+                    self._mode = "after"
+                    continue            # 구분자는 after 상태에서 다시 처리
+            elif mode == "key_or_close":
+                if c == '"':
+                    self._buf, self._mode = [], "key"
+                elif c == "}":
+                    self._close()
+                else:
+                    self.error = f"unexpected {c!r} before key"
+            elif mode == "value_or_close":
+                if c == "]":
+                    self._close()
+                else:
+                    self._mode = "value"
+                    continue
+            elif mode == "colon":
+                if c == ":":
+                    self._mode = "value"
+                else:
+                    self.error = f"unexpected {c!r} after key"
+            elif mode == "after":
+                top = self._stack[-1] if self._stack else None
+                if c == "," and top is not None:
+                    if top[0] == "a":
+                        top[1] += 1
+                        self._mode = "value"
+                    else:
+                        self._mode = "key_or_close"
+                elif c in "}]" and top is not None:
+                    self._close()
+                else:
+                    self.error = f"unexpected {c!r} after value"
+            i += 1
+        # 아직 닫히지 않은 문자열 값은 이번 조각에서 늘어난 만큼만 내보냄
+        if self._mode == "string" and len(self._buf) > self._emitted:
+            value = "".join(self._buf)
+            events.append((self._path(), value[self._emitted:], False, None))
+            self._emitted = len(value)
+        return events
+
+    @property
+    def done(self) -> bool:
+        return self._mode == "done"
+
+
+# ====== JSON 델타 → 자유 텍스트 델타 ======
+def _clean_title(title: str) -> str:
+    return re.sub(r"[\[\]\n]", " ", title).strip()
+
+
+def _header(section: int, title: str) -> str:
+    label = f"체크포인트 {section + 1}" if section < NUM_CHECKPOINTS else "엔딩"
+    title = _clean_title(title)
+    return f"[{label}: {title}]\n" if title else f"[{label}]\n"
+
+
+def _section_of(path):
+    """경로 → (문단 번호, 필드). 체크포인트 0~3, 엔딩은 4."""
+    if len(path) == 3 and path[0] == "checkpoints" and isinstance(path[1], int) and path[1] < NUM_CHECKPOINTS:
+        return path[1], path[2]
+    if len(path) == 2 and path[0] == "ending":
+        return NUM_CHECKPOINTS, path[1]
+    return None, None
+
+
+class StoryStream:
+    """구조화 스토리 스트림을 받아 화면에 그릴 자유 텍스트 델타를 돌려준다."""
+
+    def __init__(self):
+        self._events = JsonEventStream()
+        self._raw = []
+        self._titles = {}
+        self._opened = set()        # 머리표를 이미 내보낸 문단
+        self._pending = {}          # 소제목이 끝나기 전에 들어온 본문
+
+    def _open(self, section: int, title: str = "") -> str:
+        self._opened.add(section)
+        sep = "\n\n" if len(self._opened) > 1 else ""
+        return sep + _header(section, title) + self._pending.pop(section, "")
+
+    def feed(self, delta: str) -> str:
+        self._raw.append(delta)
+        out = []
+        for path, piece, done, value in self._events.feed(delta):
+            section, field = _section_of(path)
+            if section is None:
+                continue
+            if field == "title":
+                if done:
+                    self._titles[section] = value
+                    if section not in self._opened:
+                        out.append(self._open(section, value))
+            elif field == "body":
+                if section in self._opened:
+                    out.append(piece)
+                elif section in self._titles or done:
+                    out.append(self._open(section, self._titles.get(section, "")) + piece)
+                else:
+                    self._pending[section] = self._pending.get(section, "") + piece
+        return "".join(out)
+
+    def close(self) -> str:
+        out = [self._open(s, self._titles.get(s, "")) for s in sorted(self._pending) if s not in self._opened]
+        return "".join(out)
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._raw)
+
+    def document(self) -> dict:
+        return parse_document(self.raw)
+
+
+# ====== 문서 검증 ======
+def parse_document(raw: str) -> dict:
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").strip()
+        if raw.startswith("json"):
+            raw = raw[4:].strip()
+    doc = json.loads(raw)
+    if not isinstance(doc, dict):
+        raise ValueError("story document is not an object")
+    return doc
+
+
+def to_story_text(doc: dict) -> str:
+    sections = list(doc["checkpoints"][:NUM_CHECKPOINTS]) + [doc["ending"]]
+    return "\n\n".join(
+        _header(i, sec.get("title", "")) + sec["body"].strip() for i, sec in enumerate(sections)
+    )
+
+
+def validate(doc: dict):
+    """
+    문서 → (스토리 본문, 체크포인트 5개, (이름1, 이름2, 피해자)).
+    형식이 어긋나면 ValueError — 호출 측은 자유 텍스트 경로로 되돌아간다.
+    """
+    try:
+        names = [c.strip() for c in doc["characters"]]
+        victim = doc["victim"].strip()
+        sections = list(doc["checkpoints"]) + [doc["ending"]]
+        bodies = [sec["body"].strip() for sec in sections]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"malformed story document: {e}")
+    if len(names) != 2 or names[0] == names[1] or not all(_NAME_RE.match(c) for c in names):
+        raise ValueError(f"bad characters: {names}")
+    if victim not in names:
+        raise ValueError(f"victim {victim!r} not among characters")
+    if len(sections) != NUM_CHECKPOINTS + 1 or not all(bodies):
+        raise ValueError(f"expected {NUM_CHECKPOINTS} checkpoints and an ending")
+    text = "\n\n".join(bodies)
+    if not all(c in text for c in names):
+        raise ValueError("characters do not appear in the story")
+    story = to_story_text(doc)
+    checkpoints = [_header(i, sec.get("title", "")) + body for i, (sec, body) in enumerate(zip(sections, bodies))]
+    return story, checkpoints, (names[0], names[1], victim)
@@ -0,0 +1,212 @@
+import os, re, json, time, uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ====== 스토리 풀 ======
+# 검증을 마친(체크포인트/인물/피해자/하이라이트 HTML까지 파싱된) 스토리를 미리 만들어
+# 로컬 디렉터리에 한 편당 JSON 파일 하나로 쌓아 둔다.
+# 꺼낼 때는 파일을 rename으로 선점하므로 같은 디렉터리를 여러 프로세스가 함께 써도 안전하다.
+# 생성 중인 편은 slot-N.inflight 선점 파일(O_EXCL, N < target)로 표시해, 보충량을 프로세스마다가 아니라
+# 디렉터리 전체(준비된 편 + 모든 프로세스의 생성 중인 편) 기준으로 정한다.
+
+_NAME_RE = re.compile(r'^[가-힣]{2,3}$')
+_CP_TAG_RE = re.compile(r'^\s*\[(?:체크포인트\s*([1-4])|CP([1-4]))(?::[^\]]*)?\]')
+_END_TAG_RE = re.compile(r'^\s*\[(?:엔딩|결말)(?::[^\]]*)?\]')
+_CLAIM_STALE_S = 600.0          # 이보다 오래된 선점 파일은 죽은 프로세스가 남긴 것으로 보고 치운다
+
+
+def validate_story(entry: dict) -> str:
+    """문제가 없으면 빈 문자열, 있으면 사유를 반환"""
+    cps = entry.get("checkpoints") or []
+    if len(cps) != 5:
+        return f"체크포인트 개수 {len(cps)}"
+    for i, block in enumerate(cps[:4], 1):
+        m = _CP_TAG_RE.match(block)
+        if not m or int(m.group(1) or m.group(2)) != i:
+            return f"체크포인트 {i} 머리표 누락"
+    if not _END_TAG_RE.match(cps[4]):
+        return "엔딩 머리표 누락"
+    c1, c2, victim = entry.get("char1", ""), entry.get("char2", ""), entry.get("victim", "")
+    if not (_NAME_RE.match(c1) and _NAME_RE.match(c2)) or c1 == c2:
+        return f"인물 이름 이상: {c1!r}, {c2!r}"
+    if victim not in (c1, c2):
+        return f"피해자 이름 이상: {victim!r}"
+    if not entry.get("init_story") or not entry.get("init_story_html"):
+        return "본문 누락"
+    return ""
+
+
+class StoryPool:
+    """
+    produce(): 스토리 한 편(dict)을 만들어 반환하는 함수 (세션 상태에 접근하지 않아야 함)
+    target: 채워 둘 최대 편수, low_water: 이 이하로 떨어지면 target까지 보충
+    concurrency: 동시에 생성할 최대 편수
+    """
+
+    def __init__(self, produce, store_dir: str, target: int = 4, low_water: int = 2,
+                 concurrency: int = 2, retry_delay: float = 5.0):
+        self.produce = produce
+        self.store_dir = store_dir
+        self.target = max(1, target)
+        self.low_water = max(0, min(low_water, self.target - 1))
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="story-pool")
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._refilling = False
+        self._failures = 0
+        self.stats = {"produced": 0, "rejected": 0, "errors": 0, "served": 0, "empty": 0}
+        os.makedirs(store_dir, exist_ok=True)
+
+    # ---- 저장소 ----
+    def _ready_files(self):
+        try:
+            return sorted(f for f in os.listdir(self.store_dir) if f.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def size(self) -> int:
+        return len(self._ready_files())
+
+    # ---- 생성 중 선점 파일 (프로세스 간 공유) ----
+    def _claim_files(self):
+        try:
+            return [f for f in os.listdir(self.store_dir) if f.endswith(".inflight")]
+        except FileNotFoundError:
+            return []
+
+    def _claim_is_stale(self, path: str) -> bool:
+        try:
+            if time.time() - os.path.getmtime(path) > _CLAIM_STALE_S:
+                return True
+            with open(path, encoding="utf-8") as f:
+                pid = int(f.read().strip() or 0)
+            os.kill(pid, 0)              # 같은 호스트에서 프로세스가 살아 있는지
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            return False
+        return False
+
+    def inflight_total(self) -> int:
+        """디렉터리를 공유하는 모든 프로세스의 생성 중인 편수 (죽은 프로세스의 선점은 치움)"""
+        live = 0
+        for name in self._claim_files():
+            path = os.path.join(self.store_dir, name)
+            if self._claim_is_stale(path):
+                self._unclaim(path)
+            else:
+                live += 1
+        return live
+
+    def _claim(self):
+        """빈 생성 슬롯 하나를 선점하고 경로를 돌려준다 (슬롯이 target개뿐이라 생성 중인 편은 전체에서 target을 넘지 않음)"""
+        for k in range(self.target):
+            path = os.path.join(self.store_dir, f"slot-{k}.inflight")
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(str(os.getpid()))
+            return path
+        return None
+
+    @staticmethod
+    def _unclaim(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _store(self, entry: dict):
+        name = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}.json"
+        tmp = os.path.join(self.store_dir, name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.store_dir, name))
+
+    def pop(self):
+        """가장 오래된 스토리 한 편을 꺼낸다. 비어 있으면 None."""
+        entry = None
+        for name in self._ready_files():
+            src = os.path.join(self.store_dir, name)
+            claimed = f"{src}.claimed-{os.getpid()}-{threading.get_ident()}"
+            try:
+                os.rename(src, claimed)      # 다른 프로세스가 먼저 가져갔으면 실패
+            except OSError:
+                continue
+            try:
+                with open(claimed, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            finally:
+                try:
+                    os.remove(claimed)
+                except OSError:
+                    pass
+            if data and not validate_story(data):
+                entry = data
+                break
+        with self._lock:
+            self.stats["served" if entry else "empty"] += 1
+        self.maybe_refill()
+        return entry
+
+    # ---- 보충 ----
+    def maybe_refill(self):
+        with self._lock:
+            if not self._refilling and self.size() > self.low_water:
+                return
+            self._refilling = True
+            need = self.target - self.size() - self.inflight_total()
+            for _ in range(max(0, need)):
+                claim = self._claim()
+                if claim is None:
+                    break
+                if self.size() + self.inflight_total() > self.target:
+                    self._unclaim(claim)     # 다른 프로세스가 같은 순간에 채웠으면 양보
+                    break
+                self._inflight += 1
+                self._executor.submit(self._produce_one, claim)
+            if self._inflight == 0:
+                self._refilling = False
+
+    def _produce_one(self, claim: str):
+        try:
+            entry = self.produce()
+            reason = validate_story(entry)
+            if reason:
+                with self._lock:
+                    self.stats["rejected"] += 1
+                    self._failures += 1
+            else:
+                self._store(entry)
+                with self._lock:
+                    self.stats["produced"] += 1
+                    self._failures = 0
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+                self._failures += 1
+        finally:
+            self._unclaim(claim)             # 저장한 뒤에 풀어야 준비된 편 + 생성 중 합계가 잠깐이라도 모자라 보이지 않는다
+            with self._lock:
+                failures = self._failures
+                self._inflight -= 1
+                if self._inflight == 0:
+                    self._refilling = False
+        if failures:
+            # 연속 실패 시 상류 모델을 두드리지 않도록 점점 늦게 재시도
+            time.sleep(min(60.0, self.retry_delay * failures))
+        if self.size() < self.target:
+            self.maybe_refill()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snap = dict(self.stats)
+            snap["inflight"] = self._inflight
+        snap["inflight_total"] = self.inflight_total()
+        snap["size"] = self.size()
+        return snap
@@ -0,0 +1,72 @@
+import os, time
+import threading
+
+# ====== 스트리밍 렌더 배치 ======
+# 토큰 청크마다 placeholder.markdown()을 부르지 않고, 일정 시간 또는 글자 수가
+# 쌓였을 때만 화면을 갱신한다. 마지막에는 항상 강제로 한 번 그린다.
+
+FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "50"))
+FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "200"))
+
+_lock = threading.Lock()
+_totals = {"responses": 0, "chunks": 0, "renders": 0, "saved": 0}
+
+
+def stats() -> dict:
+    """프로세스 전체 누적 (응답 수, 청크 수, 실제 렌더 수, 절약한 렌더 수)"""
+    with _lock:
+        snap = dict(_totals)
+    snap["saved_ratio"] = (snap["saved"] / snap["chunks"]) if snap["chunks"] else 0.0
+    return snap
+
+
+class StreamRenderer:
+    """
+    render(): 지금까지 누적된 내용을 화면에 그리는 함수 (보통 placeholder.markdown 호출)
+    push(n): 새로 n글자가 들어왔음을 알림 → 예산을 넘으면 render()
+    finish(): 남은 내용을 강제로 그리고 이번 응답의 통계를 반환
+    """
+
+    def __init__(self, render, flush_ms: float = None, flush_chars: int = None):
+        self.render = render
+        self.flush_s = (FLUSH_MS if flush_ms is None else flush_ms) / 1000.0
+        self.flush_chars = FLUSH_CHARS if flush_chars is None else flush_chars
+        self.chunks = 0
+        self.renders = 0
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        self._finished = False
+
+    def push(self, n_chars: int = 1):
+        self.chunks += 1
+        self._pending_chars += n_chars
+        now = time.monotonic()
+        if self._pending_chars >= self.flush_chars or now - self._last_flush >= self.flush_s:
+            self.flush(now)
+
+    def flush(self, now: float = None):
+        self.render()
+        self.renders += 1
+        self._pending_chars = 0
+        self._last_flush = now if now is not None else time.monotonic()
+
+    def finish(self) -> dict:
+        if self._finished:
+            return self.report()
+        self._finished = True
+        if self._pending_chars or self.renders == 0:
+            self.flush()
+        rep = self.report()
+        with _lock:
+            _totals["responses"] += 1
+            _totals["chunks"] += rep["chunks"]
+            _totals["renders"] += rep["renders"]
+            _totals["saved"] += rep["saved"]
+        return rep
+
+    def report(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "renders": self.renders,
+            "saved": max(0, self.chunks - self.renders),
+        }
@@ -0,0 +1,139 @@
+import re
+
+# ====== 스트리밍 태그 필터 ======
+# 모델 출력 끝에 붙는 <STATUS: …> / <ENDING: …> 태그를 토큰 스트림 안에서 바로 걸러 낸다.
+# - '<STATUS:' / '<ENDING:' 의 시작일 수 있는 꼬리는 화면에 내보내지 않고 잠시 보류한다.
+# - 태그가 닫히는 순간 on_tag(이름, 값)을 호출하고, 태그는 플레이어에게 보이지 않는다.
+# - 태그를 감싼 따옴표/공백과 출력 끝의 공백은 game_engine의 후처리 정규식(strip_ending_tag)과 같은 규칙으로 지운다.
+
+TAG_NAMES = ("STATUS", "ENDING")
+MAX_TAG_LEN = 48                       # 이보다 길어지면 태그가 아니라고 보고 그대로 내보냄
+
+_QUOTES = "\"“”'"
+_TAG_RE = re.compile(r"<\s*(STATUS|ENDING)\s*:\s*([^<>\n]*)>", re.IGNORECASE)
+_STATUS_RE = re.compile(r"^(?:(risk_up|risk_down)\s*([+-]?\d+)?|neutral)\s*$", re.IGNORECASE)
+_ENDING_RE = re.compile(r"^(success|failure)\s*$", re.IGNORECASE)
+
+
+def _could_be_tag(s: str) -> bool:
+    """'<' 로 시작하는 미완성 꼬리 s가 아직 태그가 될 수 있는지"""
+    if len(s) > MAX_TAG_LEN or "\n" in s:
+        return False
+    body = s[1:].lstrip().upper()
+    for name in TAG_NAMES:
+        if len(body) <= len(name):
+            if name.startswith(body):
+                return True
+        elif body.startswith(name) and body[len(name):].lstrip()[:1] in ("", ":"):
+            return True
+    return False
+
+
+def status_delta(value: str) -> int:
+    """STATUS 값 → 위험도 변화 (-2~2). 알 수 없는 값은 0."""
+    m = _STATUS_RE.match(value.strip())
+    if not m:
+        return 0
+    kind, num = (m.group(1) or "").lower(), m.group(2)
+    if kind == "risk_up":
+        delta = int(num or 1)
+    elif kind == "risk_down":
+        delta = -int(num or 1)
+    else:
+        delta = 0
+    return max(-2, min(2, delta))
+
+
+def ending_success(value: str):
+    """ENDING 값 → True/False, 알 수 없으면 None"""
+    m = _ENDING_RE.match(value.strip())
+    return None if not m else m.group(1).lower() == "success"
+
+
+class TagFilter:
+    def __init__(self, on_tag=None):
+        self.on_tag = on_tag
+        self.tags = []                 # [(이름, 값)] 등장 순서
+        self._held = ""                # 아직 내보내지 않은 꼬리 (공백/따옴표 또는 태그 후보)
+        self._after_tag = False        # 태그 바로 뒤의 공백 + 따옴표 하나는 삼킨다
+        self._out = []
+        self._raw = []
+
+    @property
+    def text(self) -> str:
+        """지금까지 플레이어에게 보인 텍스트"""
+        return "".join(self._out)
+
+    @property
+    def raw(self) -> str:
+        """태그까지 포함한 원문"""
+        return "".join(self._raw)
+
+    def _emit(self, s: str):
+        if s:
+            self._out.append(s)
+        return s
+
+    def _swallow_after_tag(self, s: str) -> str:
+        stripped = s.lstrip()
+        if not stripped:
+            return ""                  # 공백만 왔으면 계속 삼킬 수 있음
+        self._after_tag = False
+        if stripped[0] in _QUOTES:
+            stripped = stripped[1:]
+        return stripped
+
+    def feed(self, delta: str) -> str:
+        """새 델타 → 이번에 화면에 추가할 텍스트"""
+        self._raw.append(delta)
+        if self._after_tag:
+            delta = self._swallow_after_tag(delta)
+        buf, self._held = self._held + delta, ""
+        out = []
+        while True:
+            lt = buf.find("<")
+            if lt < 0:
+                break
+            m = _TAG_RE.match(buf, lt)
+            if m:
+                out.append(_strip_before_tag(buf[:lt]))
+                self.tags.append((m.group(1).upper(), m.group(2).strip()))
+                if self.on_tag is not None:
+                    self.on_tag(*self.tags[-1])
+                self._after_tag = True
+                buf = self._swallow_after_tag(buf[m.end():])
+                continue
+            if _could_be_tag(buf[lt:]):
+                # 태그 후보와, 태그와 함께 지워질 수 있는 그 앞의 공백/따옴표를 보류
+                keep = _tail_start(buf[:lt])
+                out.append(buf[:keep])
+                self._held = buf[keep:]
+                return self._emit("".join(out))
+            out.append(buf[:lt + 1])
+            buf = buf[lt + 1:]
+        # 태그 후보 없음: 끝의 공백/따옴표만 보류
+        keep = _tail_start(buf)
+        out.append(buf[:keep])
+        self._held = buf[keep:]
+        return self._emit("".join(out))
+
+    def close(self) -> str:
+        """스트림 종료: 보류분 중 보여야 할 부분(끝 공백 제외)을 내보낸다."""
+        held, self._held = self._held, ""
+        return self._emit(held.rstrip())
+
+
+def _strip_before_tag(s: str) -> str:
+    """태그 앞의 ["“”']?\\s* 를 지운다"""
+    s = s.rstrip()
+    if s and s[-1] in _QUOTES:
+        s = s[:-1].rstrip()      # 따옴표 앞 공백까지 (예전 _strip_status의 마지막 rstrip과 같게)
+    return s
+
+
+def _tail_start(s: str) -> int:
+    """끝에 이어진 공백/따옴표 구간의 시작 위치"""
+    i = len(s)
+    while i > 0 and (s[i - 1].isspace() or s[i - 1] in _QUOTES):
+        i -= 1
+    return i
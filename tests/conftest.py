@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# 테스트가 작업 디렉터리의 저장소/캐시 파일과 지표 포트를 건드리지 않도록 모듈 import 전에 환경을 정한다
+_TMP = tempfile.mkdtemp(prefix="about-time-test-")
+os.environ.setdefault("PERSIST_PATH", os.path.join(_TMP, "sessions.sqlite3"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_TMP, "llm_cache.sqlite3"))
+os.environ.setdefault("STORY_POOL_DIR", os.path.join(_TMP, "story_pool"))
+os.environ.setdefault("METRICS_PORT", "0")
@@ -0,0 +1,29 @@
+import random
+
+import game_engine
+import mock_llm_server
+from checkpoint_lexer import CheckpointLexer
+
+
+def test_incremental_html_matches_full_highlight():
+    for seed in range(200):
+        rng = random.Random(seed)
+        story = mock_llm_server._synth_story(rng)
+        if seed % 3 == 0:
+            story = "  서문 [괄호] [체크포 " + story          # 머리표가 아닌 '[' 와 덜 들어온 머리표
+        lexer = CheckpointLexer()
+        i = 0
+        while i < len(story):
+            n = rng.randint(1, 9)
+            lexer.feed(story[i:i + n])
+            i += n
+            assert lexer.html == "".join(lexer.html_blocks) + lexer.tail_html
+        lexer.close()
+        assert lexer.html == game_engine.highlight_checkpoints(story)
+        assert lexer.tail_html == ""
+
+
+def test_tail_stays_within_open_block():
+    lexer = CheckpointLexer()
+    lexer.feed("[체크포인트 1: 시작]\n" + "가" * 5000 + "\n\n[체크포인트 2: 다음]\n짧은")
+    assert lexer.tail_html.endswith("짧은") and len(lexer.tail_html) < 100
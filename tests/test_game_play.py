@@ -0,0 +1,119 @@
+import importlib
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import game_engine
+import llm_cache
+import llm_scheduler
+import mock_llm_server
+
+
+@pytest.fixture(scope="module")
+def llm():
+    config = mock_llm_server.Config("synth")
+    server, base_url = mock_llm_server.start_in_thread(config)
+    yield config, base_url
+    server.shutdown()
+
+
+@pytest.fixture(params=["1", "0"], ids=["fragments", "full-rerun"])
+def app(request, monkeypatch, llm):
+    config, base_url = llm
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("UI_FRAGMENTS", request.param)
+    monkeypatch.setattr(config, "error_rate", 0.0)
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_BASE_S", 0.01)
+    monkeypatch.setattr(llm_scheduler, "MAX_RETRIES", 1)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_SITES", set())     # 대역 서버 응답이 결정적이라 앞 케이스의 결말이 캐시에서 나온다
+    import game_play
+    monkeypatch.setattr(game_engine, "_client", None)
+    importlib.reload(game_play)          # UI_FRAGMENTS는 import 때 조각 데코레이터에 반영된다
+    at = AppTest.from_file("../about_time.py", default_timeout=30)
+    yield at
+    importlib.reload(game_play)
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _to_past(at):
+    at.run()
+    _button(at, "게임 시작").click().run()
+    assert not at.exception
+    assert at.session_state.checkpoints
+    _button(at, "⏳ 이 시점으로 타임슬립").click().run()
+    assert at.session_state.mode == "past"
+
+
+def test_turn_submit_from_full_rerun(app):
+    # AppTest는 조각 안의 조작도 전체 rerun으로 돌리므로, 조각 함수가 전체 rerun 안에서 불리는 경로를 탄다
+    _to_past(app)
+    turn = app.session_state.turn
+    app.text_input(key=f"turn_{turn}").input("우산을 챙겨 가자고 말한다")
+    _button(app, "답변 제출").click().run()
+    assert not app.exception
+    assert app.session_state.turn == turn + 1
+    assert app.session_state.mode == "past"
+
+
+def test_story_failure_offers_retry(app, llm, monkeypatch):
+    config, _ = llm
+    monkeypatch.setattr(config, "error_rate", 1.0)
+    app.run()
+    _button(app, "게임 시작").click().run()
+    assert not app.exception
+    assert app.error and not app.session_state.checkpoints
+
+    config.error_rate = 0.0
+    _button(app, "다시 시도").click().run()
+    assert not app.exception
+    assert app.session_state.checkpoints
+
+
+def test_ending_failure_offers_retry(app, llm):
+    config, _ = llm
+    _to_past(app)
+    config.error_rate = 1.0
+    _button(app, "현재로 돌아가기 🕰️").click().run()
+    assert not app.exception
+    assert app.session_state.mode == "present" and not app.session_state.present_outcome
+    assert any("결말을 만들 수 없습니다" in e.value for e in app.error)
+
+    config.error_rate = 0.0
+    _button(app, "다시 시도").click().run()
+    assert not app.exception
+    assert app.session_state.present_outcome
+
+
+def test_save_conflict_after_widgets_drawn(app, monkeypatch):
+    # rerun 도중 다른 탭이 먼저 커밋: 끝의 저장이 충돌해도 이미 그린 메모 위젯의 키를 쓰지 않고 다음 rerun에서 되돌린다
+    import persistence
+    app.run()
+    _button(app, "게임 시작").click().run()
+    store = persistence.get_store()
+    sid = app.session_state[persistence.STATE]["sid"]
+    commit = store.commit
+
+    def racing_commit(s, expected, ops, snapshot_fn=None):
+        commit(s, store.version(s), [["set", "tickets", 1]])
+        monkeypatch.setattr(store, "commit", commit)
+        return commit(s, expected, ops, snapshot_fn)
+
+    monkeypatch.setattr(store, "commit", racing_commit)
+    app.text_area(key="notes").input("다른 탭과 겹친 메모").run()
+    assert not app.exception
+    assert store.load(sid)[0]["tickets"] == 1
+    app.run()
+    assert not app.exception
+    assert app.session_state.tickets == 1 and app.session_state.notes != "다른 탭과 겹친 메모"
+
+
+def test_story_blocks_drawn_once(app):
+    app.run()
+    _button(app, "게임 시작").click().run()
+    assert not app.exception
+    html = game_engine.story_html(app.session_state.init_story)
+    drawn = [m.value for m in app.markdown if "checkpoint-label" in m.value]
+    assert len(drawn) >= 5 and " ".join(drawn).split() == html.split()
@@ -0,0 +1,34 @@
+import json
+import os
+
+import pytest
+
+import game_engine
+import name_extractor
+
+_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_names_corpus.jsonl")
+
+
+@pytest.mark.parametrize("ending, victim", [
+    ("민우를 잃은 지연은 홀로 남았다.", "민우"),
+    ("지연은 달려갔지만 민우는 숨을 거뒀다.", "민우"),
+    ("민우를 바다에 묻은 지연은 그 마을을 떠나지 못했다.", "민우"),
+    ("민우의 장례를 치른 뒤 지연은 그 집을 떠났다.", "민우"),
+])
+def test_victim_by_predicate(ending, victim):
+    got, confidence = name_extractor.find_victim(["민우와 지연은 연인이다.", ending], ["민우", "지연"])
+    assert got == victim and name_extractor.confident(confidence)
+
+
+def test_both_names_without_evidence_is_not_confident():
+    _, confidence = name_extractor.find_victim(["민우와 지연은 연인이다.", "그날 밤 민우와 지연은 다시 만나지 못했다."],
+                                               ["민우", "지연"])
+    assert not name_extractor.confident(confidence)
+
+
+def test_engine_agrees_with_extractor():
+    with open(_CORPUS, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    for item in items:
+        chars, victim, _ = name_extractor.extract(item["story"])
+        assert game_engine._resolve_victim(item["story"], chars) == victim
@@ -0,0 +1,102 @@
+import copy
+import json
+
+import pytest
+
+import persistence
+import session_model
+import state_store
+
+KEYS = ("turn", "history", "touched_cps", "notes", "summaries")
+
+
+@pytest.fixture
+def store(monkeypatch):
+    s = state_store.MemoryStore(persistence.apply)
+    monkeypatch.setattr(persistence, "_store", s)
+    return s
+
+
+def _wire(v):
+    return json.loads(json.dumps(v, ensure_ascii=False))     # 저장소를 거친 것처럼 JSON으로 한 번 왕복
+
+
+@pytest.mark.parametrize("value", [
+    {1, 2, 3},
+    frozenset({"a"}),
+    (1, "둘", (3, 4)),
+    {0: ["가"], 2: {"x": (1, 2)}},
+    {"$set": 1, "plain": 2},                                  # "$"로 시작하는 문자열 키도 태그와 섞이지 않는다
+    [session_model.Exchange(0, "우산을 챙겨", "그래"), {"cps": {1, 2}}],
+    {"a": [1, {"b": None}], "c": True},
+])
+def test_encode_decode_round_trip(value):
+    assert persistence.decode(_wire(persistence.encode(value))) == value
+
+
+@pytest.mark.parametrize("old, new", [
+    (1, 2),
+    ([1, 2], [1, 2, 3, 4]),                                   # extend
+    ([1, 2], [2]),                                            # set
+    ({0: "요약"}, {0: "요약", 1: "둘째"}),                     # put (정수 키)
+    ({0: [1]}, {0: [1, 2]}),                                  # put_extend
+    ({0: [1], 1: "x"}, {1: "y"}),                             # del + put
+    ({1, 2}, {1, 2, 3}),
+    (None, (1, 2)),
+])
+def test_diff_apply(old, new):
+    state = {"k": copy.deepcopy(old)}
+    for op in _wire(persistence.diff("k", old, new)):
+        persistence.apply(state, op)
+    assert state["k"] == new
+
+
+def _holder(store, sid):
+    h = {}
+    persistence.restore(h, sid, KEYS)
+    return h
+
+
+def test_save_restore(store):
+    sid = persistence.new_token()
+    a = _holder(store, sid)
+    a.update(turn=1, history=[session_model.Exchange(0, "가", "나")], touched_cps={0}, summaries={0: "요약"})
+    assert persistence.save(a, KEYS)
+    a["history"] = a["history"] + [session_model.Exchange(0, "다", "라")]
+    a["turn"] = 2
+    assert persistence.save(a, KEYS) and persistence.is_saved(a, KEYS)
+
+    b = _holder(store, sid)
+    assert {k: b[k] for k in KEYS if k in b} == {k: a[k] for k in KEYS if k in a}
+
+
+def test_conflict_reverts_to_store(store):
+    sid = persistence.new_token()
+    a, b = _holder(store, sid), _holder(store, sid)
+    a.update(turn=1, touched_cps={0})
+    assert persistence.save(a, KEYS)
+
+    b.update(turn=5, notes="메모")
+    assert not persistence.save(b, KEYS)
+    assert b["turn"] == 1 and b["touched_cps"] == {0} and "notes" not in b
+    assert persistence.is_saved(b, KEYS)
+
+
+def test_conflict_deferred_refill(store):
+    sid = persistence.new_token()
+    a, b = _holder(store, sid), _holder(store, sid)
+    a.update(turn=1, touched_cps={0})
+    assert persistence.save(a, KEYS)
+
+    b.update(turn=5, notes="메모")
+    assert not persistence.save(b, KEYS, defer_refill=True)
+    assert b["turn"] == 5 and b["notes"] == "메모"          # 이번 rerun에서는 holder를 건드리지 않는다
+    assert persistence.is_saved(b, KEYS)                     # 내려도 저장소 상태로 복원되므로 잃을 것이 없다
+    assert persistence.save(b, KEYS, defer_refill=True)      # 다시 채우기 전에는 커밋하지 않는다
+    assert store.version(sid) == 1
+
+    assert persistence.sync(b, KEYS)                         # 다음 rerun 시작
+    assert b["turn"] == 1 and b["touched_cps"] == {0} and "notes" not in b
+    b["turn"] = 2
+    assert persistence.save(b, KEYS, defer_refill=True)
+    assert _holder(store, sid)["turn"] == 2
@@ -0,0 +1,39 @@
+import os
+
+import persistence
+import session_model
+
+
+def _registry(spill_dir):
+    return session_model.SessionRegistry(("story", "turn"), ("story", "turn"), release=lambda h: h.clear(),
+                                         idle_s=0, max_bytes=1, spill_dir=spill_dir)
+
+
+def test_spill_failure_pins_session(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")                  # 디렉터리 자리에 파일이 있어 makedirs가 실패한다
+    reg = _registry(str(blocker / "spill"))
+    a = {"story": "가" * 200, "turn": 3}
+    reg.touch("a", a, persistence.new_token())
+
+    # 다른 세션의 행동 끝에서 정책이 적용된다: 내려쓰기 실패가 그 요청으로 새지 않아야 한다
+    reg.touch("b", {"story": "나", "turn": 0}, persistence.new_token())
+
+    assert a == {"story": "가" * 200, "turn": 3}
+    stats = reg.stats()
+    assert stats["pinned"] == 1 and stats["evicted"] == 0 and stats["sessions"] == 2
+    reg.enter("a")                          # 내리는 중 표시가 풀려 있어야 기다리지 않는다
+
+
+def test_spill_and_rehydrate(tmp_path):
+    reg = _registry(str(tmp_path / "spill"))
+    token = persistence.new_token()
+    a = {"story": "가" * 200, "turn": 3}
+    reg.touch("a", a, token)
+    reg.touch("b", {"story": "나", "turn": 0}, persistence.new_token())
+
+    assert a == {} and os.path.exists(tmp_path / "spill" / f"{token}.json")
+    back = {}
+    assert reg.rehydrate(back, token)
+    assert back == {"story": "가" * 200, "turn": 3}
+    assert reg.stats()["spilled"] == 1
@@ -0,0 +1,71 @@
+import random
+import re
+
+import pytest
+
+import tag_filter
+
+# 스트리밍 필터 도입 전 game_play._strip_status (스트림이 끝난 뒤 전체 텍스트에 적용하던 기준 동작)
+_STATUS_END_RE = re.compile(
+    r"""["“”']?\s*<STATUS:\s*(?:(risk_up|risk_down)\s*([+-]?\d+)?|neutral)\s*>\s*["“”']?\s*$""",
+    re.IGNORECASE,
+)
+
+
+def _strip_status(text: str):
+    s = text.rstrip()
+    m = _STATUS_END_RE.search(s)
+    delta = 0
+    if m:
+        kind = (m.group(1) or "").lower()
+        num = m.group(2)
+        if kind == "risk_up":
+            delta = int(num or 1)
+        elif kind == "risk_down":
+            delta = -int(num or 1)
+        delta = max(-2, min(2, delta))
+        visible = _STATUS_END_RE.sub("", s).rstrip()
+    else:
+        visible = re.sub(r'["“”\']?\s*<STATUS:[^>]+>\s*["“”\']?', "", s, flags=re.I).rstrip()
+    return visible, delta
+
+
+def _filtered(text: str, cuts) -> tuple:
+    f = tag_filter.TagFilter()
+    prev = 0
+    for cut in list(cuts) + [len(text)]:
+        f.feed(text[prev:cut])
+        prev = cut
+    f.close()
+    delta = sum(tag_filter.status_delta(v) for name, v in f.tags if name == "STATUS")
+    return f.text, delta
+
+
+_WORDS = ["끝.", "좋아", "그는 문을 열었다.", "\"가자\"", "'응'", "…", "a<b", "<", "3 < 4", "“그래”"]
+_TAGS = ["<STATUS: risk_up1>", "<STATUS: risk_down2>", "<STATUS: neutral>", "<STATUS:risk_up>",
+         "<STATUS: RISK_UP 3>"]
+_GAPS = ["", " ", "  ", "\n", " \n "]
+_QUOTES = ["", "\"", "'", "“", "”"]
+
+
+def _case(rng: random.Random) -> str:
+    body = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6)))
+    return (body + rng.choice(_GAPS) + rng.choice(_QUOTES) + rng.choice(_GAPS) + rng.choice(_TAGS)
+            + rng.choice(_GAPS) + rng.choice(_QUOTES) + rng.choice(_GAPS))
+
+
+@pytest.mark.parametrize("text, visible", [
+    ('끝.  "<STATUS: risk_up1>', "끝."),
+    ("좋아' '<STATUS: neutral>'", "좋아'"),
+    ("그래. <STATUS: risk_down1>  ", "그래."),
+])
+def test_trailing_tag_examples(text, visible):
+    assert _filtered(text, [])[0] == visible
+
+
+def test_random_splits_match_strip_status():
+    rng = random.Random(15)
+    for _ in range(20000):
+        text = _case(rng)
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 6))))
+        assert _filtered(text, cuts) == _strip_status(text), (text, cuts)